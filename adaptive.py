@@ -0,0 +1,151 @@
+# Smallest face, in pixels of the downscaled frame, that face_locations finds
+# reliably with its default single upsample. Other detector backends set their
+# own through min_face
+MIN_DETECTABLE_FACE = 40
+
+
+class AdaptiveController:
+    """Adjusts how much work recognition does per frame to meet a latency budget.
+
+    Three settings are tuned from the measured processing time and the faces
+    found in each frame:
+
+    scale           downscale factor of the frame passed to face detection
+    stride          only every stride-th frame is processed
+    detect_interval minimum seconds between detections while nobody is in view
+
+    The budget is 1/target_fps seconds of processing per frame offered, so a
+    stride of n allows each processed frame n times as long. Over budget, the
+    scale is lowered first, down to what the smallest face in view still
+    needs, and the stride is raised after that. With headroom the
+    stride comes down again and then the scale goes back up. Small or distant
+    faces raise the scale right away. When no face has been seen for
+    idle_after seconds, detect_interval doubles up to max_idle_interval, and
+    the next face resets it to 0.
+
+    min_face is the smallest face, in pixels of the downscaled frame, the
+    face detector finds reliably.
+
+    With enabled=False the settings stay at their starting values, which is the
+    fixed 1/4 scale, every frame behaviour.
+    """
+
+    def __init__(self, target_fps=10.0, scale=0.25, min_scale=0.15, max_scale=0.5, max_stride=4,
+                 idle_after=2.0, max_idle_interval=1.0, adjust_period=0.5, enabled=True,
+                 min_face=MIN_DETECTABLE_FACE):
+        self.target_fps = target_fps
+        self.min_face = min_face
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.max_stride = max_stride
+        self.idle_after = idle_after
+        self.max_idle_interval = max_idle_interval
+        self.adjust_period = adjust_period
+        self.enabled = enabled
+        self.initial_scale = scale
+        self.reset()
+
+    def reset(self):
+        self.scale = self.initial_scale
+        self.stride = 1
+        self.detect_interval = 0.0
+        self.latency = None
+        self.smallest_face = None
+        self.last_face_at = None
+        self.last_detect_at = None
+        self.last_adjust_at = 0.0
+        self.reason = "starting"
+        self._offered = 0
+
+    @property
+    def budget(self):
+        # Seconds of processing allowed per frame
+        return 1.0 / self.target_fps
+
+    def should_process(self, timestamp):
+        """Whether the next frame, captured at timestamp, should be processed."""
+        if not self.enabled:
+            return True
+        # Counted over the frames recognition is offered, which in the live
+        # pipeline are already thinned out by the dropping queue
+        self._offered += 1
+        if self._offered < self.stride:
+            return False
+        if self.detect_interval and self.last_detect_at is not None \
+                and timestamp - self.last_detect_at < self.detect_interval:
+            return False
+        self._offered = 0
+        return True
+
+    def update(self, processing_time, face_heights, timestamp):
+        """Feed back one processed frame.
+
+        processing_time is in seconds, face_heights are the heights of the
+        detected faces in full-frame pixels.
+        """
+        self.last_detect_at = timestamp
+        if self.last_face_at is None:
+            self.last_face_at = timestamp
+        # The smallest face is that of the latest detection, without faces there is none
+        self.smallest_face = min(face_heights) if face_heights else None
+        if face_heights:
+            self.last_face_at = timestamp
+        self.latency = processing_time if self.latency is None else 0.8 * self.latency + 0.2 * processing_time
+
+        if not self.enabled:
+            return
+
+        # React to faces appearing right away, everything else at most every adjust_period
+        if face_heights:
+            self.detect_interval = 0.0
+            needed = self._needed_scale()
+            if needed > self.scale:
+                self.scale = needed
+                self.reason = "small faces"
+                self.last_adjust_at = timestamp
+                return
+        if timestamp - self.last_adjust_at < self.adjust_period:
+            return
+        self.last_adjust_at = timestamp
+
+        if timestamp - self.last_face_at >= self.idle_after:
+            self.detect_interval = min(max(self.detect_interval * 2, 0.1), self.max_idle_interval)
+            self.reason = "no faces"
+            return
+
+        # Processing time per offered frame, which the stride divides down
+        load = self.latency / self.stride
+        if load > self.budget * 1.1:
+            floor = max(self.min_scale, self._needed_scale())
+            if self.scale > floor:
+                self.scale = max(floor, self.scale * 0.85)
+                self.reason = "over budget"
+            elif self.stride < self.max_stride:
+                self.stride += 1
+                self.reason = "over budget"
+            else:
+                self.reason = "at limit"
+        elif load < self.budget * 0.6:
+            if self.stride > 1:
+                if self.latency / (self.stride - 1) < self.budget * 0.9:
+                    self.stride -= 1
+                    self.reason = "headroom"
+            elif self.scale < self.max_scale and self.latency * (1.1 ** 2) < self.budget * 0.9:
+                # Cost grows with the square of the scale, so only step up with room to spare
+                self.scale = min(self.max_scale, self.scale * 1.1)
+                self.reason = "headroom"
+        else:
+            self.reason = "on target"
+
+    def _needed_scale(self):
+        # Scale at which the smallest face seen is still big enough to detect
+        if not self.smallest_face:
+            return self.min_scale
+        return min(self.max_scale, self.min_face * 1.25 / self.smallest_face)
+
+    def describe(self):
+        if not self.enabled:
+            return f"fixed: scale {self.scale:.2f}"
+        idle = f", idle {self.detect_interval:.1f}s" if self.detect_interval else ""
+        latency = f", {self.latency * 1000:.0f} ms" if self.latency is not None else ""
+        return f"scale {self.scale:.2f}, stride {self.stride}{idle}{latency} ({self.reason})"
@@ -0,0 +1,193 @@
+import os
+import bisect
+from collections import namedtuple
+
+import numpy as np
+
+ABSENT = -1
+
+PersonStats = namedtuple('PersonStats', [
+    'name', 'present', 'absent', 'rate', 'longest_streak', 'current_streak', 'late', 'mean_arrival',
+])
+
+
+def seconds_of(time_text):
+    hours, minutes, *seconds = time_text.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + (int(seconds[0]) if seconds else 0)
+
+
+def format_seconds(seconds):
+    seconds = int(round(seconds))
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}"
+
+
+class AttendanceAnalytics:
+    """Columnar per-person, per-day index over the whole attendance archive.
+
+    first_seen is an int32 matrix with one row per person and one column per
+    session day (a date with at least one mark), holding the first mark of the
+    day in seconds since midnight or ABSENT. It is saved next to the
+    attendance database and brought up to date from the marks added since the
+    last update, so only the first build reads the whole archive. Range
+    queries slice columns and reduce with numpy.
+    """
+
+    VERSION = 1
+
+    def __init__(self, store, path=os.path.join('Attendance', 'analytics.npz')):
+        self.store = store
+        self.path = path
+        self.dates = []
+        self.names = []
+        self.first_seen = np.zeros((0, 0), dtype=np.int32)
+        self.max_id = 0
+        self.rows = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                if int(data['version']) != self.VERSION:
+                    return
+                self.dates = data['dates'].tolist()
+                self.names = data['names'].tolist()
+                self.first_seen = data['first_seen'].astype(np.int32)
+                self.max_id = int(data['max_id'])
+                self.rows = int(data['rows'])
+        except Exception as e:
+            print(f"Ignoring unreadable analytics index: {str(e)}")
+            self._clear()
+
+    def _clear(self):
+        self.dates = []
+        self.names = []
+        self.first_seen = np.zeros((0, 0), dtype=np.int32)
+        self.max_id = 0
+        self.rows = 0
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, version=self.VERSION, dates=np.array(self.dates, dtype=str),
+                     names=np.array(self.names, dtype=str), first_seen=self.first_seen,
+                     max_id=self.max_id, rows=self.rows)
+        os.replace(tmp, self.path)
+
+    def update(self):
+        """Fold marks added since the last update into the index.
+
+        Marks are only ever appended, except when a changed daily CSV is
+        re-imported and its old marks are deleted. That is noticed from the
+        row count below the last seen id and triggers a full rebuild.
+        Returns the number of new (person, day) entries.
+        """
+        if self.max_id and self.store.count_marks(self.max_id) != self.rows:
+            self._clear()
+
+        max_id, rows = self.store.watermark()
+        if max_id is None:
+            changed = bool(self.rows)
+            self._clear()
+            if changed:
+                self.save()
+            return 0
+        if max_id == self.max_id:
+            return 0
+
+        new = self.store.first_marks(self.max_id, max_id)
+        self._merge(new)
+        self.max_id = max_id
+        self.rows = rows
+        try:
+            self.save()
+        except Exception as e:
+            print(f"Error saving analytics index: {str(e)}")
+        return len(new)
+
+    def _merge(self, entries):
+        names = sorted(set(self.names).union(name for name, _, _ in entries))
+        dates = sorted(set(self.dates).union(date for _, date, _ in entries))
+        if names != self.names or dates != self.dates:
+            # New people or days, copy the old columns into a larger matrix
+            grown = np.full((len(names), len(dates)), ABSENT, dtype=np.int32)
+            if self.first_seen.size:
+                rows = np.searchsorted(names, self.names)
+                cols = np.searchsorted(dates, self.dates)
+                grown[np.ix_(rows, cols)] = self.first_seen
+            self.names, self.dates, self.first_seen = names, dates, grown
+
+        row_of = {name: i for i, name in enumerate(self.names)}
+        col_of = {date: i for i, date in enumerate(self.dates)}
+        for name, date, time_text in entries:
+            i, j = row_of[name], col_of[date]
+            seconds = seconds_of(time_text)
+            current = self.first_seen[i, j]
+            if current == ABSENT or seconds < current:
+                self.first_seen[i, j] = seconds
+
+    def date_range(self, start=None, end=None):
+        # Column slice for the inclusive date range, None means open ended
+        lo = 0 if start is None else bisect.bisect_left(self.dates, start)
+        hi = len(self.dates) if end is None else bisect.bisect_right(self.dates, end)
+        return slice(lo, max(lo, hi))
+
+    def presence(self, start=None, end=None):
+        return self.first_seen[:, self.date_range(start, end)] != ABSENT
+
+    def presence_counts(self, start=None, end=None):
+        return dict(zip(self.names, self.presence(start, end).sum(axis=1).tolist()))
+
+    def absentees(self, start=None, end=None, more_than=3):
+        # People who missed more than more_than session days in the range
+        present = self.presence(start, end)
+        missed = present.shape[1] - present.sum(axis=1)
+        return [(self.names[i], int(missed[i])) for i in np.flatnonzero(missed > more_than)]
+
+    def streaks(self, start=None, end=None):
+        # Longest and current run of consecutive session days present, per person
+        present = self.presence(start, end)
+        current = np.zeros(len(self.names), dtype=np.int32)
+        longest = np.zeros(len(self.names), dtype=np.int32)
+        for day in present.T:
+            current = (current + 1) * day
+            np.maximum(longest, current, out=longest)
+        return longest, current
+
+    def late_counts(self, start=None, end=None, late_after='09:00'):
+        seen = self.first_seen[:, self.date_range(start, end)]
+        return ((seen != ABSENT) & (seen > seconds_of(late_after))).sum(axis=1)
+
+    def report(self, start=None, end=None, late_after='09:00'):
+        """One PersonStats per person over the range, rate in percent of session days."""
+        columns = self.date_range(start, end)
+        seen = self.first_seen[:, columns]
+        present = seen != ABSENT
+        days = seen.shape[1]
+        if not days:
+            return []
+        counts = present.sum(axis=1)
+        longest, current = self.streaks(start, end)
+        late = self.late_counts(start, end, late_after)
+        arrival_sum = np.where(present, seen, 0).sum(axis=1, dtype=np.int64)
+
+        report = []
+        for i, name in enumerate(self.names):
+            report.append(PersonStats(
+                name=name,
+                present=int(counts[i]),
+                absent=int(days - counts[i]),
+                rate=round(100.0 * float(counts[i]) / days, 1),
+                longest_streak=int(longest[i]),
+                current_streak=int(current[i]),
+                late=int(late[i]),
+                mean_arrival=format_seconds(arrival_sum[i] / counts[i]) if counts[i] else '',
+            ))
+        return report
+
+    def session_days(self, start=None, end=None):
+        return self.dates[self.date_range(start, end)]
@@ -0,0 +1,208 @@
+"""Run face recognition attendance without a display.
+
+Examples:
+    python attendance_cli.py --source 0
+    python attendance_cli.py --source rtsp://door-cam/stream --tolerance 0.5
+    python attendance_cli.py --source lecture.mp4 --output -
+    python attendance_cli.py --source test_frames/ --output /tmp/attendance
+    python attendance_cli.py --source 0 1 rtsp://lobby-cam/stream
+    python attendance_cli.py --source 0 --detector auto --min-recall 0.95
+"""
+import sys
+import json
+import time
+import signal
+import threading
+import argparse
+
+import cv2
+
+from engine import RecognitionEngine, MultiCameraEngine, StdoutSink, open_attendance_sink, load_gallery, describe_gallery_load, open_source, choose_detector
+from gallery_index import INDEX_TYPES
+from detectors import DETECTOR_TYPES, MIN_RECALL, describe_scores
+from gallery_store import GALLERY_DIR
+from adaptive import AdaptiveController
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run face recognition attendance without a display.")
+    parser.add_argument('--source', nargs='+', default=['0'],
+                        help="camera index, video file, stream URL or image folder (default: 0); "
+                             "give several to run them all against one gallery")
+    parser.add_argument('--tolerance', type=float, default=0.6,
+                        help="maximum face distance for a match, lower is stricter (default: 0.6)")
+    parser.add_argument('--output', default='Attendance',
+                        help="folder for the attendance database, or - to print marks to stdout")
+    parser.add_argument('--images', default='Images', help="folder with registered face images")
+    parser.add_argument('--gallery', default=GALLERY_DIR, help="folder of the gallery store")
+    parser.add_argument('--index', default='exact', choices=list(INDEX_TYPES), help="gallery index backend")
+    parser.add_argument('--detector', default='hog', choices=list(DETECTOR_TYPES) + ['auto'],
+                        help="face detector backend, auto picks the fastest one that reaches --min-recall "
+                             "on the registered images (default: hog)")
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL,
+                        help=f"recall the auto-selected detector must reach (default: {MIN_RECALL})")
+    parser.add_argument('--compact', action='store_true',
+                        help="match against a few prototype encodings per user instead of every image")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processes used to encode new images, and for face detection with several sources")
+    parser.add_argument('--max-frames', type=int, default=None, help="stop after this many frames")
+    parser.add_argument('--duration', type=float, default=None, help="stop after this many seconds")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="adapt detection scale and frame skipping to meet --target-fps")
+    parser.add_argument('--target-fps', type=float, default=10.0, help="processing rate for --adaptive (default: 10)")
+    parser.add_argument('--stats-file', default=None, help="write per-stage timings as JSON to this file on exit")
+    parser.add_argument('--profile', type=float, default=None, metavar='SECONDS',
+                        help="sample the recognition thread for this many seconds after start (one --source only)")
+    args = parser.parse_args(argv)
+    if args.profile is not None and len(args.source) > 1:
+        parser.error("--profile samples a single recognition thread, give one --source")
+    return args
+
+
+def configure_camera(cap):
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+
+def load_detector(args, log):
+    detector, scores = choose_detector(args.detector, args.gallery, args.min_recall)
+    for line in describe_scores(scores, detector):
+        log(f"Detector {line}")
+    log(f"Face detector: {detector.describe()}")
+    return detector
+
+
+def run_cameras(args, sink):
+    # Several sources share one gallery and one marked set, every source runs
+    # through the live pipeline so a slow one never holds up the others
+    cameras = MultiCameraEngine(tolerance=args.tolerance, sink=sink, workers=args.workers)
+    for source in args.source:
+        cameras.add_camera(label=source,
+                           controller=AdaptiveController(target_fps=args.target_fps, enabled=args.adaptive))
+    log = cameras.engines[0].log
+
+    log("Loading registered faces...")
+    gallery, result = load_gallery(args.images, index=args.index, workers=args.workers, compact=args.compact,
+                                   gallery_dir=args.gallery)
+    for message in describe_gallery_load(gallery, result):
+        log(message)
+    if len(gallery) == 0:
+        log("No registered faces found! Please register users first.")
+        return 1
+    cameras.gallery = gallery
+    cameras.detector = load_detector(args, log)
+
+    caps = []
+    for source in args.source:
+        cap, live = open_source(source)
+        if not cap.isOpened():
+            log(f"Could not open source: {source}")
+            for opened in caps:
+                opened.release()
+            return 1
+        if live:
+            configure_camera(cap)
+        caps.append(cap)
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    started = time.time()
+    cameras.start(caps, labels=args.source)
+    log(f"Recognition running on {len(caps)} sources")
+    while cameras.is_running and not stopping.is_set():
+        stopping.wait(0.5)
+        if args.duration is not None and time.time() - started >= args.duration:
+            break
+        if args.max_frames is not None and all(
+                engine.grabber is None or engine.grabber.frame_count >= args.max_frames for engine in cameras.active):
+            break
+    cameras.stop()
+
+    sink.close()
+    print(cameras.format_summary(), file=sys.stderr)
+    if args.stats_file:
+        with open(args.stats_file, 'w') as f:
+            json.dump(cameras.summary(), f, indent=2)
+        log(f"Stats written to {args.stats_file}")
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        import face_recognition
+    except ImportError:
+        print("The face_recognition library is not installed. Please install it with: pip install face_recognition",
+              file=sys.stderr)
+        return 1
+
+    sink = StdoutSink() if args.output == '-' else open_attendance_sink(args.output)
+    if len(args.source) > 1:
+        return run_cameras(args, sink)
+
+    source = args.source[0]
+    engine = RecognitionEngine(tolerance=args.tolerance, sink=sink,
+                               controller=AdaptiveController(target_fps=args.target_fps, enabled=args.adaptive))
+
+    engine.log("Loading registered faces...")
+    gallery, result = load_gallery(args.images, index=args.index, workers=args.workers,
+                                   compact=args.compact, gallery_dir=args.gallery)
+    for message in describe_gallery_load(gallery, result):
+        engine.log(message)
+    if len(gallery) == 0:
+        engine.log("No registered faces found! Please register users first.")
+        return 1
+    engine.gallery = gallery
+    engine.detector = load_detector(args, engine.log)
+
+    cap, live = open_source(source)
+    if not cap.isOpened():
+        engine.log(f"Could not open source: {source}")
+        return 1
+
+    if live:
+        configure_camera(cap)
+
+    # Ctrl+C and SIGTERM end the run cleanly so the stats still get printed
+    def request_stop(signum, frame):
+        engine.is_running = False
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    engine.log(f"Recognition running on {source}")
+    if live:
+        engine.start(cap)
+        if args.profile:
+            engine.start_profiling(args.profile)
+        while engine.is_running:
+            engine.wait(timeout=0.5)
+            if args.duration is not None and engine.stats.summary()['elapsed_s'] >= args.duration:
+                break
+            if args.max_frames is not None and engine.grabber is not None \
+                    and engine.grabber.frame_count >= args.max_frames:
+                break
+        engine.stop()
+    else:
+        if args.profile:
+            # run_sequential works on this thread, the profiler attaches once it is running
+            threading.Timer(0.1, engine.start_profiling, args=(args.profile,)).start()
+        engine.run_sequential(cap, max_frames=args.max_frames, duration=args.duration)
+
+    if engine.profiler is not None:
+        engine.profiler.thread.join(timeout=args.profile + 5)
+    engine.sink.close()
+    print(engine.stats.format_summary(), file=sys.stderr)
+    if args.adaptive:
+        print(f"Final detection settings: {engine.controller.describe()}", file=sys.stderr)
+    if args.stats_file:
+        engine.export_stats(args.stats_file)
+        engine.log(f"Stats written to {args.stats_file}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,242 @@
+import os
+import re
+import csv
+import queue
+import sqlite3
+import threading
+
+DAILY_CSV = re.compile(r'^Attendance-\d{4}-\d{2}-\d{2}\.csv$')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS marks (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS marks_date_name ON marks (date, name, time);
+CREATE INDEX IF NOT EXISTS marks_name_date ON marks (name, date, time);
+CREATE TABLE IF NOT EXISTS imported_files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+'''
+
+
+def _chunks(cursor, chunk_size):
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield rows
+
+
+class AttendanceStore:
+    """SQLite database of attendance marks, indexed by date and by name.
+
+    The database runs in WAL mode so several recognition sessions, in this
+    process or others, can write while the records window reads. Each thread
+    gets its own connection. Daily Attendance-YYYY-MM-DD.csv files from older
+    versions are imported on open; export.py writes marks back out as CSV.
+    """
+
+    def __init__(self, path=os.path.join('Attendance', 'attendance.db'), csv_dir='Attendance'):
+        self.path = path
+        self.csv_dir = csv_dir
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+        if csv_dir is not None:
+            self.import_csv_archive(csv_dir)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add_marks(self, marks, source=None):
+        # marks is an iterable of (name, date, time) tuples, written in one transaction
+        with self._connection() as conn:
+            conn.executemany('INSERT INTO marks (name, date, time, source) VALUES (?, ?, ?, ?)',
+                             [(name, date, time, source) for name, date, time in marks])
+
+    def dates(self):
+        rows = self._connection().execute('SELECT DISTINCT date FROM marks ORDER BY date DESC')
+        return [row[0] for row in rows]
+
+    def records(self, date=None):
+        return [row for chunk in self.iter_records(date) for row in chunk]
+
+    def iter_records(self, date=None, chunk_size=2000):
+        # Yields lists of (name, time, date) rows without loading everything at once,
+        # date=None walks the whole archive
+        if date is None:
+            cursor = self._connection().execute('SELECT name, time, date FROM marks ORDER BY date, time, id')
+        else:
+            cursor = self._connection().execute(
+                'SELECT name, time, date FROM marks WHERE date = ? ORDER BY time, id', (date,))
+        return _chunks(cursor, chunk_size)
+
+    def iter_records_between(self, start_date, end_date, chunk_size=2000):
+        cursor = self._connection().execute(
+            'SELECT name, time, date FROM marks WHERE date BETWEEN ? AND ? ORDER BY date, time, id',
+            (start_date, end_date))
+        return _chunks(cursor, chunk_size)
+
+    def count_between(self, start_date, end_date):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM marks WHERE date BETWEEN ? AND ?', (start_date, end_date)).fetchone()[0]
+
+    def records_between(self, start_date, end_date, name=None):
+        if name is None:
+            rows = self._connection().execute(
+                'SELECT name, time, date FROM marks WHERE date BETWEEN ? AND ? ORDER BY date, time, id',
+                (start_date, end_date))
+        else:
+            rows = self._connection().execute(
+                'SELECT name, time, date FROM marks WHERE name = ? AND date BETWEEN ? AND ? ORDER BY date, time',
+                (name, start_date, end_date))
+        return rows.fetchall()
+
+    def names_on(self, date):
+        rows = self._connection().execute('SELECT DISTINCT name FROM marks WHERE date = ?', (date,))
+        return {row[0] for row in rows}
+
+    def summary(self, date=None):
+        if date is None:
+            row = self._connection().execute('SELECT COUNT(*), COUNT(DISTINCT name) FROM marks').fetchone()
+        else:
+            row = self._connection().execute(
+                'SELECT COUNT(*), COUNT(DISTINCT name) FROM marks WHERE date = ?', (date,)).fetchone()
+        return row[0], row[1]
+
+    def watermark(self):
+        # (highest mark id, number of marks), read together so they are consistent
+        return self._connection().execute('SELECT MAX(id), COUNT(*) FROM marks').fetchone()
+
+    def count_marks(self, up_to_id):
+        return self._connection().execute('SELECT COUNT(*) FROM marks WHERE id <= ?', (up_to_id,)).fetchone()[0]
+
+    def first_marks(self, after_id, up_to_id):
+        # (name, date, first time) for every person and day among the marks in the id range
+        return self._connection().execute(
+            'SELECT name, date, MIN(time) FROM marks WHERE id > ? AND id <= ? GROUP BY name, date',
+            (after_id, up_to_id)).fetchall()
+
+    def import_csv_archive(self, directory):
+        """Import daily CSV files that are new or changed since the last import."""
+        if not os.path.exists(directory):
+            return 0
+
+        conn = self._connection()
+        known = {path: (size, mtime) for path, size, mtime in
+                 conn.execute('SELECT path, size, mtime FROM imported_files')}
+
+        imported = 0
+        for file in sorted(os.listdir(directory)):
+            if not DAILY_CSV.match(file):
+                continue
+            path = os.path.join(directory, file)
+            st = os.stat(path)
+            if known.get(file) == (st.st_size, st.st_mtime):
+                continue
+
+            with open(path, 'r', newline='') as f:
+                rows = [row[:3] for row in csv.reader(f) if len(row) >= 3][1:]
+
+            # A changed file replaces everything that was imported from it before
+            with conn:
+                conn.execute('DELETE FROM marks WHERE source = ?', (file,))
+                conn.executemany('INSERT INTO marks (name, date, time, source) VALUES (?, ?, ?, ?)',
+                                 [(name, date, time, file) for name, time, date in rows])
+                conn.execute('INSERT OR REPLACE INTO imported_files (path, size, mtime) VALUES (?, ?, ?)',
+                             (file, st.st_size, st.st_mtime))
+            imported += 1
+        return imported
+
+
+class BatchedMarkWriter:
+    """Attendance sink that writes marks to the store on a background thread.
+
+    mark() only queues the mark, so the recognition thread never waits on
+    disk. The writer commits whatever has queued up every flush_interval
+    seconds, or as soon as batch_size marks are waiting.
+    """
+
+    def __init__(self, store, flush_interval=0.5, batch_size=100):
+        self.store = store
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.on_error = None
+        self._queue = queue.Queue()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def mark(self, name, when):
+        with self._flushed:
+            self._pending += 1
+        self._queue.put((name, when.strftime('%Y-%m-%d'), when.strftime('%H:%M:%S')))
+
+    def _run(self):
+        running = True
+        while running:
+            batch = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+                if item is None:
+                    running = False
+                else:
+                    batch.append(item)
+                while len(batch) < self.batch_size:
+                    item = self._queue.get_nowait()
+                    if item is None:
+                        running = False
+                        break
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    self.store.add_marks(batch)
+                except Exception as e:
+                    if self.on_error is not None:
+                        self.on_error(f"Error writing attendance: {str(e)}")
+                    else:
+                        print(f"Error writing attendance: {str(e)}")
+
+            with self._flushed:
+                self._pending -= len(batch)
+                self._flushed.notify_all()
+
+        self.store.close()
+
+    def flush(self, timeout=5.0):
+        # Blocks until everything marked so far is committed
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending <= 0, timeout)
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5.0)
@@ -0,0 +1,184 @@
+"""Mark attendance from a recorded video, faster than real time.
+
+The video is split into segments that are decoded in parallel worker
+processes. Each worker seeks to its segment and only decodes every
+--stride-th frame (the frames in between are grabbed but not decoded), so
+memory stays constant regardless of video length. The first time each
+person is seen is merged across segments and written to the attendance
+database next to the Attendance/Attendance-YYYY-MM-DD.csv files.
+
+Examples:
+    python batch_video.py lecture.mp4
+    python batch_video.py lecture.mp4 --stride 10 --workers 8 --start "2025-05-13 09:00:00"
+"""
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+from engine import load_gallery, describe_gallery_load, recognize_frame, choose_detector
+from attendance_store import AttendanceStore
+from gallery_store import GALLERY_DIR, GalleryStore, open_gallery
+from detectors import DETECTOR_TYPES, MIN_RECALL, describe_scores
+
+_worker_gallery = None
+_worker_detector = None
+
+
+def _init_worker(gallery_dir, detector):
+    # Every worker maps the same gallery files instead of receiving a copy
+    global _worker_gallery, _worker_detector
+    _worker_gallery = open_gallery(GalleryStore(gallery_dir))
+    _worker_detector = detector
+
+
+def video_info(path):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise IOError(f"Could not open video: {path}")
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    cap.release()
+    return frame_count, fps
+
+
+def split_segments(frame_count, segments, stride):
+    # Segment boundaries are aligned to the stride so no sampled frame is lost
+    # or processed twice at a boundary
+    samples = (frame_count + stride - 1) // stride
+    per_segment = max(1, (samples + segments - 1) // segments)
+    bounds = []
+    for start in range(0, samples, per_segment):
+        end = min(start + per_segment, samples)
+        bounds.append((start * stride, min(end * stride, frame_count)))
+    return bounds
+
+
+def process_segment(path, start_frame, end_frame, stride, fps, tolerance):
+    """Returns {name: (first_seen_seconds, confidence)} for one segment."""
+    cap = cv2.VideoCapture(path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    first_seen = {}
+    frames = 0
+    index = start_frame
+    try:
+        while index < end_frame:
+            if (index - start_frame) % stride == 0:
+                ret, image = cap.read()
+                if not ret:
+                    break
+                frames += 1
+                for box, name, confidence in recognize_frame(image, _worker_gallery, tolerance, detector=_worker_detector):
+                    if name != "Unknown" and name not in first_seen:
+                        first_seen[name] = (index / fps, confidence)
+            elif not cap.grab():
+                break
+            index += 1
+    finally:
+        cap.release()
+
+    return first_seen, frames
+
+
+def merge_first_seen(results):
+    merged = {}
+    for first_seen in results:
+        for name, (offset, confidence) in first_seen.items():
+            if name not in merged or offset < merged[name][0]:
+                merged[name] = (offset, confidence)
+    return merged
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mark attendance from a recorded video.")
+    parser.add_argument('video', help="video file to process")
+    parser.add_argument('--stride', type=int, default=5, help="process every n-th frame (default: 5)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="parallel decoding processes")
+    parser.add_argument('--segments', type=int, default=None,
+                        help="number of segments to split the video into (default: 4 per worker)")
+    parser.add_argument('--tolerance', type=float, default=0.6)
+    parser.add_argument('--detector', default='hog', choices=list(DETECTOR_TYPES) + ['auto'],
+                        help="face detector backend, auto picks the fastest one that reaches --min-recall "
+                             "on the registered images (default: hog)")
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL,
+                        help=f"recall the auto-selected detector must reach (default: {MIN_RECALL})")
+    parser.add_argument('--start', default=None,
+                        help="wall-clock time of the first frame, 'YYYY-MM-DD HH:MM:SS' "
+                             "(default: file modification time minus video length)")
+    parser.add_argument('--images', default='Images', help="folder with registered face images")
+    parser.add_argument('--gallery', default=GALLERY_DIR, help="folder of the gallery store")
+    parser.add_argument('--output', default='Attendance', help="folder for the attendance database")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    frame_count, fps = video_info(args.video)
+    duration = frame_count / fps
+    if args.start:
+        start_time = datetime.strptime(args.start, '%Y-%m-%d %H:%M:%S')
+    else:
+        start_time = datetime.fromtimestamp(os.path.getmtime(args.video)) - timedelta(seconds=duration)
+
+    print("Loading registered faces...")
+    gallery, result = load_gallery(args.images, gallery_dir=args.gallery)
+    for message in describe_gallery_load(gallery, result):
+        print(message)
+    if len(gallery) == 0:
+        print("No registered faces found! Please register users first.")
+        return 1
+
+    detector, scores = choose_detector(args.detector, args.gallery, args.min_recall)
+    for line in describe_scores(scores, detector):
+        print(f"Detector {line}")
+    print(f"Face detector: {detector.describe()}")
+
+    segments = split_segments(frame_count, args.segments or args.workers * 4, args.stride)
+    print(f"{args.video}: {frame_count} frames at {fps:.1f} fps ({duration:.0f}s), "
+          f"{len(segments)} segments, stride {args.stride}, {args.workers} workers")
+
+    started = time.time()
+    results = []
+    frames = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                             initargs=(args.gallery, detector)) as executor:
+        futures = [executor.submit(process_segment, args.video, start, end, args.stride, fps, args.tolerance)
+                   for start, end in segments]
+        for done, future in enumerate(as_completed(futures), 1):
+            first_seen, segment_frames = future.result()
+            results.append(first_seen)
+            frames += segment_frames
+            print(f"Segments done: {done}/{len(segments)}", end='\r', flush=True)
+    print()
+
+    elapsed = time.time() - started
+    merged = merge_first_seen(results)
+
+    store = AttendanceStore(os.path.join(args.output, 'attendance.db'), csv_dir=args.output)
+    marked = {}
+    new_marks = []
+    for name, (offset, confidence) in sorted(merged.items(), key=lambda item: item[1][0]):
+        when = start_time + timedelta(seconds=offset)
+        date_string = when.strftime('%Y-%m-%d')
+        if date_string not in marked:
+            marked[date_string] = store.names_on(date_string)
+        if name in marked[date_string]:
+            continue
+        new_marks.append((name, date_string, when.strftime('%H:%M:%S')))
+        marked[date_string].add(name)
+        print(f"Marked attendance for {name} at {when.strftime('%H:%M:%S')} (confidence {confidence:.2f})")
+    store.add_marks(new_marks, source=os.path.basename(args.video))
+
+    print(f"Processed {frames} frames in {elapsed:.1f}s, {duration / max(elapsed, 1e-6):.1f}x real time, "
+          f"{len(merged)} people seen")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+"""Compression, accuracy and matching speed of prototype-compacted galleries.
+
+Usage: python benchmarks/bench_compaction.py [--users 200 2000] [--images-per-user 20] [--method centroid]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import FaceGallery
+from compaction import compact_gallery
+
+
+def registration_gallery(users, images_per_user, seed=0):
+    # Two poses per user (e.g. with and without glasses) so one prototype is not always enough
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.06, (users, 128))
+    poses = centers[:, None, :] + rng.normal(0, 0.05, (users, 2, 128))
+    pose = rng.integers(0, 2, (users, images_per_user))
+    encodings = poses[np.arange(users)[:, None], pose] + rng.normal(0, 0.035, (users, images_per_user, 128))
+    names = [f"user{i}" for i in range(users) for _ in range(images_per_user)]
+    return encodings.reshape(-1, 128).astype(np.float32), names, poses
+
+
+def time_match(gallery, queries):
+    gallery.match(queries[:8])
+    start = time.perf_counter()
+    for i in range(0, len(queries), 8):
+        gallery.match(queries[i:i + 8])
+    return (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, nargs='+', default=[200, 2000])
+    parser.add_argument('--images-per-user', type=int, default=20)
+    parser.add_argument('--method', default='centroid', choices=['centroid', 'medoid'])
+    parser.add_argument('--margin', type=float, default=0.01)
+    args = parser.parse_args()
+
+    print(f"{'users':>6} {'rows':>7} {'protos':>7} {'ratio':>6} {'build s':>8} "
+          f"{'acc full':>9} {'acc comp':>9} {'us/face full':>13} {'us/face comp':>13}")
+    for users in args.users:
+        encodings, names, poses = registration_gallery(users, args.images_per_user)
+        start = time.perf_counter()
+        compact, compact_names, report = compact_gallery(encodings, names, method=args.method, margin=args.margin)
+        build = time.perf_counter() - start
+
+        # New photos of the same people, not part of the registration set
+        rng = np.random.default_rng(1)
+        who = rng.integers(0, users, 2000)
+        queries = (poses[who, rng.integers(0, 2, len(who))] + rng.normal(0, 0.035, (len(who), 128))).astype(np.float32)
+
+        full_gallery = FaceGallery.from_encodings(encodings, names)
+        compacted = FaceGallery.from_encodings(compact, compact_names)
+        full_time = time_match(full_gallery, queries)
+        compact_time = time_match(compacted, queries)
+
+        print(f"{users:>6} {report.encodings:>7} {report.prototypes:>7} {report.ratio:>5.1f}x {build:>8.2f} "
+              f"{report.accuracy_full:>9.1%} {report.accuracy_compact:>9.1%} "
+              f"{full_time * 1e6:>13.1f} {compact_time * 1e6:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Recall vs latency of the face detector backends on fixture frames.
+
+Usage: python benchmarks/bench_detectors.py [--frames FOLDER [--boxes boxes.json]] [--scales 0.5 0.25 0.15]
+
+Without --frames the registered images from the gallery store are used;
+they show one face each, so recall is the share of images with a detection
+and every further box counts as a false positive. With --boxes, a JSON
+object mapping image file names to lists of [top, right, bottom, left]
+boxes in full-size pixels, detections are matched to the expected boxes.
+Each scale shrinks the frames the way recognition does before detection,
+smaller scales stand in for people further from the camera. The last lines
+show what --detector auto would pick at each scale.
+"""
+import os
+import sys
+import json
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_cache import IMAGE_EXTENSIONS
+from gallery_store import GALLERY_DIR, GalleryStore, user_images
+from detectors import MIN_RECALL, create_detector, score_detector, select_detector, fixture_frames
+
+CONFIGS = [
+    ('hog', {'upsample': 0}),
+    ('hog', {'upsample': 1}),
+    ('haar', {'min_neighbors': 3}),
+    ('haar', {'min_neighbors': 5}),
+    ('dnn', {'confidence': 0.5}),
+    ('dnn', {'confidence': 0.7}),
+    ('dnn', {'input_size': 200}),
+]
+
+
+def load_fixture(args):
+    if args.frames is None:
+        store = GalleryStore(args.gallery)
+        return [path for user in store.users.values() for path in user_images(user['folder'])], None
+
+    files = sorted(file for file in os.listdir(args.frames) if file.endswith(IMAGE_EXTENSIONS))
+    truth = None
+    if args.boxes:
+        with open(args.boxes) as f:
+            boxes = json.load(f)
+        files = [file for file in files if file in boxes]
+        truth = [boxes[file] for file in files]
+    return [os.path.join(args.frames, file) for file in files], truth
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--frames', default=None, help="folder of fixture images (default: registered images)")
+    parser.add_argument('--boxes', default=None, help="JSON file with the expected face boxes per image")
+    parser.add_argument('--gallery', default=GALLERY_DIR)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.5, 0.25, 0.15])
+    parser.add_argument('--limit', type=int, default=100, help="at most this many fixture images")
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL)
+    args = parser.parse_args()
+
+    paths, truth = load_fixture(args)
+    if not paths:
+        print("No fixture images found, register users first or pass --frames")
+        return 1
+    if truth is not None and args.limit and len(paths) > args.limit:
+        paths, truth = paths[:args.limit], truth[:args.limit]
+
+    print(f"{len(paths[:args.limit or None])} fixture images")
+    print(f"{'scale':>6} {'backend':<24} {'recall':>7} {'fp/frame':>9} {'ms':>8}")
+    selected = []
+    for scale in args.scales:
+        frames = fixture_frames(paths, scale, args.limit)
+        scaled = None
+        if truth is not None:
+            scaled = [[[int(v * scale) for v in box] for box in boxes] for boxes in truth]
+
+        for kind, options in CONFIGS:
+            score = score_detector(create_detector(kind, **options), frames, scaled)
+            label = kind + ''.join(f" {k}={v}" for k, v in options.items())
+            if score.error is not None:
+                print(f"{scale:>6.2f} {label:<24} unavailable: {score.error}")
+                continue
+            print(f"{scale:>6.2f} {label:<24} {score.recall:>7.3f} {score.false_positives:>9.2f} "
+                  f"{score.latency * 1000:>8.2f}")
+
+        try:
+            detector, _ = select_detector(frames, scaled, args.min_recall)
+            selected.append((scale, detector.describe()))
+        except Exception as e:
+            selected.append((scale, f"none ({e})"))
+
+    for scale, choice in selected:
+        print(f"auto at scale {scale:.2f}, min recall {args.min_recall}: {choice}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""Images per second of a full gallery build for different worker counts.
+
+Usage: python benchmarks/bench_gallery_build.py [--images Images] [--count 200] [--workers 1 2 4 8 16]
+
+Needs face_recognition and a folder of registration photos. The photos are
+cycled until --count images are queued, so a small folder is enough.
+"""
+import os
+import sys
+import time
+import argparse
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_cache import IMAGE_EXTENSIONS, encode_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', default='Images', help="folder with registration photos")
+    parser.add_argument('--count', type=int, default=200, help="images per run")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    files = sorted(os.path.join(args.images, f) for f in os.listdir(args.images) if f.endswith(IMAGE_EXTENSIONS))
+    if not files:
+        sys.exit(f"No images found in {args.images}")
+    paths = list(itertools.islice(itertools.cycle(files), args.count))
+
+    print(f"{len(paths)} images, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'seconds':>9} {'images/s':>9} {'speedup':>8}")
+
+    baseline = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        failures = sum(1 for _, _, error in encode_files(paths, workers=workers) if error)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+
+        note = f"  ({failures} failed)" if failures else ""
+        print(f"{workers:>8} {elapsed:>9.2f} {len(paths) / elapsed:>9.1f} {baseline / elapsed:>7.2f}x{note}")
+
+
+if __name__ == '__main__':
+    main()
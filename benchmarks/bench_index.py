@@ -0,0 +1,70 @@
+"""Recall vs latency of the gallery index backends against the exact scan.
+
+Usage: python benchmarks/bench_index.py [--sizes 1000 10000 50000] [--queries 200]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gallery_index import create_index
+
+
+def clustered_gallery(users, images_per_user=5, seed=0):
+    # Users are spread so that different people are ~1.0 apart and photos of the
+    # same person ~0.3 apart, roughly like dlib encodings
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.06, (users, 128))
+    encodings = np.repeat(centers, images_per_user, axis=0)
+    encodings += rng.normal(0, 0.02, encodings.shape)
+    names = [f"user{i // images_per_user}" for i in range(len(encodings))]
+    return centers, encodings.astype(np.float32), names
+
+
+def timed_search(index, queries, tolerance):
+    # One query per call, the way run_recognition sees a frame with a single face
+    start = time.perf_counter()
+    hits = [index.search(q[None, :], k=1, max_distance=tolerance)[0] for q in queries]
+    return hits, (time.perf_counter() - start) / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--tolerance', type=float, default=0.6)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'gallery':>8} {'backend':<16} {'build ms':>9} {'query ms':>9} {'recall@1':>9}")
+
+    for size in args.sizes:
+        centers, encodings, names = clustered_gallery(max(size // 5, 1))
+        picks = rng.integers(0, len(centers), args.queries)
+        queries = (centers[picks] + rng.normal(0, 0.02, (args.queries, 128))).astype(np.float32)
+
+        configs = [('exact', {}), ('balltree', {})]
+        configs += [('ivf', {'nprobe': nprobe}) for nprobe in (1, 4, 8, 16)]
+
+        reference = None
+        for kind, options in configs:
+            start = time.perf_counter()
+            index = create_index(kind, encodings, names, **options)
+            index.search(queries[:1])
+            build_time = time.perf_counter() - start
+
+            hits, query_time = timed_search(index, queries, args.tolerance)
+            found = [h[0][0] if h else -1 for h in hits]
+            if reference is None:
+                reference = found
+            recall = np.mean([a == b for a, b in zip(found, reference)])
+
+            label = kind + ''.join(f" {k}={v}" for k, v in options.items())
+            print(f"{size:>8} {label:<16} {build_time * 1000:>9.1f} {query_time * 1000:>9.3f} {recall:>9.3f}")
+
+
+if __name__ == '__main__':
+    main()
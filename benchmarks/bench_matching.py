@@ -0,0 +1,71 @@
+"""Matches per second of batched gallery matching vs the old per-face loop.
+
+Usage: python benchmarks/bench_matching.py [--faces 8] [--sizes 100 1000 10000 50000]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matching import FaceGallery
+
+
+def synthetic_gallery(size, images_per_user=5, seed=0):
+    rng = np.random.default_rng(seed)
+    encodings = rng.normal(0, 0.09, (size, 128)).astype(np.float32)
+    names = [f"user{i // images_per_user}" for i in range(size)]
+    return encodings, names
+
+
+def per_face_loop(known_face_encodings, face_encodings, tolerance):
+    # What run_recognition used to do: compare_faces and face_distance per face,
+    # each of which computes the distances to the whole gallery list
+    results = []
+    for face_encoding in face_encodings:
+        matches = list(np.linalg.norm(known_face_encodings - face_encoding, axis=1) <= tolerance)
+        face_distances = np.linalg.norm(known_face_encodings - face_encoding, axis=1)
+        best_match_index = np.argmin(face_distances)
+        results.append((matches[best_match_index], face_distances[best_match_index]))
+    return results
+
+
+def measure(fn, min_time=0.5):
+    fn()
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--faces', type=int, default=8, help="faces per frame")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000, 10000, 50000])
+    parser.add_argument('--min-time', type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'gallery':>8} {'loop match/s':>14} {'batched match/s':>16} {'speedup':>8}")
+
+    for size in args.sizes:
+        encodings, names = synthetic_gallery(size)
+        queries = rng.normal(0, 0.09, (args.faces, 128)).astype(np.float32)
+        gallery = FaceGallery.from_encodings(encodings, names)
+        known_face_encodings = [np.asarray(e, dtype=np.float64) for e in encodings]
+
+        loop_time = measure(lambda: per_face_loop(known_face_encodings, queries, 0.6), args.min_time)
+        batch_time = measure(lambda: gallery.match(queries, 0.6), args.min_time)
+
+        print(f"{size:>8} {args.faces / loop_time:>14.0f} {args.faces / batch_time:>16.0f} "
+              f"{loop_time / batch_time:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
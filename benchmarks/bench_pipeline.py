@@ -0,0 +1,374 @@
+"""End-to-end benchmark of the recognition pipeline, without a webcam.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--gallery-size 1000] [--frames lecture.mp4] [--output results.json]
+    python benchmarks/bench_pipeline.py --images Images --frames test_frames/ --baseline baseline.json
+
+Measures gallery load time (gallery store sync and index build), per-stage
+frame latency (resize, face_locations, face_encodings, matching, drawing),
+matches per second and peak memory, and writes them as JSON. With --baseline the run is compared against an earlier
+results file and the exit status is 1 if any metric regressed by more than
+--threshold percent.
+
+The gallery is synthetic (--gallery-size) or built from a folder of
+registration photos (--images). Frames come from a video file or image folder
+(--frames), or are generated with a fixed seed. Without face_recognition the
+face_locations and face_encodings stages are skipped and every frame gets
+--faces synthetic faces, so matching and drawing are still measured.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_cache import EncodingCache, ENCODING_SIZE
+from gallery_index import create_index, INDEX_TYPES
+from gallery_store import GalleryStore, open_gallery
+from engine import RecognitionEngine, open_source
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ('resize', 'face_locations', 'face_encodings', 'matching', 'drawing')
+
+# Metrics compared against a baseline and whether a higher value is better
+COMPARED = {
+    'gallery_load_s': False,
+    'frame_ms_p50': False,
+    'frame_ms_p95': False,
+    'matches_per_s': True,
+    'peak_traced_mb': False,
+}
+
+
+def synthetic_gallery(size, images_per_user=5, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(0, 0.06, ((size + images_per_user - 1) // images_per_user, ENCODING_SIZE))
+    encodings = np.repeat(centers, images_per_user, axis=0)[:size]
+    encodings += rng.normal(0, 0.02, encodings.shape)
+    names = [f"user{i // images_per_user}" for i in range(size)]
+    return encodings.astype(np.float32), names
+
+
+def synthetic_frames(count, width=640, height=480, seed=0):
+    # Smooth gradient plus noise, so resize and drawing see realistic data sizes
+    rng = np.random.default_rng(seed)
+    base = np.linspace(0, 255, width, dtype=np.float32)[None, :, None].repeat(height, 0).repeat(3, 2)
+    for _ in range(count):
+        noise = rng.normal(0, 20, base.shape).astype(np.float32)
+        yield np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def recorded_frames(source, count):
+    cap, _ = open_source(source)
+    if not cap.isOpened():
+        sys.exit(f"Could not open frames: {source}")
+    try:
+        for _ in range(count):
+            ret, image = cap.read()
+            if not ret or image is None:
+                break
+            yield image
+    finally:
+        cap.release()
+
+
+def stage_stats(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    return {
+        'count': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'max_ms': float(values.max()),
+    }
+
+
+def load_synthetic_gallery(size, index, work_dir):
+    # Time the same path a normal start takes: open the gallery store, sync it
+    # and build the index over its rows
+    encodings, names = synthetic_gallery(size)
+    store = GalleryStore(os.path.join(work_dir, 'Gallery'))
+    for name in dict.fromkeys(names):
+        rows = [i for i, other in enumerate(names) if other == name]
+        store.put_user(store.new_id(), name, os.path.join(work_dir, 'Images', name), encodings[rows])
+
+    start = time.perf_counter()
+    store = GalleryStore(store.directory)
+    store.sync(os.path.join(work_dir, 'Images'))
+    gallery = open_gallery(store, index)
+    gallery.match(encodings[:1])
+    return gallery, {'warm_s': time.perf_counter() - start}
+
+
+def load_fixture_gallery(image_dir, index, work_dir, workers):
+    # Cold: every image encoded; warm: everything served from the store.
+    # sync() moves loose images into user folders, so it runs on a copy
+    images = os.path.join(work_dir, 'Images')
+    shutil.copytree(image_dir, images)
+    store = GalleryStore(os.path.join(work_dir, 'Gallery'))
+    for folder in sorted(os.listdir(images)):
+        if os.path.isdir(os.path.join(images, folder)):
+            store.put_user(store.new_id(), folder, os.path.join(images, folder))
+
+    timings = {}
+    for run in ('cold_s', 'warm_s'):
+        start = time.perf_counter()
+        store = GalleryStore(store.directory)
+        store.sync(images, workers=workers, cache=EncodingCache(os.path.join(work_dir, 'cache')))
+        gallery = open_gallery(store, index)
+        if len(gallery):
+            gallery.match(gallery.matrix[:1])
+        timings[run] = time.perf_counter() - start
+    return gallery, timings
+
+
+def run_frames(frames, gallery, face_recognition, faces, tolerance, seed=0):
+    rng = np.random.default_rng(seed)
+    samples = {stage: [] for stage in STAGES}
+    frame_times = []
+    matched = 0
+
+    for image in frames:
+        frame_start = time.perf_counter()
+
+        t = time.perf_counter()
+        small_frame = cv2.resize(image, (0, 0), fx=0.25, fy=0.25)
+        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+        samples['resize'].append(time.perf_counter() - t)
+
+        if face_recognition is not None:
+            t = time.perf_counter()
+            face_locations = face_recognition.face_locations(rgb_small_frame)
+            samples['face_locations'].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+            samples['face_encodings'].append(time.perf_counter() - t)
+        else:
+            # Synthetic faces near random gallery rows, laid out in a row across the frame
+            height, width = small_frame.shape[:2]
+            step = max(width // max(faces, 1), 1)
+            face_locations = [(height // 4, min((i + 1) * step, width) - 1, height * 3 // 4, i * step)
+                              for i in range(faces)]
+            rows = rng.integers(0, max(len(gallery), 1), faces)
+            face_encodings = gallery.matrix[rows] + rng.normal(0, 0.02, (faces, ENCODING_SIZE)).astype(np.float32) \
+                if len(gallery) else np.zeros((0, ENCODING_SIZE), dtype=np.float32)
+
+        t = time.perf_counter()
+        matches = gallery.match(face_encodings, tolerance=tolerance) if len(face_encodings) else []
+        samples['matching'].append(time.perf_counter() - t)
+        matched += len(matches)
+
+        results = []
+        for (top, right, bottom, left), match in zip(face_locations, matches):
+            confidence = 1 - match.distance
+            results.append(((top * 4, right * 4, bottom * 4, left * 4), match.name, confidence))
+
+        t = time.perf_counter()
+        RecognitionEngine.draw_results(image.copy(), results)
+        samples['drawing'].append(time.perf_counter() - t)
+
+        frame_times.append(time.perf_counter() - frame_start)
+
+    return samples, frame_times, matched
+
+
+def matches_per_second(gallery, faces, tolerance, min_time=0.5, seed=1):
+    # Steady-state throughput of gallery.match for a frame with `faces` faces
+    rng = np.random.default_rng(seed)
+    queries = gallery.matrix[rng.integers(0, len(gallery), faces)] + \
+        rng.normal(0, 0.02, (faces, ENCODING_SIZE)).astype(np.float32)
+    gallery.match(queries, tolerance)
+    runs = 0
+    start = time.perf_counter()
+    while True:
+        gallery.match(queries, tolerance)
+        runs += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return runs * faces / elapsed
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def max_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def compare(results, baseline, threshold):
+    """Prints a table of metric changes and returns the names of regressed metrics."""
+    regressions = []
+    print(f"\n{'metric':<18} {'baseline':>12} {'current':>12} {'change':>9}")
+    for metric, higher_is_better in COMPARED.items():
+        old = baseline['metrics'].get(metric)
+        new = results['metrics'].get(metric)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old * 100
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > threshold else ""
+        if flag:
+            regressions.append(metric)
+        print(f"{metric:<18} {old:>12.3f} {new:>12.3f} {change:>+8.1f}%{flag}")
+
+    for stage in STAGES:
+        old = (baseline['stages'].get(stage) or {}).get('p50_ms')
+        new = (results['stages'].get(stage) or {}).get('p50_ms')
+        if old and new is not None:
+            print(f"{stage + ' p50':<18} {old:>12.3f} {new:>12.3f} {(new - old) / old * 100:>+8.1f}%")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--gallery-size', type=int, default=1000, help="synthetic gallery size (default: 1000)")
+    parser.add_argument('--images', default=None, help="build the gallery from this folder of photos instead")
+    parser.add_argument('--index', default='exact', choices=list(INDEX_TYPES), help="gallery index backend")
+    parser.add_argument('--workers', type=int, default=None, help="processes used to encode --images")
+    parser.add_argument('--frames', default=None, help="video file or image folder (default: synthetic frames)")
+    parser.add_argument('--frame-count', type=int, default=100, help="frames to process (default: 100)")
+    parser.add_argument('--faces', type=int, default=4, help="synthetic faces per frame (default: 4)")
+    parser.add_argument('--tolerance', type=float, default=0.6)
+    parser.add_argument('--no-detect', action='store_true',
+                        help="skip face_locations/face_encodings even if face_recognition is installed")
+    parser.add_argument('--output', default=None, help="write results as JSON to this file")
+    parser.add_argument('--baseline', default=None, help="compare against an earlier results file")
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help="percent change counted as a regression (default: 10)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    face_recognition = None
+    if not args.no_detect:
+        try:
+            import face_recognition
+        except ImportError:
+            print("face_recognition is not installed, skipping face_locations and face_encodings", file=sys.stderr)
+
+    tracemalloc.start()
+    work_dir = tempfile.mkdtemp(prefix='bench-gallery-')
+    try:
+        if args.images:
+            gallery, load_times = load_fixture_gallery(args.images, args.index, work_dir, args.workers)
+        else:
+            gallery, load_times = load_synthetic_gallery(args.gallery_size, args.index, work_dir)
+        # The exact index maps the store's files, copy its rows before they are deleted
+        rows = gallery.live_rows()
+        gallery = create_index(args.index, np.array(gallery.matrix[rows]), [gallery.names[i] for i in rows])
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    if len(gallery) == 0:
+        sys.exit("The gallery is empty")
+
+    if args.frames:
+        frames = recorded_frames(args.frames, args.frame_count)
+    else:
+        frames = synthetic_frames(args.frame_count)
+    samples, frame_times, matched = run_frames(frames, gallery, face_recognition, args.faces, args.tolerance)
+    if not frame_times:
+        sys.exit(f"No frames could be read from {args.frames}")
+
+    throughput = matches_per_second(gallery, args.faces, args.tolerance)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    frame_ms = np.asarray(frame_times) * 1000
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'face_recognition': face_recognition is not None,
+        },
+        'config': {
+            'gallery': args.images or 'synthetic',
+            'gallery_size': len(gallery),
+            'index': args.index,
+            'frames': args.frames or 'synthetic',
+            'frame_count': len(frame_times),
+            'faces': args.faces,
+            'tolerance': args.tolerance,
+        },
+        'metrics': {
+            'gallery_load_s': load_times['warm_s'],
+            'gallery_load_cold_s': load_times.get('cold_s'),
+            'frame_ms_p50': float(np.percentile(frame_ms, 50)),
+            'frame_ms_p95': float(np.percentile(frame_ms, 95)),
+            'fps': len(frame_ms) / (frame_ms.sum() / 1000),
+            'faces_matched': matched,
+            'matches_per_s': throughput,
+            'peak_traced_mb': peak / (1024 * 1024),
+            'max_rss_mb': max_rss_mb(),
+        },
+        'stages': {stage: stage_stats(samples[stage]) for stage in STAGES},
+    }
+
+    metrics = results['metrics']
+    print(f"Gallery: {len(gallery)} encodings ({args.index}), loaded in {metrics['gallery_load_s'] * 1000:.1f} ms"
+          + (f", {metrics['gallery_load_cold_s']:.1f}s cold" if metrics['gallery_load_cold_s'] is not None else ""))
+    print(f"Frames: {len(frame_times)}, p50 {metrics['frame_ms_p50']:.2f} ms, p95 {metrics['frame_ms_p95']:.2f} ms, "
+          f"{metrics['fps']:.1f} fps")
+    print(f"{'stage':<16} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for stage in STAGES:
+        stats = results['stages'][stage]
+        if stats is None:
+            print(f"{stage:<16} {'skipped':>9}")
+        else:
+            print(f"{stage:<16} {stats['p50_ms']:>9.3f} {stats['p95_ms']:>9.3f} {stats['max_ms']:>9.3f}")
+    print(f"Matching: {metrics['matches_per_s']:.0f} matches/s")
+    print(f"Peak memory: {metrics['peak_traced_mb']:.1f} MB traced"
+          + (f", {metrics['max_rss_mb']:.1f} MB max RSS" if metrics['max_rss_mb'] is not None else ""))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != results['config']:
+            print("Warning: the baseline was run with a different configuration", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressed by more than {args.threshold:.0f}%: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
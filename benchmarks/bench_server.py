@@ -0,0 +1,190 @@
+"""Load generator for the recognition server: throughput and tail latency.
+
+Usage: python benchmarks/bench_server.py [--url http://host:8765] [--mode frames|encodings]
+                                         [--concurrency 16] [--duration 20]
+
+Every client thread plays one kiosk: it keeps a connection open and sends
+its next request as soon as the last one is answered. frames mode posts the
+registered images (or --frames) as JPEG, encodings mode posts stored
+gallery encodings with some noise, the way a kiosk that encodes locally
+would. Without --url a server is started in this process on a free port
+with --workers encoding processes, so the whole path can be measured on one
+machine. Marks go to a temporary folder unless --output is given.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import http.client
+from urllib.parse import urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_cache import IMAGE_EXTENSIONS
+from gallery_store import GALLERY_DIR, GalleryStore, user_images
+
+
+def load_payloads(args):
+    if args.mode == 'frames':
+        if args.frames:
+            paths = [os.path.join(args.frames, file) for file in sorted(os.listdir(args.frames))
+                     if file.endswith(IMAGE_EXTENSIONS)]
+        else:
+            store = GalleryStore(args.gallery)
+            paths = [path for user in store.users.values() for path in user_images(user['folder'])]
+        payloads = []
+        for path in paths[:args.limit]:
+            with open(path, 'rb') as f:
+                payloads.append(f.read())
+        return payloads
+
+    encodings, _ = GalleryStore(args.gallery).live_encodings()
+    rng = np.random.default_rng(0)
+    if not len(encodings):
+        encodings = rng.normal(0, 0.09, (args.limit, 128))
+    picks = encodings[rng.integers(0, len(encodings), args.limit)]
+    picks = picks + rng.normal(0, 0.02, picks.shape)
+    return [json.dumps({'encodings': [row.tolist()]}).encode('utf-8') for row in picks]
+
+
+def run_client(number, url, mode, payloads, deadline, max_requests, results):
+    path = f"/frame?kiosk=kiosk{number}" if mode == 'frames' else "/encodings"
+    content_type = 'image/jpeg' if mode == 'frames' else 'application/json'
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+    rng = random.Random(number)
+    latencies, errors, busy = [], 0, 0
+    sent = 0
+    while time.perf_counter() < deadline and (max_requests is None or sent < max_requests):
+        body = payloads[rng.randrange(len(payloads))]
+        started = time.perf_counter()
+        try:
+            connection.request('POST', path, body=body, headers={'Content-Type': content_type})
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection(url.hostname, url.port, timeout=60)
+            continue
+        finally:
+            sent += 1
+        if response.status == 200:
+            latencies.append(time.perf_counter() - started)
+        elif response.status == 503:
+            busy += 1
+            time.sleep(0.01)
+        else:
+            errors += 1
+    connection.close()
+    results[number] = (latencies, errors, busy)
+
+
+def fetch_stats(url):
+    connection = http.client.HTTPConnection(url.hostname, url.port, timeout=10)
+    try:
+        connection.request('GET', '/stats')
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def start_local_server(args):
+    from engine import RecognitionEngine, open_attendance_sink
+    from recognition_server import RecognitionServer, make_server
+
+    output = args.output or tempfile.mkdtemp(prefix='bench-server-')
+    engine = RecognitionEngine(sink=open_attendance_sink(output), on_log=lambda message: None)
+    recognition = RecognitionServer(engine, workers=args.workers, max_batch=args.max_batch,
+                                    max_wait=args.max_wait / 1000.0)
+    recognition.reload_gallery(args.images, gallery_dir=args.gallery)
+    recognition.start()
+    server = make_server(recognition, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, recognition, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=None, help="server to load (default: start one in this process)")
+    parser.add_argument('--mode', choices=['frames', 'encodings'], default='frames')
+    parser.add_argument('--concurrency', type=int, default=16, help="client threads, one connection each")
+    parser.add_argument('--duration', type=float, default=20.0, help="seconds to run")
+    parser.add_argument('--requests', type=int, default=None, help="stop every client after this many requests")
+    parser.add_argument('--frames', default=None, help="folder of JPEG frames (default: registered images)")
+    parser.add_argument('--limit', type=int, default=200, help="distinct payloads to cycle through")
+    parser.add_argument('--images', default='Images')
+    parser.add_argument('--gallery', default=GALLERY_DIR)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="encoding processes of a local server")
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--max-wait', type=float, default=5.0, help="batching window of a local server in ms")
+    parser.add_argument('--output', default=None, help="attendance folder of a local server")
+    parser.add_argument('--json', default=None, help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args)
+    if not payloads:
+        print("Nothing to send, register users first or pass --frames")
+        return 1
+
+    server = recognition = None
+    url = args.url
+    if url is None:
+        server, recognition, url = start_local_server(args)
+    parsed = urlparse(url)
+
+    results = {}
+    started = time.perf_counter()
+    deadline = started + args.duration
+    clients = [threading.Thread(target=run_client, args=(i, parsed, args.mode, payloads, deadline, args.requests,
+                                                         results))
+               for i in range(args.concurrency)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = np.array([latency for result in results.values() for latency in result[0]])
+    errors = sum(result[1] for result in results.values())
+    busy = sum(result[2] for result in results.values())
+    server_stats = fetch_stats(parsed)
+    if server is not None:
+        server.shutdown()
+        recognition.stop()
+
+    report = {
+        'mode': args.mode,
+        'concurrency': args.concurrency,
+        'elapsed_s': elapsed,
+        'requests': int(len(latencies)),
+        'errors': errors,
+        'rejected': busy,
+        'requests_per_s': len(latencies) / elapsed,
+        'latency_ms_p50': float(np.percentile(latencies, 50)) * 1000 if len(latencies) else 0.0,
+        'latency_ms_p95': float(np.percentile(latencies, 95)) * 1000 if len(latencies) else 0.0,
+        'latency_ms_p99': float(np.percentile(latencies, 99)) * 1000 if len(latencies) else 0.0,
+        'latency_ms_max': float(latencies.max()) * 1000 if len(latencies) else 0.0,
+        'server_batch_mean': server_stats.get('batch_mean'),
+        'server_marks': server_stats.get('marks'),
+    }
+    print(f"{report['requests']} requests in {elapsed:.1f}s from {args.concurrency} clients ({args.mode}): "
+          f"{report['requests_per_s']:.1f} per second, {errors} errors, {busy} rejected")
+    print(f"Latency: p50 {report['latency_ms_p50']:.1f} ms, p95 {report['latency_ms_p95']:.1f} ms, "
+          f"p99 {report['latency_ms_p99']:.1f} ms, max {report['latency_ms_max']:.1f} ms")
+    print(f"Server: mean batch {report['server_batch_mean']:.1f}, {report['server_marks']} marks")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""How long the GUI blocks at startup and what the first recognition pays.
+
+Usage: python benchmarks/bench_startup.py [--repeat 5]
+
+Every phase is timed in fresh interpreters:
+  gui import       import natt, everything before the main window can be drawn
+  app modules      OpenCV, numpy and the recognition modules not loaded by then
+  models           import face_recognition, which loads the dlib models
+  first inference  one detection and encoding on a blank frame
+  steady inference the same call again
+Medians are reported. models and the inference phases are skipped without
+face_recognition.
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, time
+timings = {}
+t = time.perf_counter()
+import natt
+timings['gui import'] = time.perf_counter() - t
+
+t = time.perf_counter()
+import cv2, numpy, engine, registration, preview, analytics
+timings['app modules'] = time.perf_counter() - t
+
+try:
+    t = time.perf_counter()
+    import face_recognition
+    timings['models'] = time.perf_counter() - t
+
+    image = numpy.zeros((160, 160, 3), dtype=numpy.uint8)
+    for phase in ('first inference', 'steady inference'):
+        t = time.perf_counter()
+        face_recognition.face_locations(image)
+        face_recognition.face_encodings(image, [(20, 140, 140, 20)])
+        timings[phase] = time.perf_counter() - t
+except ImportError:
+    pass
+print(json.dumps(timings))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help="write the medians as JSON")
+    args = parser.parse_args()
+
+    runs = []
+    for _ in range(args.repeat):
+        out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, capture_output=True, text=True, check=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    medians = {phase: statistics.median(run[phase] for run in runs) for phase in runs[0]}
+    for phase, seconds in medians.items():
+        print(f"{phase:>17}: {seconds * 1000:8.1f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(medians, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
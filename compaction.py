@@ -0,0 +1,187 @@
+from collections import namedtuple
+
+import numpy as np
+
+from face_cache import ENCODING_SIZE
+
+CompactionReport = namedtuple('CompactionReport', [
+    'encodings', 'prototypes', 'ratio', 'users', 'evaluated', 'accuracy_full', 'accuracy_compact',
+    'prototypes_per_user', 'encodings_per_user',
+])
+
+
+def describe_compaction(report):
+    text = (f"Compacted {report.encodings} encodings to {report.prototypes} prototypes "
+            f"({report.ratio:.1f}x smaller)")
+    if report.evaluated:
+        delta = (report.accuracy_compact - report.accuracy_full) * 100
+        text += (f", accuracy on {report.evaluated} registration images {report.accuracy_compact:.1%} "
+                 f"vs {report.accuracy_full:.1%} ({delta:+.1f} points)")
+    return text
+
+
+def user_prototypes(encodings, k, method='centroid', iterations=10, seed=0):
+    """Reduce one user's encodings to at most k prototypes.
+
+    k=1 is the mean encoding. Larger k runs k-means; with method='medoid'
+    every prototype is the real encoding closest to its cluster center
+    instead of the center itself.
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    if k >= len(encodings):
+        return encodings.copy()
+
+    if k == 1:
+        centers = encodings.mean(axis=0, keepdims=True)
+    else:
+        rng = np.random.default_rng(seed)
+        # k-means++ seeding, then a few Lloyd iterations
+        centers = [encodings[rng.integers(len(encodings))]]
+        for _ in range(1, k):
+            d2 = np.min([np.sum((encodings - c) ** 2, axis=1) for c in centers], axis=0)
+            centers.append(encodings[rng.choice(len(encodings), p=d2 / d2.sum()) if d2.sum() > 0 else 0])
+        centers = np.array(centers)
+        for _ in range(iterations):
+            assignment = np.argmin(((encodings[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=1)
+            for c in range(k):
+                members = encodings[assignment == c]
+                if len(members):
+                    centers[c] = members.mean(axis=0)
+
+    if method == 'medoid':
+        nearest = np.argmin(((encodings[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2), axis=0)
+        centers = encodings[np.unique(nearest)]
+    return centers.astype(np.float32)
+
+
+def _predict(gallery, labels, queries, tolerance, chunk=2048):
+    # Label of the closest gallery row per query, -1 when nothing is within tolerance
+    predicted = np.full(len(queries), -1, dtype=np.int64)
+    if not len(gallery):
+        return predicted
+    g_sq = np.einsum('ij,ij->i', gallery, gallery)
+    for start in range(0, len(queries), chunk):
+        q = queries[start:start + chunk]
+        d2 = g_sq[None, :] - 2.0 * (q @ gallery.T) + np.einsum('ij,ij->i', q, q)[:, None]
+        best = np.argmin(d2, axis=1)
+        within = d2[np.arange(len(q)), best] <= tolerance ** 2
+        predicted[start:start + len(q)] = np.where(within, labels[best], -1)
+    return predicted
+
+
+def _build(groups, counts, method, rows=None):
+    # Prototypes for every user from the given rows of their encodings
+    encodings, labels = [], []
+    for label, user in enumerate(groups):
+        members = user if rows is None else user[rows[label]]
+        if not len(members):
+            continue
+        prototypes = user_prototypes(members, counts[label], method)
+        encodings.append(prototypes)
+        labels.append(np.full(len(prototypes), label))
+    if not encodings:
+        return np.zeros((0, ENCODING_SIZE), dtype=np.float32), np.zeros(0, dtype=np.int64)
+    return np.vstack(encodings), np.concatenate(labels)
+
+
+def compact_gallery(encodings, names, max_prototypes=3, margin=0.01, tolerance=0.6, method='centroid',
+                    max_eval=10000, seed=0):
+    """Reduce every user to a few prototypes while keeping accuracy within margin.
+
+    Accuracy is cross-validated on the registration images themselves: each
+    user's images are split in two halves, prototypes built from one half
+    have to identify the other half, and the result is compared with the full
+    encodings of the same half. Users start with a single prototype and get
+    more, up to max_prototypes and then all their encodings, until their
+    accuracy is within margin of the full gallery.
+
+    Returns (encodings, names, CompactionReport).
+    """
+    encodings = np.asarray(encodings, dtype=np.float32)
+    users = list(dict.fromkeys(names))
+    label_of = {name: i for i, name in enumerate(users)}
+    labels = np.array([label_of[name] for name in names], dtype=np.int64)
+    groups = [encodings[labels == i] for i in range(len(users))]
+    sizes = np.array([len(group) for group in groups])
+
+    # Halves for cross-validation, users with a single image are not evaluated
+    rng = np.random.default_rng(seed)
+    halves = []
+    for group in groups:
+        order = rng.permutation(len(group))
+        halves.append((order[::2], order[1::2]) if len(group) > 1 else (order, order[:0]))
+
+    eval_fraction = min(1.0, max_eval / max(len(encodings), 1))
+    eval_sets = []
+    for side in (0, 1):
+        test_rows = [half[1 - side] if sizes[i] > 1 else half[0][:0] for i, half in enumerate(halves)]
+        if eval_fraction < 1.0:
+            test_rows = [rows[rng.random(len(rows)) < eval_fraction] for rows in test_rows]
+        queries = np.vstack([groups[i][rows] for i, rows in enumerate(test_rows)] + [encodings[:0]])
+        truth = np.concatenate([np.full(len(rows), i) for i, rows in enumerate(test_rows)] + [labels[:0]])
+        eval_sets.append(([half[side] for half in halves], queries, truth))
+
+    def per_user_accuracy(counts):
+        correct = np.zeros(len(users))
+        total = np.zeros(len(users))
+        for train_rows, queries, truth in eval_sets:
+            gallery, gallery_labels = _build(groups, counts, method, train_rows)
+            predicted = _predict(gallery, gallery_labels, queries, tolerance)
+            np.add.at(total, truth, 1)
+            np.add.at(correct, truth, predicted == truth)
+        return correct, total
+
+    full_correct, total = per_user_accuracy(sizes)
+    full_accuracy = np.divide(full_correct, total, out=np.ones(len(users)), where=total > 0)
+
+    counts = np.minimum(sizes, 1)
+    while True:
+        correct, _ = per_user_accuracy(counts)
+        accuracy = np.divide(correct, total, out=np.ones(len(users)), where=total > 0)
+        failing = (accuracy < full_accuracy - margin) & (counts < sizes)
+        if not failing.any():
+            break
+        # Past max_prototypes a user keeps every encoding, so this always ends
+        counts = np.where(failing, np.where(counts + 1 > max_prototypes, sizes, counts + 1), counts)
+
+    compact, compact_labels = _build(groups, counts, method)
+    per_user = np.bincount(compact_labels, minlength=len(users))
+    report = CompactionReport(
+        encodings=len(encodings),
+        prototypes=len(compact),
+        ratio=len(encodings) / max(len(compact), 1),
+        users=len(users),
+        evaluated=int(total.sum()),
+        accuracy_full=float(full_correct.sum() / max(total.sum(), 1)),
+        accuracy_compact=float(correct.sum() / max(total.sum(), 1)),
+        prototypes_per_user={users[i]: int(per_user[i]) for i in range(len(users))},
+        encodings_per_user={users[i]: int(sizes[i]) for i in range(len(users))},
+    )
+    return compact, [users[label] for label in compact_labels], report
+
+
+def compact_user(report, name, encodings, **options):
+    """Prototypes for one user's new encodings and the report with them in it.
+
+    For a registration while a compacted gallery is in use: the user is
+    compacted on their own, with their halves cross-validated against each
+    other only. The accuracy figures stay those of the last full
+    compact_gallery(). No encodings removes the user from the report.
+    Returns (prototypes, CompactionReport).
+    """
+    encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+    prototypes_per_user = dict(report.prototypes_per_user)
+    encodings_per_user = dict(report.encodings_per_user)
+    prototypes_per_user.pop(name, None)
+    encodings_per_user.pop(name, None)
+    prototypes = encodings
+    if len(encodings):
+        prototypes, _, _ = compact_gallery(encodings, [name] * len(encodings), **options)
+        prototypes_per_user[name] = len(prototypes)
+        encodings_per_user[name] = len(encodings)
+
+    total = sum(encodings_per_user.values())
+    compacted = sum(prototypes_per_user.values())
+    return prototypes, report._replace(encodings=total, prototypes=compacted, ratio=total / max(compacted, 1),
+                                       users=len(prototypes_per_user), prototypes_per_user=prototypes_per_user,
+                                       encodings_per_user=encodings_per_user)
@@ -0,0 +1,288 @@
+import os
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+MODEL_DIR = 'Models'
+
+# Files of OpenCV's ResNet-10 SSD face detector, see the README for where to get them
+DNN_MODEL = os.path.join(MODEL_DIR, 'res10_300x300_ssd_iter_140000.caffemodel')
+DNN_CONFIG = os.path.join(MODEL_DIR, 'deploy.prototxt')
+
+# Recall the auto-selected detector must reach on the host's fixture frames
+MIN_RECALL = 0.9
+
+DetectorScore = namedtuple('DetectorScore', ['kind', 'recall', 'false_positives', 'latency', 'error'])
+
+
+class DetectorUnavailable(Exception):
+    pass
+
+
+class FaceDetector:
+    """Finds faces in an RGB image.
+
+    detect() returns (top, right, bottom, left) boxes in image pixels, the
+    layout face_recognition uses, so the boxes can go straight to the tracker
+    and the encoder. min_face is the smallest face height, in pixels of the
+    image passed to detect(), that the backend finds reliably; the adaptive
+    controller keeps faces above it when it lowers the detection scale.
+    Models are loaded on first use, and detectors pickle without them so they
+    can be sent to worker processes.
+    """
+
+    KIND = None
+    min_face = 40
+
+    def detect(self, rgb_image):
+        raise NotImplementedError
+
+    def load(self):
+        pass
+
+    @property
+    def key(self):
+        # Identifies the backend and its options, worker processes keep one loaded detector per key
+        options = {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+        return (self.KIND,) + tuple(sorted(options.items()))
+
+    def __getstate__(self):
+        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def describe(self):
+        # Model file paths are left out
+        options = ", ".join(f"{k}={v}" for k, v in self.key[1:] if not isinstance(v, str))
+        return f"{self.KIND} ({options})" if options else self.KIND
+
+
+class HogDetector(FaceDetector):
+    """dlib's HOG detector through face_recognition, what recognition has always used.
+
+    Accurate on frontal faces and slow: the cost grows with the image area,
+    and every upsample step doubles the resolution to find smaller faces.
+    """
+
+    KIND = 'hog'
+
+    def __init__(self, upsample=1):
+        self.upsample = upsample
+
+    @property
+    def min_face(self):
+        # About 80 pixels without upsampling, halved by every upsample step
+        return 80 // (2 ** self.upsample)
+
+    def detect(self, rgb_image):
+        import face_recognition
+        return face_recognition.face_locations(rgb_image, number_of_times_to_upsample=self.upsample, model='hog')
+
+    def load(self):
+        import face_recognition
+
+
+class HaarDetector(FaceDetector):
+    """OpenCV's Haar cascade, the fastest backend.
+
+    Misses turned and badly lit faces more often than the others and finds
+    the odd face in background texture; more neighbors trades recall for
+    fewer false positives.
+    """
+
+    KIND = 'haar'
+
+    def __init__(self, cascade=None, scale_factor=1.1, min_neighbors=5, min_size=24):
+        self.cascade = cascade or cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+        self.min_size = min_size
+        self._classifier = None
+
+    @property
+    def min_face(self):
+        return self.min_size
+
+    def load(self):
+        if self._classifier is None:
+            if not hasattr(cv2, 'CascadeClassifier'):
+                # OpenCV 5 moved the cascades out of the main package
+                raise DetectorUnavailable("This OpenCV build has no Haar cascade support")
+            classifier = cv2.CascadeClassifier(self.cascade)
+            if classifier.empty():
+                raise DetectorUnavailable(f"Could not load Haar cascade {self.cascade}")
+            self._classifier = classifier
+        return self._classifier
+
+    def detect(self, rgb_image):
+        gray = cv2.cvtColor(rgb_image, cv2.COLOR_RGB2GRAY)
+        faces = self.load().detectMultiScale(gray, self.scale_factor, self.min_neighbors,
+                                             minSize=(self.min_size, self.min_size))
+        return [(int(y), int(x + w), int(y + h), int(x)) for (x, y, w, h) in faces]
+
+
+class DnnDetector(FaceDetector):
+    """OpenCV's ResNet-10 SSD face detector, run with cv2.dnn on the CPU.
+
+    Finds turned, tilted and partly covered faces the cascades miss. Every
+    image is resized to input_size, so the cost hardly depends on the frame
+    size and a larger input_size finds smaller faces. confidence is the
+    score below which detections are dropped.
+    """
+
+    KIND = 'dnn'
+    min_face = 24
+
+    def __init__(self, model=DNN_MODEL, config=DNN_CONFIG, confidence=0.6, input_size=300):
+        self.model = model
+        self.config = config
+        self.confidence = confidence
+        self.input_size = input_size
+        self._net = None
+
+    def load(self):
+        if self._net is None:
+            for path in (self.model, self.config):
+                if not os.path.exists(path):
+                    raise DetectorUnavailable(f"DNN face detector model not found: {path}")
+            self._net = cv2.dnn.readNet(self.model, self.config)
+        return self._net
+
+    def detect(self, rgb_image):
+        net = self.load()
+        height, width = rgb_image.shape[:2]
+        # The model was trained on BGR input with these channel means
+        blob = cv2.dnn.blobFromImage(rgb_image, 1.0, (self.input_size, self.input_size),
+                                     (104.0, 177.0, 123.0), swapRB=True)
+        net.setInput(blob)
+        detections = net.forward().reshape(-1, 7)
+        detections = detections[detections[:, 2] >= self.confidence]
+
+        boxes = []
+        for left, top, right, bottom in detections[:, 3:7] * [width, height, width, height]:
+            top, left = max(int(top), 0), max(int(left), 0)
+            bottom, right = min(int(bottom), height), min(int(right), width)
+            if bottom > top and right > left:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+
+DETECTOR_TYPES = {
+    HogDetector.KIND: HogDetector,
+    HaarDetector.KIND: HaarDetector,
+    DnnDetector.KIND: DnnDetector,
+}
+
+
+def create_detector(kind='hog', **options):
+    if kind not in DETECTOR_TYPES:
+        raise ValueError(f"Unknown face detector '{kind}', expected one of {', '.join(DETECTOR_TYPES)}")
+    return DETECTOR_TYPES[kind](**options)
+
+
+def _overlap(a, b):
+    # Intersection over union of two (top, right, bottom, left) boxes
+    height = min(a[2], b[2]) - max(a[0], b[0])
+    width = min(a[1], b[1]) - max(a[3], b[3])
+    if height <= 0 or width <= 0:
+        return 0.0
+    inter = height * width
+    area = (a[2] - a[0]) * (a[1] - a[3]) + (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area - inter)
+
+
+def score_detector(detector, frames, truth=None, min_overlap=0.3, warmup=1):
+    """Recall, false positives per frame and median latency on fixture frames.
+
+    frames are RGB images. truth holds the expected boxes per frame; without
+    it every frame is taken to show exactly one face, as registration images
+    do. The backends draw their boxes differently, so a detection counts as
+    a hit at min_overlap intersection over union.
+    """
+    try:
+        detector.load()
+        for frame in frames[:warmup]:
+            detector.detect(frame)
+    except (DetectorUnavailable, ImportError, cv2.error) as e:
+        return DetectorScore(detector.KIND, 0.0, 0.0, None, str(e))
+
+    found = expected = extra = 0
+    latencies = []
+    for i, frame in enumerate(frames):
+        started = time.perf_counter()
+        boxes = detector.detect(frame)
+        latencies.append(time.perf_counter() - started)
+
+        if truth is None:
+            expected += 1
+            found += 1 if boxes else 0
+            extra += max(len(boxes) - 1, 0)
+            continue
+        unmatched = list(boxes)
+        for box in truth[i]:
+            expected += 1
+            best = max(unmatched, key=lambda candidate: _overlap(box, candidate), default=None)
+            if best is not None and _overlap(box, best) >= min_overlap:
+                unmatched.remove(best)
+                found += 1
+        extra += len(unmatched)
+
+    recall = found / float(expected) if expected else 1.0
+    return DetectorScore(detector.KIND, recall, extra / float(max(len(frames), 1)),
+                         float(np.median(latencies)) if latencies else None, None)
+
+
+def select_detector(frames, truth=None, min_recall=MIN_RECALL, candidates=None):
+    """Pick the fastest backend that reaches min_recall on the fixture frames.
+
+    candidates are detectors to try, one of each type with default options
+    if not given. When none reaches min_recall the one with the best recall
+    wins. Returns (detector, scores) with one DetectorScore per candidate.
+    """
+    if candidates is None:
+        candidates = [create_detector(kind) for kind in DETECTOR_TYPES]
+    scores = [score_detector(detector, frames, truth) for detector in candidates]
+
+    usable = [(score, detector) for score, detector in zip(scores, candidates) if score.error is None]
+    if not usable:
+        raise DetectorUnavailable("No face detector backend could be loaded: "
+                                  + "; ".join(f"{s.kind}: {s.error}" for s in scores))
+    passing = [(score, detector) for score, detector in usable if score.recall >= min_recall]
+    if passing:
+        _, detector = min(passing, key=lambda pair: pair[0].latency)
+    else:
+        _, detector = max(usable, key=lambda pair: (pair[0].recall, -pair[0].latency))
+    return detector, scores
+
+
+def fixture_frames(images, scale=0.25, limit=40):
+    """RGB fixture frames from registration image paths, shrunk like recognition frames.
+
+    Registration images show one face each, which is what score_detector
+    assumes without ground truth boxes.
+    """
+    step = max(len(images) // limit, 1) if limit else 1
+    frames = []
+    for path in images[::step][:limit or None]:
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        if scale != 1:
+            image = cv2.resize(image, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        frames.append(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+    return frames
+
+
+def describe_scores(scores, chosen=None):
+    lines = []
+    for score in scores:
+        if score.error is not None:
+            lines.append(f"{score.kind}: unavailable, {score.error}")
+            continue
+        mark = " <- selected" if chosen is not None and score.kind == chosen.KIND else ""
+        lines.append(f"{score.kind}: recall {score.recall:.0%}, {score.false_positives:.2f} false positives "
+                     f"per frame, {score.latency * 1000:.1f} ms{mark}")
+    return lines
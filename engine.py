@@ -0,0 +1,831 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from face_cache import IMAGE_EXTENSIONS, ENCODING_SIZE
+from gallery_store import GALLERY_DIR, GalleryStore, open_gallery, user_images
+from matching import FaceGallery
+from gallery_index import create_index
+from pipeline import DropOldestQueue, FrameGrabber, QueueClosed
+from tracking import FaceTracker
+from attendance_store import AttendanceStore, BatchedMarkWriter
+from instrumentation import StageTimings, SamplingProfiler
+from adaptive import AdaptiveController
+from compaction import compact_gallery, compact_user, describe_compaction
+from detectors import MIN_RECALL, HogDetector, create_detector, select_detector, fixture_frames
+
+STATS_DIR = 'Stats'
+
+
+def load_gallery(image_dir='Images', index='exact', workers=None, on_progress=None, compact=False,
+                 gallery_dir=GALLERY_DIR):
+    # Users come from the gallery store, only pending users and loose images from
+    # the old Images/ layout are encoded. The exact index maps the stored rows
+    # without copying them. With compact=True every user is reduced to a few
+    # prototype encodings.
+    store = GalleryStore(gallery_dir)
+    result = store.sync(image_dir, workers=workers, on_progress=on_progress)
+    if not compact:
+        return open_gallery(store, index), result
+
+    encodings, names, report = compact_gallery(*store.live_encodings())
+    gallery = create_index(index, encodings, names)
+    gallery.compaction = report
+    return gallery, result
+
+
+def _summarize(items, limit=5):
+    text = ", ".join(items[:limit])
+    if len(items) > limit:
+        text += f" and {len(items) - limit} more"
+    return text
+
+
+def describe_gallery_load(gallery, result):
+    # Problems are reported as one summary line each instead of one line per file
+    messages = []
+    if result.no_face_files:
+        messages.append(f"Warning: No face found in {len(result.no_face_files)} images: "
+                        f"{_summarize(result.no_face_files)}")
+    if result.failures:
+        messages.append(f"Error processing {len(result.failures)} images: "
+                        f"{_summarize([f'{file} ({error})' for file, error in result.failures])}")
+
+    stats = result.stats
+    text = (f"Loaded {stats['images']} face images for {stats['users']} users "
+            f"({stats['cached']} stored, {stats['encoded']} encoded)")
+    if stats['imported']:
+        text += f", moved {stats['imported']} images from the old Images/ layout into the gallery"
+    messages.append(text)
+    if gallery.compaction is not None:
+        messages.append(describe_compaction(gallery.compaction))
+    return messages
+
+
+def recognize_frame(image, gallery, tolerance=0.6, scale=0.25, detector=None):
+    """Detect and match every face in one BGR frame, without tracking.
+
+    Returns a list of (box, name, confidence) with boxes in frame coordinates.
+    detector defaults to dlib's HOG detector.
+    """
+    import face_recognition
+
+    small_frame = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+    rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+    face_locations = (detector or HogDetector()).detect(rgb_small_frame)
+    if not face_locations:
+        return []
+    face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+
+    results = []
+    for (top, right, bottom, left), match in zip(face_locations, gallery.match(face_encodings, tolerance=tolerance)):
+        confidence = 1 - match.distance
+        box = (int(top / scale), int(right / scale), int(bottom / scale), int(left / scale))
+        results.append((box, match.name, confidence))
+    return results
+
+
+# Detectors unpickled in this worker process, with their models loaded
+_worker_detectors = {}
+
+
+def detect_faces(rgb_image, detector):
+    # Module level so it can run in a worker process
+    loaded = _worker_detectors.setdefault(detector.key, detector)
+    return loaded.detect(rgb_image)
+
+
+def encode_faces(rgb_image, face_locations):
+    import face_recognition
+    return face_recognition.face_encodings(rgb_image, face_locations)
+
+
+def warm_up_models():
+    # Loads the dlib models and runs one detection and one encoding on a blank
+    # image, so the first real frame does not pay for first-call setup. Also
+    # used to warm up pool workers before the first frame is sent to them
+    import face_recognition
+    image = np.zeros((160, 160, 3), dtype=np.uint8)
+    face_recognition.face_locations(image)
+    face_recognition.face_encodings(image, [(20, 140, 140, 20)])
+    return True
+
+
+def choose_detector(kind='hog', gallery_dir=GALLERY_DIR, min_recall=MIN_RECALL, scale=0.25):
+    """Face detector backend by name, or 'auto' to measure them on this host.
+
+    'auto' runs every backend on registration images shrunk to the detection
+    scale, which show one face each, and picks the fastest one that finds at
+    least min_recall of them. Returns (detector, scores); scores is empty
+    unless auto-selection ran.
+    """
+    if kind != 'auto':
+        return create_detector(kind), []
+
+    store = GalleryStore(gallery_dir)
+    images = [path for user in store.users.values() for path in user_images(user['folder'])]
+    frames = fixture_frames(images, scale)
+    if not frames:
+        return HogDetector(), []
+    return select_detector(frames, min_recall=min_recall)
+
+
+def open_attendance_sink(directory='Attendance'):
+    # Marks go to the attendance database in directory, written in batches off
+    # the recognition thread
+    return BatchedMarkWriter(AttendanceStore(os.path.join(directory, 'attendance.db'), csv_dir=directory))
+
+
+class MarkedNames:
+    """Thread-safe set of the people already marked today.
+
+    Several cameras share one instance, so whoever sees a person first marks
+    them and everyone else skips the mark. The set starts over when the date
+    changes, so a session left running overnight marks everyone again the
+    next day.
+    """
+
+    def __init__(self):
+        self._names = set()
+        self._day = None
+        self._lock = threading.Lock()
+
+    def claim(self, name, when=None):
+        # True for the first caller with this name on the day of when (default
+        # now), False after that
+        day = (when or datetime.now()).strftime('%Y-%m-%d')
+        with self._lock:
+            if day != self._day:
+                self._names.clear()
+                self._day = day
+            if name in self._names:
+                return False
+            self._names.add(name)
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._names.clear()
+            self._day = None
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __len__(self):
+        return len(self._names)
+
+
+class StdoutSink:
+    def mark(self, name, when):
+        print(f'{name},{when.strftime("%H:%M:%S")},{when.strftime("%Y-%m-%d")}', flush=True)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class ImageFolderSource:
+    """cv2.VideoCapture look-alike that yields the images of a folder in name order."""
+
+    def __init__(self, folder):
+        self.files = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(IMAGE_EXTENSIONS))
+        self.position = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        while self.position < len(self.files):
+            image = cv2.imread(self.files[self.position])
+            self.position += 1
+            if image is not None:
+                return True, image
+        return False, None
+
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        return 0
+
+    def release(self):
+        self.position = len(self.files)
+
+
+def open_source(source):
+    """Open a device index, video file, stream URL or image folder.
+
+    Returns (cap, live). Live sources are run through the dropping pipeline;
+    files and folders are processed frame by frame so every frame is seen.
+    """
+    source = str(source)
+    if source.isdigit():
+        return cv2.VideoCapture(int(source)), True
+    if os.path.isdir(source):
+        return ImageFolderSource(source), False
+    if os.path.isfile(source):
+        return cv2.VideoCapture(source), False
+    return cv2.VideoCapture(source), True
+
+
+def stats_file_path(kind, extension, directory=STATS_DIR):
+    return os.path.join(directory, f"{kind}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{extension}")
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) * 1000 if len(values) else 0.0
+
+
+class EngineStats:
+    def __init__(self, window=10000):
+        self.started_at = time.time()
+        self.stopped_at = None
+        self.frames_captured = 0
+        self.frames_processed = 0
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+        self.faces_detected = 0
+        self.faces_encoded = 0
+        self.marks = 0
+        self.dropped = 0
+        self.processing = deque(maxlen=window)
+        self.end_to_end = deque(maxlen=window)
+        self.timings = StageTimings(window=min(window, 2000))
+
+    def summary(self):
+        elapsed = max((self.stopped_at or time.time()) - self.started_at, 1e-6)
+        return {
+            'elapsed_s': elapsed,
+            'frames_captured': self.frames_captured,
+            'frames_processed': self.frames_processed,
+            'frames_rendered': self.frames_rendered,
+            'frames_dropped': self.dropped,
+            'frames_skipped': self.frames_skipped,
+            'faces_detected': self.faces_detected,
+            'faces_encoded': self.faces_encoded,
+            'marks': self.marks,
+            'capture_fps': self.frames_captured / elapsed,
+            'processed_fps': self.frames_processed / elapsed,
+            'processing_ms_p50': _percentile(self.processing, 50),
+            'processing_ms_p95': _percentile(self.processing, 95),
+            'processing_ms_max': _percentile(self.processing, 100),
+            'latency_ms_p50': _percentile(self.end_to_end, 50),
+            'latency_ms_p95': _percentile(self.end_to_end, 95),
+            'latency_ms_max': _percentile(self.end_to_end, 100),
+            'stages': self.timings.snapshot()['stages'],
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        return "\n".join([
+            f"Ran for {s['elapsed_s']:.1f}s",
+            f"Frames: {s['frames_captured']} captured, {s['frames_processed']} processed, "
+            f"{s['frames_dropped']} dropped, {s['frames_skipped']} skipped",
+            f"Throughput: {s['capture_fps']:.1f} capture fps, {s['processed_fps']:.1f} processed fps",
+            f"Faces: {s['faces_detected']} detected, {s['faces_encoded']} encoded, {s['marks']} marked",
+            f"Processing: p50 {s['processing_ms_p50']:.1f} ms, p95 {s['processing_ms_p95']:.1f} ms, "
+            f"max {s['processing_ms_max']:.1f} ms",
+            f"End-to-end latency: p50 {s['latency_ms_p50']:.1f} ms, p95 {s['latency_ms_p95']:.1f} ms, "
+            f"max {s['latency_ms_max']:.1f} ms",
+        ] + [
+            f"  {name}: p50 {stage['p50_ms']:.2f} ms, p95 {stage['p95_ms']:.2f} ms, p99 {stage['p99_ms']:.2f} ms"
+            for name, stage in s['stages'].items()
+        ])
+
+
+class RecognitionEngine:
+    """Face recognition and attendance marking without any GUI.
+
+    Live sources run as a capture -> recognition -> render pipeline on
+    background threads (start/stop); files and folders can be processed
+    frame by frame with run_sequential. Callers hook in through on_log,
+    on_mark and on_frame, the last one receiving annotated BGR frames.
+    tolerance, gallery and detector can be swapped at any time. The
+    controller decides the detection scale and which frames are processed;
+    by default it is disabled and every frame is processed at 1/4 scale.
+    The detector is one of the backends in detectors.py, dlib's HOG detector
+    by default.
+    """
+
+    def __init__(self, gallery=None, tolerance=0.6, sink=None, on_log=None, on_mark=None, on_frame=None,
+                 controller=None, marked=None, executor=None, detector=None):
+        self.gallery = gallery if gallery is not None else FaceGallery()
+        self.tolerance = tolerance
+        self.sink = sink if sink is not None else open_attendance_sink()
+        if getattr(self.sink, 'on_error', False) is None:
+            self.sink.on_error = self.log
+        self.on_log = on_log
+        self.on_mark = on_mark
+        self.on_frame = on_frame
+
+        self.controller = controller if controller is not None else AdaptiveController(enabled=False)
+        self.detector = detector if detector is not None else HogDetector()
+        # Shared with other engines when several cameras run together, see MultiCameraEngine
+        self.shared_marked = marked
+        # Optional process pool for face detection and encoding
+        self.executor = executor
+        self.label = None
+        self.show_overlay = False
+        self._overlay_lines = []
+        self._overlay_at = 0.0
+
+        self.cap = None
+        self.is_running = False
+        self.grabber = None
+        self.recognition_thread = None
+        self.render_thread = None
+        self.processing_thread_id = None
+        self.profiler = None
+        self.pending_users = deque()
+        self.reset_session()
+
+    def reset_session(self):
+        self.marked_attendance = self.shared_marked if self.shared_marked is not None else MarkedNames()
+        self.tracker = FaceTracker()
+        self.latest_results = []
+        self.stats = EngineStats()
+        self.controller.reset()
+
+    @property
+    def detector(self):
+        return self._detector
+
+    @detector.setter
+    def detector(self, detector):
+        # The controller keeps the smallest face in view above what the backend can find
+        self._detector = detector
+        self.controller.min_face = detector.min_face
+
+    def log(self, message):
+        if self.label is not None:
+            message = f"[{self.label}] {message}"
+        if self.on_log is not None:
+            self.on_log(message)
+        else:
+            print(f"[{datetime.now().strftime('%H:%M:%S')}] {message}", file=sys.stderr)
+
+    def update_user(self, name, encodings):
+        """Replace the gallery encodings of one user, e.g. after a new registration.
+
+        While recognition runs the change is applied on the recognition thread
+        before the next frame, so matching never sees a half-updated gallery.
+        """
+        self.pending_users.append((name, np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)))
+        if not self.is_running:
+            self.apply_user_updates()
+
+    def apply_user_updates(self):
+        while self.pending_users:
+            name, encodings = self.pending_users.popleft()
+            # A compacted gallery gets the user's prototypes, not their raw encodings
+            if self.gallery.compaction is not None:
+                encodings, self.gallery.compaction = compact_user(self.gallery.compaction, name, encodings)
+            self.gallery.remove_user(name)
+            if len(encodings):
+                self.gallery.add(encodings, [name] * len(encodings))
+
+    def process_frame(self, image, timestamp):
+        """Detect, track, encode and match the faces in one BGR frame.
+
+        Returns a list of (box, name, confidence) with boxes in frame coordinates.
+        """
+        import face_recognition
+        timings = self.stats.timings
+        scale = self.controller.scale
+        detector = self._detector
+        if self.pending_users:
+            self.apply_user_updates()
+
+        with timings.measure('resize'):
+            small_frame = cv2.resize(image, (0, 0), fx=scale, fy=scale)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+
+        with timings.measure('face_locations'):
+            if self.executor is not None:
+                face_locations = self.executor.submit(detect_faces, rgb_small_frame, detector).result()
+            else:
+                face_locations = detector.detect(rgb_small_frame)
+        boxes = [(int(top / scale), int(right / scale), int(bottom / scale), int(left / scale))
+                 for top, right, bottom, left in face_locations]
+        tracks = self.tracker.update(boxes, timestamp)
+        self.stats.faces_detected += len(tracks)
+
+        # Only new tracks and tracks due for re-verification are encoded
+        pending = [i for i, track in enumerate(tracks) if self.tracker.needs_verify(track, timestamp)]
+        if pending:
+            with timings.measure('face_encodings'):
+                pending_locations = [face_locations[i] for i in pending]
+                if self.executor is not None:
+                    face_encodings = self.executor.submit(encode_faces, rgb_small_frame, pending_locations).result()
+                else:
+                    face_encodings = face_recognition.face_encodings(rgb_small_frame, pending_locations)
+            self.stats.faces_encoded += len(face_encodings)
+
+            # All faces in the frame are matched against the gallery in one batch
+            with timings.measure('matching'):
+                matches = self.gallery.match(face_encodings, tolerance=self.tolerance)
+            for i, match in zip(pending, matches):
+                confidence = 1 - match.distance
+                self.tracker.set_identity(tracks[i], match.name, confidence, timestamp)
+
+        results = []
+        for track in tracks:
+            if track.identified:
+                now = datetime.now()
+                if self.marked_attendance.claim(track.name, now):
+                    self.mark_attendance(track.name, now)
+
+            results.append((track.box, track.name, track.confidence))
+        return results
+
+    def mark_attendance(self, name, now=None):
+        now = now or datetime.now()
+        self.log(f"Marked attendance for {name} at {now.strftime('%H:%M:%S')}")
+        self.stats.marks += 1
+
+        try:
+            self.sink.mark(name, now)
+        except Exception as e:
+            self.log(f"Error writing attendance: {str(e)}")
+
+        if self.on_mark is not None:
+            self.on_mark(name, now)
+
+    @staticmethod
+    def draw_results(frame, results):
+        for (top, right, bottom, left), name, confidence in results:
+            color = (0, 0, 255) if name == "Unknown" else (0, 255, 0)
+
+            cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+            cv2.rectangle(frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
+
+            confidence_text = f"{confidence:.2f}" if confidence > 0 else "N/A"
+            text = f"{name} ({confidence_text})"
+            cv2.putText(frame, text, (left + 6, bottom - 6),
+                        cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
+        return frame
+
+    @staticmethod
+    def draw_overlay(frame, lines):
+        # Stats text in the top left corner, on a dark band so it stays readable
+        if not lines:
+            return frame
+        height = 18 * len(lines) + 8
+        width = 12 + 9 * max(len(line) for line in lines)
+        band = frame[:height, :width]
+        band[:] = band // 3
+        for i, line in enumerate(lines):
+            cv2.putText(frame, line, (6, 18 * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1)
+        return frame
+
+    def render(self, image):
+        # Draws the latest results, and the stats overlay if enabled, on a frame
+        with self.stats.timings.measure('drawing'):
+            frame = self.draw_results(image, self.latest_results)
+            if self.show_overlay:
+                # Percentiles are recomputed twice a second, not on every frame
+                now = time.perf_counter()
+                if now - self._overlay_at > 0.5:
+                    self._overlay_lines = [self.controller.describe()] + self.stats.timings.format_lines()
+                    self._overlay_at = now
+                self.draw_overlay(frame, self._overlay_lines)
+        self.stats.frames_rendered += 1
+        self.stats.timings.tick('rendered')
+        return frame
+
+    def start(self, cap):
+        # Takes ownership of cap, it is released by stop()
+        self.cap = cap
+        self.is_running = True
+        self.reset_session()
+
+        # Capture -> recognition and capture -> render, each through a bounded
+        # queue that drops the oldest frame when its consumer falls behind
+        self.detect_queue = DropOldestQueue(maxsize=1)
+        self.render_queue = DropOldestQueue(maxsize=2)
+        outputs = [self.detect_queue]
+        if self.on_frame is not None:
+            outputs.append(self.render_queue)
+        self.grabber = FrameGrabber(cap, outputs, on_error=self._on_capture_error, timings=self.stats.timings)
+
+        self.recognition_thread = threading.Thread(target=self.run_recognition)
+        self.recognition_thread.daemon = True
+        self.render_thread = None
+        if self.on_frame is not None:
+            self.render_thread = threading.Thread(target=self.run_render)
+            self.render_thread.daemon = True
+
+        self.grabber.start()
+        self.recognition_thread.start()
+        self.processing_thread_id = self.recognition_thread.ident
+        if self.render_thread is not None:
+            self.render_thread.start()
+
+    def _on_capture_error(self, message):
+        self.log(message)
+        self.is_running = False
+
+    def run_recognition(self):
+        while self.is_running:
+            try:
+                frame = self.detect_queue.get(timeout=0.5)
+            except QueueClosed:
+                break
+            if frame is None:
+                continue
+            if not self.controller.should_process(frame.timestamp):
+                self.stats.frames_skipped += 1
+                continue
+
+            try:
+                started = time.time()
+                self.latest_results = self.process_frame(frame.image, frame.timestamp)
+                finished = time.time()
+                self._frame_processed(started, finished, frame.timestamp)
+                self.stats.timings.set_counter('dropped', self.detect_queue.dropped)
+            except Exception as e:
+                if self.is_running:
+                    self.log(f"Error in face recognition: {str(e)}")
+                time.sleep(0.1)
+
+    def _frame_processed(self, started, finished, captured_at):
+        self.stats.frames_processed += 1
+        self.stats.processing.append(finished - started)
+        self.stats.end_to_end.append(finished - captured_at)
+        self.stats.timings.tick('processed')
+        self.stats.timings.set_counter('skipped', self.stats.frames_skipped)
+
+        face_heights = [bottom - top for (top, right, bottom, left), name, confidence in self.latest_results]
+        self.controller.update(finished - started, face_heights, captured_at)
+
+    def run_render(self):
+        # Draws the most recent recognition results on every captured frame, so the
+        # preview keeps the camera frame rate even while dlib is busy
+        while self.is_running:
+            try:
+                frame = self.render_queue.get(timeout=0.5)
+            except QueueClosed:
+                break
+            if frame is None:
+                continue
+
+            try:
+                display_frame = self.render(frame.image.copy())
+                self.stats.timings.set_counter('display_dropped', self.render_queue.dropped)
+                self.on_frame(display_frame)
+            except Exception as e:
+                if self.is_running:
+                    self.log(f"Error in recognition loop: {str(e)}")
+                time.sleep(0.1)
+
+    def wait(self, timeout=None):
+        # Blocks until the source runs out or stop() is called
+        if self.recognition_thread is not None:
+            self.recognition_thread.join(timeout)
+
+    def stop(self):
+        self.is_running = False
+
+        if self.grabber is not None:
+            self.grabber.stop()
+            self.stats.frames_captured = self.grabber.frame_count
+            self.stats.dropped = self.detect_queue.dropped
+            self.grabber = None
+
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+        for thread in (self.recognition_thread, self.render_thread):
+            if thread is not None and thread.is_alive() and thread is not threading.current_thread():
+                thread.join(timeout=1.0)
+
+        self.sink.flush()
+        self.stats.stopped_at = time.time()
+
+    def run_sequential(self, cap, max_frames=None, duration=None):
+        """Process a finite source on the calling thread, every frame unless the controller skips some."""
+        self.cap = cap
+        self.is_running = True
+        self.reset_session()
+        self.processing_thread_id = threading.get_ident()
+        deadline = None if duration is None else self.stats.started_at + duration
+
+        try:
+            while self.is_running and (max_frames is None or self.stats.frames_captured < max_frames):
+                if deadline is not None and time.time() >= deadline:
+                    break
+                with self.stats.timings.measure('capture'):
+                    ret, image = cap.read()
+                if not ret or image is None:
+                    break
+                timestamp = time.time()
+                self.stats.frames_captured += 1
+
+                if self.controller.should_process(timestamp):
+                    try:
+                        self.latest_results = self.process_frame(image, timestamp)
+                        self._frame_processed(timestamp, time.time(), timestamp)
+                    except Exception as e:
+                        self.log(f"Error in face recognition: {str(e)}")
+                        continue
+                else:
+                    self.stats.frames_skipped += 1
+
+                if self.on_frame is not None:
+                    self.on_frame(self.render(image))
+        finally:
+            self.is_running = False
+            cap.release()
+            self.cap = None
+            self.sink.flush()
+            self.stats.stopped_at = time.time()
+
+    def export_stats(self, path=None):
+        """Write the current stage histograms, rates and session totals as JSON."""
+        path = path or stats_file_path('stats', 'json')
+        summary = {key: value for key, value in self.stats.summary().items() if key != 'stages'}
+        return self.stats.timings.export(path, extra={'summary': summary})
+
+    def start_profiling(self, duration=10.0, path=None, on_done=None):
+        """Sample the recognition thread for `duration` seconds and write a profile.
+
+        on_done(path) is called from the profiler thread once the profile is written.
+        Returns False if nothing is running or a profile is already being taken.
+        """
+        if self.processing_thread_id is None or not self.is_running:
+            return False
+        if self.profiler is not None and self.profiler.is_running:
+            return False
+
+        path = path or stats_file_path('profile', 'txt')
+
+        def finished(profiler):
+            try:
+                profiler.write(path)
+            except Exception as e:
+                self.log(f"Error writing profile: {str(e)}")
+                return
+            self.log(f"Profile of {profiler.samples} samples written to {path}")
+            if on_done is not None:
+                on_done(path)
+
+        self.profiler = SamplingProfiler(self.processing_thread_id, duration=duration, on_done=finished)
+        self.profiler.start()
+        self.log(f"Profiling recognition for {duration:.0f}s...")
+        return True
+
+
+class MultiCameraEngine:
+    """Drives one RecognitionEngine per camera over a shared gallery.
+
+    All cameras match against the same in-memory gallery, write to the same
+    sink and share one MarkedNames set, so a person walking past several
+    cameras is marked once. With more than one camera, face detection and
+    encoding run on a shared process pool: each camera's recognition thread
+    has at most one frame in flight, so the pool hands work out fairly and
+    aggregate throughput grows with cores instead of being held by the GIL.
+    """
+
+    def __init__(self, gallery=None, tolerance=0.6, sink=None, on_log=None, on_mark=None, workers=None,
+                 detector=None):
+        self._gallery = gallery if gallery is not None else FaceGallery()
+        self._tolerance = tolerance
+        self._detector = detector if detector is not None else HogDetector()
+        self.sink = sink if sink is not None else open_attendance_sink()
+        self.on_log = on_log
+        self.on_mark = on_mark
+        self.workers = workers
+        self.marked = MarkedNames()
+        self.engines = []
+        self.executor = None
+        self.active = []
+
+    def add_camera(self, label=None, on_frame=None, controller=None):
+        engine = RecognitionEngine(self._gallery, self._tolerance, sink=self.sink, on_log=self.on_log,
+                                   on_mark=self.on_mark, on_frame=on_frame, controller=controller,
+                                   marked=self.marked, detector=self._detector)
+        engine.label = label
+        self.engines.append(engine)
+        return engine
+
+    @property
+    def gallery(self):
+        return self._gallery
+
+    @gallery.setter
+    def gallery(self, gallery):
+        self._gallery = gallery
+        for engine in self.engines:
+            engine.gallery = gallery
+
+    @property
+    def tolerance(self):
+        return self._tolerance
+
+    @tolerance.setter
+    def tolerance(self, tolerance):
+        self._tolerance = tolerance
+        for engine in self.engines:
+            engine.tolerance = tolerance
+
+    @property
+    def detector(self):
+        return self._detector
+
+    @detector.setter
+    def detector(self, detector):
+        self._detector = detector
+        for engine in self.engines:
+            engine.detector = detector
+
+    @property
+    def is_running(self):
+        return any(engine.is_running for engine in self.active)
+
+    def start(self, caps, labels=None):
+        """Start one pipeline per capture, reusing cameras added earlier in order."""
+        labels = labels or [f"cam{i}" for i in range(len(caps))]
+        while len(self.engines) < len(caps):
+            self.add_camera()
+
+        if len(caps) > 1 and self.executor is None:
+            workers = self.workers or min(len(caps), os.cpu_count() or 1)
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+            for _ in range(workers):
+                self.executor.submit(warm_up_models)
+
+        self.marked.clear()
+        self.active = self.engines[:len(caps)]
+        for engine, cap, label in zip(self.active, caps, labels):
+            engine.label = label if len(caps) > 1 else engine.label
+            engine.executor = self.executor
+            engine.start(cap)
+
+    def wait(self, timeout=None):
+        for engine in self.active:
+            engine.wait(timeout)
+
+    def stop(self):
+        for engine in self.active:
+            engine.stop()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            for engine in self.engines:
+                engine.executor = None
+
+    def update_user(self, name, encodings):
+        """Replace one user's encodings in the shared gallery.
+
+        A new gallery is built and swapped into every camera at once, so no
+        camera ever matches against a gallery that is being modified.
+        """
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        compaction = self._gallery.compaction
+        if compaction is not None:
+            encodings, compaction = compact_user(compaction, name, encodings)
+        rows = [i for i in self._gallery.live_rows() if self._gallery.names[i] != name]
+        gallery = create_index(self._gallery.KIND,
+                               np.vstack([self._gallery.matrix[rows], encodings]),
+                               [self._gallery.names[i] for i in rows] + [name] * len(encodings))
+        gallery.compaction = compaction
+        self.gallery = gallery
+
+    def summary(self):
+        cameras = []
+        for engine in self.active:
+            s = engine.stats.summary()
+            cameras.append({'camera': engine.label, **{key: value for key, value in s.items() if key != 'stages'}})
+        return {
+            'cameras': cameras,
+            'processed_fps': sum(camera['processed_fps'] for camera in cameras),
+            'marks': len(self.marked),
+        }
+
+    def format_status(self):
+        parts = []
+        for engine in self.active:
+            fps = engine.stats.timings.rates.get('processed')
+            parts.append(f"{engine.label} {fps.rate() if fps else 0:.1f} fps")
+        return ", ".join(parts)
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = [f"{len(summary['cameras'])} cameras, {summary['processed_fps']:.1f} processed fps in total, "
+                 f"{summary['marks']} people marked"]
+        for camera in summary['cameras']:
+            lines.append(f"  {camera['camera']}: {camera['frames_processed']} processed, "
+                         f"{camera['frames_dropped']} dropped, {camera['processed_fps']:.1f} fps, "
+                         f"latency p50 {camera['latency_ms_p50']:.1f} ms, p95 {camera['latency_ms_p95']:.1f} ms")
+        return "\n".join(lines)
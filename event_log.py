@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import queue
+import logging
+import threading
+from collections import deque, namedtuple, OrderedDict
+from itertools import islice
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+Event = namedtuple('Event', ['seq', 'time', 'level', 'text'])
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(message)s'
+
+# Numbers, e.g. frame counts or ids, do not make an error message different
+_NUMBERS = re.compile(r'\d+')
+
+
+def event_level(text):
+    # Callers log plain strings, errors and warnings are told apart by their prefix
+    lowered = text.lower()
+    if lowered.startswith('error') or ' failed' in lowered:
+        return logging.ERROR
+    if lowered.startswith('warning'):
+        return logging.WARNING
+    return logging.INFO
+
+
+def format_event(event):
+    return f"[{datetime.fromtimestamp(event.time).strftime('%H:%M:%S')}] {event.text}"
+
+
+class EventLog:
+    """Bounded, thread-safe log of recent events for the attendance window.
+
+    add() can be called from any thread and only appends to a ring buffer of
+    the last capacity events; readers fetch what is new with since(seq) on
+    their own schedule. Two things keep a misbehaving loop from flooding it:
+
+    - an exact repeat of the previous message within repeat_window seconds
+      is only counted, and one "repeated N times" event follows when a
+      different message arrives or the window runs out
+    - errors and warnings of the same kind, ignoring any numbers in them,
+      pass at most error_burst times per error_period seconds; the rest are
+      counted and summed up in one event at the end of the period
+
+    With path set, every message, including the folded and suppressed ones,
+    is also written to a rotating log file of max_bytes with backups old
+    files, from a background thread.
+    """
+
+    def __init__(self, capacity=1000, repeat_window=10.0, error_burst=5, error_period=30.0,
+                 path=None, max_bytes=1024 * 1024, backups=3):
+        self.capacity = capacity
+        self.repeat_window = repeat_window
+        self.error_burst = error_burst
+        self.error_period = error_period
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.events = deque(maxlen=capacity)
+        self.seq = 0
+        self._lock = threading.Lock()
+        self._last = None
+        self._repeats = 0
+        self._last_at = 0.0
+        # kind -> [period start, passed, suppressed, last text], oldest kinds are dropped
+        self._kinds = OrderedDict()
+        self._logger = None
+        self._listener = None
+        self.path = None
+        if path is not None:
+            self.set_file(path)
+
+    # -- writing -----------------------------------------------------------------
+
+    def add(self, text, level=None, now=None):
+        """Record one message. Returns False if it was folded into a repeat or suppressed."""
+        now = time.time() if now is None else now
+        level = event_level(text) if level is None else level
+        logger = self._logger
+        if logger is not None:
+            logger.log(level, text)
+
+        with self._lock:
+            self._close_periods(now)
+            if text == self._last and now - self._last_at <= self.repeat_window:
+                self._repeats += 1
+                self._last_at = now
+                return False
+            self._flush_repeats()
+
+            if level >= logging.WARNING and not self._allow(text, now):
+                return False
+            self._append(now, level, text)
+            self._last = text
+            self._last_at = now
+            return True
+
+    def _append(self, now, level, text):
+        self.seq += 1
+        self.events.append(Event(self.seq, now, level, text))
+
+    def _flush_repeats(self):
+        if self._repeats:
+            self._append(self._last_at, logging.INFO,
+                         f"Last message repeated {self._repeats} more time{'s' if self._repeats > 1 else ''}")
+            self._repeats = 0
+
+    def _allow(self, text, now):
+        kind = _NUMBERS.sub('#', text)
+        state = self._kinds.get(kind)
+        if state is None:
+            state = self._kinds[kind] = [now, 0, 0, text]
+            if len(self._kinds) > self.capacity:
+                self._kinds.popitem(last=False)
+        self._kinds.move_to_end(kind)
+        state[3] = text
+        if state[1] < self.error_burst:
+            state[1] += 1
+            return True
+        state[2] += 1
+        return False
+
+    def _close_periods(self, now):
+        # Summarize what each kind suppressed once its period is over
+        if self._repeats and now - self._last_at > self.repeat_window:
+            self._flush_repeats()
+            self._last = None
+        for kind in [kind for kind, state in self._kinds.items() if now - state[0] >= self.error_period]:
+            start, passed, suppressed, text = self._kinds.pop(kind)
+            if suppressed:
+                self._append(now, logging.WARNING,
+                             f"Suppressed {suppressed} similar messages in {self.error_period:.0f}s: {text}")
+
+    # -- reading -----------------------------------------------------------------
+
+    def since(self, seq, now=None):
+        """Events after seq, and how many of those already fell out of the buffer.
+
+        Also closes expired repeat and rate-limit windows, so a reader polling
+        on a timer sees their summaries without waiting for the next message.
+        """
+        with self._lock:
+            self._close_periods(time.time() if now is None else now)
+            if not self.events or self.events[-1].seq <= seq:
+                return [], 0
+            first = self.events[0].seq
+            dropped = max(first - seq - 1, 0)
+            start = max(seq + 1 - first, 0)
+            return list(islice(self.events, start, None)), dropped
+
+    def recent(self, count=None):
+        with self._lock:
+            events = list(self.events)
+        return events if count is None else events[-count:]
+
+    # -- log file ----------------------------------------------------------------
+
+    def set_file(self, path):
+        """Mirror every message to a rotating file at path, or stop with None."""
+        self.close()
+        if path is None:
+            return
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        handler = RotatingFileHandler(path, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        records = queue.Queue()
+        logger = logging.getLogger(f'{__name__}.{id(self)}')
+        logger.setLevel(logging.DEBUG)
+        logger.propagate = False
+        logger.addHandler(QueueHandler(records))
+        self._listener = QueueListener(records, handler)
+        self._listener.start()
+        self._logger = logger
+        self.path = path
+
+    def close(self):
+        if self._logger is not None:
+            for handler in list(self._logger.handlers):
+                self._logger.removeHandler(handler)
+            self._logger = None
+        if self._listener is not None:
+            self._listener.stop()
+            for handler in self._listener.handlers:
+                handler.close()
+            self._listener = None
+        self.path = None
@@ -0,0 +1,165 @@
+import os
+import csv
+import threading
+
+EXPORT_COLUMNS = ['Name', 'Time', 'Date']
+EXPORT_FORMATS = ('xlsx', 'parquet', 'csv')
+
+# Rows per worksheet in an .xlsx file, longer exports continue on a new sheet
+XLSX_MAX_ROWS = 1048575
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class CsvExportWriter:
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(EXPORT_COLUMNS)
+
+    def write(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxExportWriter:
+    # openpyxl's write-only mode streams rows to disk instead of building the sheet in memory
+    def __init__(self, path):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise ImportError("Excel export needs openpyxl, install it with: pip install openpyxl")
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        self.sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self.sheets += 1
+        self.sheet = self.workbook.create_sheet("Attendance" if self.sheets == 1 else f"Attendance {self.sheets}")
+        self.sheet.append(EXPORT_COLUMNS)
+        self.sheet_rows = 0
+
+    def write(self, rows):
+        for row in rows:
+            if self.sheet_rows == XLSX_MAX_ROWS:
+                self._new_sheet()
+            self.sheet.append(list(row))
+            self.sheet_rows += 1
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class ParquetExportWriter:
+    # Every chunk becomes one row group
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Parquet export needs pyarrow, install it with: pip install pyarrow")
+        self.pa = pa
+        self.schema = pa.schema([(column.lower(), pa.string()) for column in EXPORT_COLUMNS])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in EXPORT_COLUMNS]
+        self.writer.write_table(self.pa.Table.from_arrays(
+            [self.pa.array(column, type=self.pa.string()) for column in columns], schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+WRITERS = {'csv': CsvExportWriter, 'xlsx': XlsxExportWriter, 'parquet': ParquetExportWriter}
+
+
+def export_path(start_date, end_date, fmt, directory='Attendance'):
+    # Never named like a daily Attendance-YYYY-MM-DD.csv, so exports are not imported back as marks
+    return os.path.join(directory, f'Attendance-{start_date}_to_{end_date}.{fmt}')
+
+
+def export_range(store, start_date, end_date, fmt, path, chunk_size=5000, on_progress=None, cancelled=None):
+    """Stream the marks between two dates into an xlsx, parquet or csv file.
+
+    Rows are read from the store and written in chunks of chunk_size, so
+    memory does not grow with the size of the range. The file is written
+    under a temporary name and only renamed to path when complete.
+    on_progress(done, total) is called after every chunk; when
+    cancelled.is_set() the partial file is removed and ExportCancelled is
+    raised. Returns the number of rows written.
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    total = store.count_between(start_date, end_date)
+    tmp = f'{path}.part'
+    writer = WRITERS[fmt](tmp)
+    done = 0
+    try:
+        try:
+            for rows in store.iter_records_between(start_date, end_date, chunk_size):
+                if cancelled is not None and cancelled.is_set():
+                    raise ExportCancelled()
+                writer.write(rows)
+                done += len(rows)
+                if on_progress is not None:
+                    on_progress(done, total)
+        finally:
+            writer.close()
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return done
+
+
+class ExportJob:
+    """Runs export_range on a background thread.
+
+    on_progress(done, total) and on_done(path, rows, error) are called on the
+    worker thread; error is None on success and an ExportCancelled instance
+    after cancel().
+    """
+
+    def __init__(self, store, start_date, end_date, fmt, path, on_progress=None, on_done=None, chunk_size=5000):
+        self.store = store
+        self.start_date = start_date
+        self.end_date = end_date
+        self.fmt = fmt
+        self.path = path
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.chunk_size = chunk_size
+        self.cancelled = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        rows, error = 0, None
+        try:
+            rows = export_range(self.store, self.start_date, self.end_date, self.fmt, self.path,
+                                self.chunk_size, self.on_progress, self.cancelled)
+        except Exception as e:
+            error = e
+        finally:
+            # The store keeps one connection per thread
+            self.store.close()
+        if self.on_done is not None:
+            self.on_done(self.path, rows, error)
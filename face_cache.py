@@ -0,0 +1,226 @@
+import os
+import json
+import hashlib
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+ENCODING_SIZE = 128
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def name_from_filename(file):
+    return file.split('_')[0]
+
+
+def encode_image_file(image_path):
+    # Returns the first face encoding in the image, or None if no face was found
+    import face_recognition
+
+    image = face_recognition.load_image_file(image_path)
+    face_encodings = face_recognition.face_encodings(image)
+    if len(face_encodings) > 0:
+        return face_encodings[0]
+    return None
+
+
+SyncResult = namedtuple('SyncResult', ['encodings', 'names', 'stats', 'no_face_files', 'failures'])
+
+
+def _encode_one(job):
+    # Runs in a worker process, errors are returned instead of raised so one
+    # unreadable image does not abort the whole build
+    encode, image_path = job
+    try:
+        encoding = encode(image_path)
+        if encoding is not None:
+            encoding = np.asarray(encoding, dtype=np.float32)
+        return image_path, encoding, None
+    except Exception as e:
+        return image_path, None, str(e)
+
+
+def encode_files(image_paths, encode=encode_image_file, workers=None, on_progress=None):
+    """Encode images on a process pool, yielding (path, encoding, error) in input order.
+
+    Work is handed out in chunks so the pool is not dominated by per-task
+    overhead. on_progress(done, total) is called as results stream back.
+    workers=1 encodes in the calling process, otherwise encode has to be a
+    module-level function so it can be sent to the workers.
+    """
+    total = len(image_paths)
+    if total == 0:
+        return
+
+    workers = min(workers or os.cpu_count() or 1, total)
+    jobs = [(encode, path) for path in image_paths]
+
+    if workers == 1:
+        results = map(_encode_one, jobs)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        chunksize = max(1, total // (workers * 4))
+        results = executor.map(_encode_one, jobs, chunksize=chunksize)
+
+    try:
+        for done, result in enumerate(results, 1):
+            if on_progress is not None:
+                on_progress(done, total)
+            yield result
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+class EncodingCache:
+    """On-disk store of face encodings for the images in Images/.
+
+    Encodings are kept as a float32 matrix (encodings.npy) with a JSON sidecar
+    (encodings.json) that maps every image path to its size, mtime, content
+    hash, user name and matrix row. Images without a face are remembered with
+    row -1 so they are not re-encoded on every start.
+    """
+
+    VERSION = 1
+
+    def __init__(self, cache_dir='Cache'):
+        self.cache_dir = cache_dir
+        self.matrix_path = os.path.join(cache_dir, 'encodings.npy')
+        self.meta_path = os.path.join(cache_dir, 'encodings.json')
+
+    def load(self):
+        if not (os.path.exists(self.matrix_path) and os.path.exists(self.meta_path)):
+            return {}, np.zeros((0, ENCODING_SIZE), dtype=np.float32)
+
+        try:
+            with open(self.meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('version') != self.VERSION:
+                return {}, np.zeros((0, ENCODING_SIZE), dtype=np.float32)
+
+            matrix = np.load(self.matrix_path)
+            entries = meta.get('entries', {})
+            for entry in entries.values():
+                if entry['row'] >= len(matrix):
+                    raise ValueError("encoding cache is out of sync")
+            return entries, matrix
+        except Exception as e:
+            print(f"Ignoring unreadable encoding cache: {str(e)}")
+            return {}, np.zeros((0, ENCODING_SIZE), dtype=np.float32)
+
+    def save(self, entries, matrix):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        # Write to temporary files first so a crash never leaves a half-written cache
+        matrix_tmp = self.matrix_path + '.tmp'
+        meta_tmp = self.meta_path + '.tmp'
+        with open(matrix_tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(matrix, dtype=np.float32))
+        with open(meta_tmp, 'w') as f:
+            json.dump({'version': self.VERSION, 'entries': entries}, f)
+        os.replace(matrix_tmp, self.matrix_path)
+        os.replace(meta_tmp, self.meta_path)
+
+    def sync(self, image_dir, encode=encode_image_file, workers=None, on_progress=None):
+        """Bring the cache up to date with image_dir.
+
+        New or changed images are encoded in parallel with encode_files. Returns
+        a SyncResult whose encodings matrix has one row per usable image and
+        whose names list holds the matching user names.
+        """
+        old_entries, old_matrix = self.load()
+        by_digest = {entry['sha1']: entry for entry in old_entries.values()}
+
+        entries = {}
+        known = {}
+        to_encode = []
+        failures = []
+        stats = {'cached': 0, 'encoded': 0, 'no_face': 0, 'errors': 0, 'evicted': 0}
+
+        image_files = sorted(f for f in os.listdir(image_dir) if f.endswith(IMAGE_EXTENSIONS))
+
+        # First pass: decide from stat and content hash which images can be reused
+        for file in image_files:
+            image_path = os.path.join(image_dir, file)
+            try:
+                st = os.stat(image_path)
+                old = old_entries.get(image_path)
+                entry = {
+                    'name': name_from_filename(file),
+                    'size': st.st_size,
+                    'mtime': st.st_mtime,
+                }
+
+                if old is not None and old['size'] == st.st_size and old['mtime'] == st.st_mtime:
+                    # Unchanged file, trust the stored hash
+                    entry['sha1'] = old['sha1']
+                    source = old
+                else:
+                    # New or touched file, fall back to the content hash so renames
+                    # and copies do not need to be re-encoded
+                    entry['sha1'] = file_digest(image_path)
+                    source = by_digest.get(entry['sha1'])
+
+                if source is not None:
+                    known[image_path] = old_matrix[source['row']] if source['row'] >= 0 else None
+                    stats['cached'] += 1
+                else:
+                    to_encode.append(image_path)
+                entries[image_path] = entry
+
+            except Exception as e:
+                failures.append((file, str(e)))
+
+        # Second pass: encode everything else across all cores
+        for image_path, encoding, error in encode_files(to_encode, encode, workers, on_progress):
+            if error is not None:
+                failures.append((os.path.basename(image_path), error))
+                del entries[image_path]
+            else:
+                known[image_path] = encoding
+                stats['encoded'] += 1
+
+        rows = []
+        for image_path, entry in entries.items():
+            encoding = known[image_path]
+            if encoding is None:
+                entry['row'] = -1
+                stats['no_face'] += 1
+            else:
+                entry['row'] = len(rows)
+                rows.append(np.asarray(encoding, dtype=np.float32))
+
+        stats['errors'] = len(failures)
+        stats['evicted'] = len(set(old_entries) - set(entries))
+
+        if rows:
+            matrix = np.vstack(rows)
+        else:
+            matrix = np.zeros((0, ENCODING_SIZE), dtype=np.float32)
+
+        if entries != old_entries:
+            try:
+                self.save(entries, matrix)
+            except Exception as e:
+                print(f"Error saving encoding cache: {str(e)}")
+
+        names = [None] * len(rows)
+        for entry in entries.values():
+            if entry['row'] >= 0:
+                names[entry['row']] = entry['name']
+
+        no_face_files = [os.path.basename(path) for path, entry in entries.items() if entry['row'] < 0]
+        return SyncResult(matrix, names, stats, no_face_files, failures)
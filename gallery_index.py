@@ -0,0 +1,371 @@
+import threading
+
+import numpy as np
+
+from face_cache import ENCODING_SIZE
+from matching import NO_MATCH_DISTANCE, FaceGallery, FaceMatch
+
+
+class _SearchIndex(FaceGallery):
+    # Backends that only look at a subset of the gallery. Matching is built on
+    # top-k search and the tolerance is applied to the nearest hit, so per-user
+    # distances are only known for the candidates that were actually visited.
+    #
+    # Several cameras search one index at once. The search structures are
+    # built lazily and cached, so building, searching and changing the index
+    # all hold one lock; create_index builds them up front so the first
+    # frames do not wait for it.
+
+    match_k = 5
+
+    def __init__(self, dim=ENCODING_SIZE, capacity=1024):
+        self._lock = threading.RLock()
+        super().__init__(dim, capacity)
+
+    def prepare(self):
+        # Build or retrain the search structures if the data has outgrown them
+        pass
+
+    def add(self, encodings, names):
+        with self._lock:
+            return super().add(encodings, names)
+
+    def remove(self, ids):
+        with self._lock:
+            return super().remove(ids)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+
+    def match(self, query_encodings, tolerance=0.6):
+        if len(query_encodings) == 0:
+            return []
+
+        # Searched without a distance limit, so unknown faces report their nearest distance like FaceGallery
+        matches = []
+        for hits in self.search(query_encodings, k=self.match_k):
+            user_distances = np.full(len(self.user_names), np.inf, dtype=np.float32)
+            for row, distance in hits:
+                label = self._labels[row]
+                user_distances[label] = min(user_distances[label], distance)
+
+            if not hits:
+                matches.append(FaceMatch("Unknown", NO_MATCH_DISTANCE, -1, user_distances))
+                continue
+            row, distance = hits[0]
+            name = self.names[row] if distance <= tolerance else "Unknown"
+            matches.append(FaceMatch(name, distance, row, user_distances))
+        return matches
+
+    def _restore(self, state):
+        pass
+
+
+def _merge_hits(best, rows, distances, k, limit):
+    keep = distances <= limit
+    if not keep.any():
+        return best
+    best = best + list(zip(rows[keep].tolist(), distances[keep].tolist()))
+    best.sort(key=lambda hit: hit[1])
+    return best[:k]
+
+
+class BallTreeIndex(_SearchIndex):
+    """Exact search with a ball tree.
+
+    Every node stores a center and radius, so whole subtrees are skipped when
+    the query is farther than the current k-th best or the distance cutoff.
+    Encodings added after the last build are scanned linearly until there are
+    enough of them to make a rebuild worthwhile.
+    """
+
+    KIND = 'balltree'
+
+    def __init__(self, dim=ENCODING_SIZE, capacity=1024, leaf_size=128):
+        super().__init__(dim, capacity)
+        self.leaf_size = leaf_size
+        self._tree = None
+        self._pending = []
+        self._removed_at_build = 0
+
+    def _on_add(self, rows):
+        self._pending.extend(rows.tolist())
+
+    def _on_remove(self, rows):
+        if rows is None:
+            self._tree = None
+            self._pending = []
+
+    def _needs_build(self):
+        if self._tree is None:
+            return True
+        indexed = len(self._tree[5])
+        return (len(self._pending) > max(8 * self.leaf_size, indexed // 10)
+                or self._removed - self._removed_at_build > indexed // 4)
+
+    def build(self):
+        data = self.matrix
+        perm = self.live_rows()
+        centers, radii, starts, ends, children = [], [], [], [], []
+
+        def build_node(start, end):
+            node = len(centers)
+            points = data[perm[start:end]]
+            center = points.mean(axis=0)
+            sq_dist = ((points - center) ** 2).sum(axis=1)
+            centers.append(center)
+            radii.append(np.sqrt(sq_dist.max()))
+            starts.append(start)
+            ends.append(end)
+            children.append((-1, -1))
+
+            if end - start > self.leaf_size:
+                # Split along the direction between two far-apart points
+                a = points[np.argmax(sq_dist)]
+                b = points[np.argmax(((points - a) ** 2).sum(axis=1))]
+                mid = (end - start) // 2
+                order = np.argpartition(points @ (b - a), mid)
+                perm[start:end] = perm[start:end][order]
+                left = build_node(start, start + mid)
+                right = build_node(start + mid, end)
+                children[node] = (left, right)
+            return node
+
+        if len(perm):
+            build_node(0, len(perm))
+
+        self._tree = (np.array(centers, dtype=np.float32).reshape(-1, self.dim),
+                      np.array(radii, dtype=np.float32), starts, ends, children, perm)
+        self._pending = []
+        self._removed_at_build = self._removed
+
+    def prepare(self):
+        with self._lock:
+            if self._needs_build():
+                self.build()
+
+    def search(self, query_encodings, k=1, max_distance=None):
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.dim)
+        limit = np.inf if max_distance is None else max_distance
+        with self._lock:
+            self.prepare()
+            return [self._search_one(q, k, limit) for q in queries]
+
+    def _search_one(self, q, k, limit):
+        data = self.matrix
+        alive = self.alive
+        centers, radii, starts, ends, children, perm = self._tree
+        best = []
+
+        if len(perm):
+            # Lower bounds for every node at once, one small matrix-vector product
+            lower = np.maximum(np.linalg.norm(centers - q, axis=1) - radii, 0.0)
+            stack = [0]
+            while stack:
+                node = stack.pop()
+                bound = best[-1][1] if len(best) == k else limit
+                if lower[node] > bound:
+                    continue
+
+                left, right = children[node]
+                if left < 0:
+                    rows = perm[starts[node]:ends[node]]
+                    rows = rows[alive[rows]]
+                    distances = np.linalg.norm(data[rows] - q, axis=1)
+                    best = _merge_hits(best, rows, distances, k, bound)
+                elif lower[left] <= lower[right]:
+                    stack.extend((right, left))
+                else:
+                    stack.extend((left, right))
+
+        if self._pending:
+            rows = np.array(self._pending)
+            rows = rows[alive[rows]]
+            bound = best[-1][1] if len(best) == k else limit
+            best = _merge_hits(best, rows, np.linalg.norm(data[rows] - q, axis=1), k, bound)
+        return best
+
+
+class IVFIndex(_SearchIndex):
+    """Approximate search over k-means partitions with int8 scalar quantization.
+
+    Encodings are assigned to their nearest of nlist centroids. A query only
+    visits the nprobe closest partitions, scores their members on the int8
+    codes and re-ranks the best rerank candidates on the float32 encodings.
+    Small galleries are searched exactly until there is enough data to train.
+    """
+
+    KIND = 'ivf'
+    MIN_TRAIN_SIZE = 256
+
+    def __init__(self, dim=ENCODING_SIZE, capacity=1024, nlist=None, nprobe=8, rerank=32):
+        self._codes = np.zeros((capacity, dim), dtype=np.int8)
+        self._code_sq = np.zeros(capacity, dtype=np.float32)
+        self._assign = np.full(capacity, -1, dtype=np.int32)
+        super().__init__(dim, capacity)
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self._centroids = None
+        self._scale = None
+        self._lists = []
+        self._list_arrays = {}
+        self._trained_size = 0
+
+    def _reserve(self, count):
+        if count <= len(self._data):
+            return
+        capacity = max(count, 2 * len(self._data))
+        super()._reserve(count)
+        for attr, fill in (('_codes', 0), ('_code_sq', 0), ('_assign', -1)):
+            old = getattr(self, attr)
+            new = np.full((capacity,) + old.shape[1:], fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, attr, new)
+
+    def _on_add(self, rows):
+        if self._centroids is not None:
+            self._assign_rows(rows)
+
+    def _on_remove(self, rows):
+        if rows is None:
+            self._centroids = None
+            self._lists = []
+            self._list_arrays = {}
+
+    def train(self, iterations=10, sample_size=20000, seed=0):
+        rows = self.live_rows()
+        nlist = self.nlist or max(1, int(np.sqrt(len(rows))))
+        nlist = min(nlist, len(rows))
+
+        rng = np.random.default_rng(seed)
+        if len(rows) > sample_size:
+            rows = rng.choice(rows, sample_size, replace=False)
+        sample = self.matrix[rows]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = self._nearest(sample, centroids)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+
+        self._centroids = centroids
+        self._scale = np.maximum(np.abs(sample).max(axis=0), 1e-6) / 127.0
+        self._trained_size = len(self)
+        self._lists = [[] for _ in range(nlist)]
+        self._list_arrays = {}
+        self._assign[:] = -1
+        self._assign_rows(self.live_rows())
+
+    @staticmethod
+    def _nearest(points, centroids, chunk=4096):
+        c_sq = np.einsum('ij,ij->i', centroids, centroids)
+        result = np.empty(len(points), dtype=np.int32)
+        for start in range(0, len(points), chunk):
+            block = points[start:start + chunk]
+            result[start:start + chunk] = np.argmin(c_sq[None, :] - 2.0 * block @ centroids.T, axis=1)
+        return result
+
+    def _assign_rows(self, rows):
+        if len(rows) == 0:
+            return
+        data = self.matrix[rows]
+        codes = np.clip(np.rint(data / self._scale), -127, 127).astype(np.int8)
+        self._codes[rows] = codes
+        self._code_sq[rows] = ((codes * self._scale) ** 2).sum(axis=1)
+        assign = self._nearest(data, self._centroids)
+        self._assign[rows] = assign
+        for row, c in zip(rows.tolist(), assign.tolist()):
+            self._lists[c].append(row)
+            self._list_arrays.pop(c, None)
+
+    def _list_array(self, c):
+        if c not in self._list_arrays:
+            self._list_arrays[c] = np.array(self._lists[c], dtype=np.int64)
+        return self._list_arrays[c]
+
+    def prepare(self):
+        with self._lock:
+            if len(self) >= self.MIN_TRAIN_SIZE and (self._centroids is None or len(self) > 4 * self._trained_size):
+                self.train()
+
+    def search(self, query_encodings, k=1, max_distance=None):
+        with self._lock:
+            if len(self) < self.MIN_TRAIN_SIZE:
+                return super().search(query_encodings, k=k, max_distance=max_distance)
+            self.prepare()
+            return self._search_lists(query_encodings, k, max_distance)
+
+    def _search_lists(self, query_encodings, k, max_distance):
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.dim)
+        limit = np.inf if max_distance is None else max_distance
+        data = self.matrix
+        alive = self.alive
+
+        results = []
+        for q in queries:
+            probes = np.argsort(np.linalg.norm(self._centroids - q, axis=1))[:self.nprobe]
+            rows = np.concatenate([self._list_array(c) for c in probes])
+            rows = rows[alive[rows]]
+
+            if len(rows) > self.rerank:
+                # Squared distance on the dequantized codes, minus the constant |q|^2
+                approx = self._code_sq[rows] - 2.0 * (self._codes[rows] @ (self._scale * q))
+                rows = rows[np.argpartition(approx, self.rerank - 1)[:self.rerank]]
+
+            results.append(_merge_hits([], rows, np.linalg.norm(data[rows] - q, axis=1), k, limit))
+        return results
+
+    def _state(self):
+        state = super()._state()
+        if self._centroids is not None:
+            state['centroids'] = self._centroids
+            state['scale'] = self._scale
+        return state
+
+    def _restore(self, state):
+        if 'centroids' in state:
+            self._centroids = state['centroids']
+            self._scale = state['scale']
+            self._trained_size = len(self)
+            self._lists = [[] for _ in range(len(self._centroids))]
+            self._assign_rows(self.live_rows())
+
+
+INDEX_TYPES = {
+    FaceGallery.KIND: FaceGallery,
+    BallTreeIndex.KIND: BallTreeIndex,
+    IVFIndex.KIND: IVFIndex,
+}
+
+
+def create_index(kind='exact', encodings=None, names=None, prepare=True, **options):
+    # With prepare the search structures are built here, before any camera
+    # thread searches the index
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown gallery index '{kind}', expected one of {', '.join(INDEX_TYPES)}")
+
+    capacity = max(len(names) if names is not None else 0, 1)
+    index = INDEX_TYPES[kind](capacity=capacity, **options)
+    if names is not None and len(names):
+        index.add(encodings, names)
+    if prepare and isinstance(index, _SearchIndex):
+        index.prepare()
+    return index
+
+
+def load_index(path, **options):
+    # Removed entries are dropped on load, so row ids are renumbered
+    with np.load(path) as state:
+        state = {key: state[key] for key in state.files}
+
+    alive = state['alive']
+    index = create_index(str(state['kind']), state['encodings'][alive],
+                         [str(name) for name in state['names'][alive]], prepare=False, **options)
+    if isinstance(index, _SearchIndex):
+        index._restore(state)
+        index.prepare()
+    return index
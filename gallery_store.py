@@ -0,0 +1,456 @@
+import os
+import json
+import uuid
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+from face_cache import (ENCODING_SIZE, IMAGE_EXTENSIONS, SyncResult, EncodingCache, encode_files,
+                        name_from_filename)
+
+GALLERY_DIR = 'Gallery'
+
+# The manifest is rewritten once this many changes have been journaled
+SNAPSHOT_AFTER = 500
+
+LOCK_FILE = '.lock'
+
+
+def _lock_file(path):
+    f = open(path, 'a+')
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return f
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return f
+        except OSError:
+            # LK_LOCK gives up after 10 seconds, keep waiting
+            pass
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    f.close()
+
+
+class GalleryStore:
+    """Registered users and their face encodings, on disk and shared between processes.
+
+    manifest.json lists every user by id with a display name, the folder
+    holding their images and the slot and row range of their encodings. Changes since the manifest was
+    written are appended to a journal and replayed on open. The encodings
+    are a flat float32 file, with the squared norm and user slot of every row
+    in two files next to it. Rows of removed users get slot -1.
+
+    The row files are opened with np.memmap, so any number of processes can
+    map them without reading or copying them. Adding a user appends their rows
+    and one journal line, removing one tombstones their rows and appends one
+    journal line, independent of the size of the gallery. compact() writes
+    new row files without tombstones. Every change and sync() holds the
+    .lock file in the directory, so one process writes at a time, and
+    re-reads the manifest and journal once it has the lock so it appends
+    after what other processes committed. Readers take no lock and see
+    changes when they open the store.
+    """
+
+    VERSION = 1
+
+    def __init__(self, directory=GALLERY_DIR, dim=ENCODING_SIZE):
+        self.directory = directory
+        self.dim = dim
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self.users = {}
+        self._ids_by_name = {}
+        self.rows = 0
+        self.next_slot = 0
+        self.data = 'rows-0'
+        self.journal = 'journal-0.jsonl'
+        self.journaled = 0
+        self._mutex = threading.RLock()
+        self._lock = None
+        self._lock_depth = 0
+        self._load()
+
+    @contextmanager
+    def locked(self):
+        """Hold the store's lock file, with the state re-read from disk.
+
+        Nested calls in the same process take the file lock only once.
+        """
+        with self._mutex:
+            if self._lock_depth == 0:
+                if not os.path.exists(self.directory):
+                    os.makedirs(self.directory)
+                self._lock = _lock_file(self._path(LOCK_FILE))
+                try:
+                    self._reload()
+                except BaseException:
+                    _unlock_file(self._lock)
+                    self._lock = None
+                    raise
+            self._lock_depth += 1
+            try:
+                yield self
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    _unlock_file(self._lock)
+                    self._lock = None
+
+    # -- files -----------------------------------------------------------------
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @property
+    def encodings_path(self):
+        return self._path(f'{self.data}.f32')
+
+    @property
+    def norms_path(self):
+        return self._path(f'{self.data}.norms.f32')
+
+    @property
+    def slots_path(self):
+        return self._path(f'{self.data}.slots.i32')
+
+    def _reload(self):
+        self.users = {}
+        self._ids_by_name = {}
+        self.rows = 0
+        self.next_slot = 0
+        self.data = 'rows-0'
+        self.journal = 'journal-0.jsonl'
+        self.journaled = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.manifest_path):
+            return
+        with open(self.manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('version') != self.VERSION or manifest.get('dim') != self.dim:
+            raise ValueError(f"Unsupported gallery format in {self.directory}")
+        self.data = manifest['data']
+        self.journal = manifest['journal']
+        self.rows = manifest['rows']
+        self.next_slot = manifest['next_slot']
+        self.users = manifest['users']
+        self._ids_by_name = {user['name']: user_id for user_id, user in self.users.items()}
+
+        journal_path = self._path(self.journal)
+        if os.path.exists(journal_path):
+            with open(journal_path, 'r') as f:
+                for line in f:
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        # A write cut short by a crash, nothing after it was committed
+                        break
+                    self._apply(change)
+                    self.journaled += 1
+
+    def _apply(self, change):
+        user_id = change['id']
+        old = self.users.pop(user_id, None)
+        if old is not None:
+            self._ids_by_name.pop(old['name'], None)
+        if change['op'] == 'put':
+            user = {key: change[key] for key in ('name', 'folder', 'slot', 'start', 'count', 'pending')}
+            self.users[user_id] = user
+            self._ids_by_name[user['name']] = user_id
+            self.rows = max(self.rows, user['start'] + user['count'])
+            self.next_slot = max(self.next_slot, user['slot'] + 1)
+
+    def _write_manifest(self):
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        manifest = {
+            'version': self.VERSION,
+            'dim': self.dim,
+            'data': self.data,
+            'journal': self.journal,
+            'rows': self.rows,
+            'next_slot': self.next_slot,
+            'users': self.users,
+        }
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path)
+
+    def _commit(self, change):
+        # The journal line is the commit point, row data is always written before it
+        if not os.path.exists(self.manifest_path):
+            self._write_manifest()
+        with open(self._path(self.journal), 'a') as f:
+            f.write(json.dumps(change) + '\n')
+        self._apply(change)
+        self.journaled += 1
+        if self.journaled >= SNAPSHOT_AFTER:
+            self.snapshot()
+
+    def snapshot(self):
+        # Fold the journal into a new manifest, switching to a fresh journal file
+        old = self._path(self.journal)
+        self.journal = f'journal-{uuid.uuid4().hex[:8]}.jsonl'
+        self._write_manifest()
+        self.journaled = 0
+        if os.path.exists(old):
+            os.remove(old)
+
+    def _write_rows(self, path, start, array):
+        # Written in place at row start, whatever may be left past the committed rows
+        array = np.ascontiguousarray(array)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            os.lseek(fd, start * array.strides[0], os.SEEK_SET)
+            os.write(fd, array.tobytes())
+        finally:
+            os.close(fd)
+
+    # -- users -----------------------------------------------------------------
+
+    def __len__(self):
+        return len(self.users)
+
+    def find(self, name):
+        # Id of the user with this display name, or None
+        return self._ids_by_name.get(name)
+
+    def new_id(self):
+        return uuid.uuid4().hex[:12]
+
+    def put_user(self, user_id, name, folder, encodings=None):
+        """Add a user or replace everything stored for them.
+
+        encodings has one row per usable image in folder. Without it the user
+        is stored as pending and their images are encoded by the next sync().
+        """
+        with self.locked():
+            return self._put_user(user_id, name, folder, encodings)
+
+    def _put_user(self, user_id, name, folder, encodings):
+        if user_id in self.users:
+            self._tombstone(self.users[user_id])
+
+        start, count = self.rows, 0
+        if encodings is not None:
+            encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+            count = len(encodings)
+        slot = self.next_slot
+        if count:
+            self._write_rows(self.encodings_path, start, encodings)
+            self._write_rows(self.norms_path, start, np.einsum('ij,ij->i', encodings, encodings))
+            self._write_rows(self.slots_path, start, np.full(count, slot, dtype=np.int32))
+        self._commit({'op': 'put', 'id': user_id, 'name': name, 'folder': folder, 'slot': slot,
+                      'start': start, 'count': count, 'pending': encodings is None})
+        return user_id
+
+    def remove_user(self, user_id):
+        with self.locked():
+            user = self.users.get(user_id)
+            if user is None:
+                return False
+            self._tombstone(user)
+            self._commit({'op': 'remove', 'id': user_id})
+            return True
+
+    def _tombstone(self, user):
+        if user['count']:
+            self._write_rows(self.slots_path, user['start'], np.full(user['count'], -1, dtype=np.int32))
+
+    def pending(self):
+        return [(user_id, user) for user_id, user in self.users.items() if user['pending']]
+
+    # -- rows ------------------------------------------------------------------
+
+    def arrays(self):
+        """(encodings, norms, slots) as read-only memory maps over the committed rows."""
+        if self.rows == 0:
+            return (np.zeros((0, self.dim), dtype=np.float32), np.zeros(0, dtype=np.float32),
+                    np.zeros(0, dtype=np.int32))
+        encodings = np.memmap(self.encodings_path, dtype=np.float32, mode='r', shape=(self.rows, self.dim))
+        norms = np.memmap(self.norms_path, dtype=np.float32, mode='r', shape=(self.rows,))
+        slots = np.memmap(self.slots_path, dtype=np.int32, mode='r', shape=(self.rows,))
+        return encodings, norms, slots
+
+    def user_rows(self):
+        """(labels, user_names, alive) for every row, labels indexing user_names."""
+        _, _, slots = self.arrays()
+        live = sorted((user['slot'], user['name']) for user in self.users.values() if user['count'])
+        # One spare entry at the end, so tombstoned rows (slot -1) look up -1 as well
+        lookup = np.full(self.next_slot + 1, -1, dtype=np.int32)
+        for i, (slot, _) in enumerate(live):
+            lookup[slot] = i
+        labels = lookup[np.asarray(slots)]
+        alive = labels >= 0
+        labels[~alive] = 0
+        return labels, [name for _, name in live], alive
+
+    def live_encodings(self):
+        # A copy of the rows of current users and their names, in row order
+        encodings, _, _ = self.arrays()
+        labels, user_names, alive = self.user_rows()
+        rows = np.flatnonzero(alive)
+        return np.asarray(encodings[rows]), [user_names[i] for i in labels[rows]]
+
+    def dead_rows(self):
+        return self.rows - sum(user['count'] for user in self.users.values())
+
+    def compact(self):
+        """Rewrite the row files without the rows of removed or replaced users."""
+        with self.locked():
+            self._compact()
+
+    def _compact(self):
+        encodings, norms, slots = self.arrays()
+        old = [self.encodings_path, self.norms_path, self.slots_path, self._path(self.journal)]
+        order = sorted(self.users.values(), key=lambda user: user['start'])
+
+        self.data = f'rows-{uuid.uuid4().hex[:8]}'
+        self.journal = f'journal-{uuid.uuid4().hex[:8]}.jsonl'
+        start = 0
+        for user in order:
+            if user['count']:
+                rows = slice(user['start'], user['start'] + user['count'])
+                self._write_rows(self.encodings_path, start, np.asarray(encodings[rows]))
+                self._write_rows(self.norms_path, start, np.asarray(norms[rows]))
+                self._write_rows(self.slots_path, start, np.asarray(slots[rows]))
+            user['start'] = start
+            start += user['count']
+        self.rows = start
+        self._write_manifest()
+        self.journaled = 0
+        del encodings, norms, slots
+
+        for path in old:
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except OSError:
+                # Still mapped by another process on Windows, the next compact retries
+                pass
+
+    # -- images ------------------------------------------------------------------
+
+    def sync(self, image_dir, workers=None, on_progress=None, cache=None):
+        """Encode pending users and import loose legacy images from image_dir.
+
+        Loose name_N.jpg files at the top of image_dir are from the old
+        layout, where the user was the part of the file name before the first
+        underscore. They are moved to image_dir/<user id>/ and added as
+        users; encodings in the old encoding cache are reused. Only the top
+        level of image_dir is listed, user folders are never scanned.
+        Returns a SyncResult without encodings or names, see stats.
+        """
+        with self.locked():
+            return self._sync(image_dir, workers, on_progress, cache)
+
+    def _sync(self, image_dir, workers, on_progress, cache):
+        stats = {'cached': 0, 'encoded': 0,
+                 'no_face': 0, 'errors': 0, 'imported': 0}
+        failures = []
+        no_face_files = []
+
+        legacy = {}
+        if os.path.isdir(image_dir):
+            for file in sorted(os.listdir(image_dir)):
+                if file.endswith(IMAGE_EXTENSIONS) and os.path.isfile(os.path.join(image_dir, file)):
+                    legacy.setdefault(name_from_filename(file), []).append(file)
+        if legacy:
+            stats['imported'] = self._import_legacy(image_dir, legacy, cache or EncodingCache())
+
+        pending = [(user_id, user, user_images(user['folder'])) for user_id, user in self.pending()]
+        jobs = [image for _, _, images in pending for image in images]
+        if pending:
+            encoded = {}
+            for image_path, encoding, error in encode_files(jobs, workers=workers, on_progress=on_progress):
+                if error is not None:
+                    failures.append((os.path.basename(image_path), error))
+                elif encoding is None:
+                    no_face_files.append(os.path.basename(image_path))
+                else:
+                    encoded[image_path] = encoding
+            for user_id, user, images in pending:
+                rows = [encoded[image] for image in images if image in encoded]
+                self.put_user(user_id, user['name'], user['folder'], np.array(rows).reshape(-1, self.dim))
+                stats['encoded'] += len(rows)
+
+        if self.dead_rows() > max(self.rows // 2, 1000):
+            self.compact()
+
+        stats['no_face'] = len(no_face_files)
+        stats['errors'] = len(failures)
+        stats['images'] = sum(user['count'] for user in self.users.values())
+        stats['cached'] = stats['images'] - stats['encoded']
+        stats['users'] = sum(1 for user in self.users.values() if user['count'])
+        return SyncResult(None, None, stats, no_face_files, failures)
+
+    def _import_legacy(self, image_dir, legacy, cache):
+        entries, matrix = cache.load()
+        imported = 0
+        for name, files in legacy.items():
+            user_id = self.find(name) or self.new_id()
+            existing = self.users.get(user_id)
+            folder = existing['folder'] if existing is not None else os.path.join(image_dir, user_id)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+
+            rows, complete = [], existing is None
+            for file in files:
+                source = os.path.join(image_dir, file)
+                entry = entries.get(source)
+                st = os.stat(source)
+                if entry is not None and (entry['size'], entry['mtime']) == (st.st_size, st.st_mtime):
+                    if entry['row'] >= 0:
+                        rows.append(matrix[entry['row']])
+                else:
+                    complete = False
+                os.replace(source, os.path.join(folder, file))
+
+            # New images for an existing user, or any image that was never encoded,
+            # leave the user pending for sync()
+            self.put_user(user_id, name, folder, np.array(rows).reshape(-1, self.dim) if complete else None)
+            imported += len(files)
+        return imported
+
+
+def user_images(folder):
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, file) for file in sorted(os.listdir(folder)) if file.endswith(IMAGE_EXTENSIONS)]
+
+
+def open_gallery(store=None, kind='exact'):
+    """FaceGallery or search index over the users in a GalleryStore.
+
+    The exact backend is built on the store's memory maps without reading or
+    copying them, the other backends index a copy of the live rows.
+    """
+    from matching import FaceGallery
+    from gallery_index import create_index
+
+    store = store if store is not None else GalleryStore()
+    if kind != FaceGallery.KIND:
+        encodings, names = store.live_encodings()
+        return create_index(kind, encodings, names)
+
+    encodings, norms, _ = store.arrays()
+    labels, user_names, alive = store.user_rows()
+    return FaceGallery.from_arrays(encodings, norms, labels, user_names, alive)
@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import threading
+from collections import deque, Counter
+from datetime import datetime
+
+import numpy as np
+
+# Hot-path stages in the order a frame passes through them
+STAGES = ('capture', 'resize', 'face_locations', 'face_encodings', 'matching', 'drawing', 'convert', 'display')
+
+
+class LatencyHistogram:
+    """Rolling window of the most recent durations of one stage, in seconds."""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentiles(self, qs=(50, 95, 99)):
+        # In milliseconds; copied first because other threads keep appending
+        values = np.array(self.samples)
+        if not len(values):
+            return [0.0 for _ in qs]
+        return [float(v) * 1000 for v in np.percentile(values, qs)]
+
+    def summary(self):
+        p50, p95, p99 = self.percentiles()
+        return {'count': self.count, 'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99}
+
+
+class RateMeter:
+    """Events per second over the last `period` seconds."""
+
+    def __init__(self, period=5.0):
+        self.period = period
+        self.events = deque()
+        self._lock = threading.Lock()
+
+    def tick(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            self.events.append(now)
+            self._trim(now)
+
+    def _trim(self, now):
+        while self.events and now - self.events[0] > self.period:
+            self.events.popleft()
+
+    def rate(self):
+        now = time.perf_counter()
+        with self._lock:
+            self._trim(now)
+            if len(self.events) < 2:
+                return 0.0
+            return (len(self.events) - 1) / max(now - self.events[0], 1e-6)
+
+
+class _StageTimer:
+    __slots__ = ('histogram', 'started')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.add(time.perf_counter() - self.started)
+        return False
+
+
+class StageTimings:
+    """Per-stage latency histograms, frame rates and drop counters.
+
+    Stages are timed with `with timings.measure('resize'):` or recorded after
+    the fact with record(). Rates count events such as processed or displayed
+    frames, counters hold totals that are read from elsewhere, like queue drops.
+    """
+
+    def __init__(self, window=1000, rate_period=5.0):
+        self.window = window
+        self.rate_period = rate_period
+        self.stages = {stage: LatencyHistogram(window) for stage in STAGES}
+        self.rates = {}
+        self.counters = {}
+
+    def _histogram(self, stage):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages.setdefault(stage, LatencyHistogram(self.window))
+        return histogram
+
+    def measure(self, stage):
+        return _StageTimer(self._histogram(stage))
+
+    def record(self, stage, seconds):
+        self._histogram(stage).add(seconds)
+
+    def tick(self, name):
+        meter = self.rates.get(name)
+        if meter is None:
+            meter = self.rates.setdefault(name, RateMeter(self.rate_period))
+        meter.tick()
+
+    def set_counter(self, name, value):
+        self.counters[name] = value
+
+    def snapshot(self):
+        return {
+            'stages': {stage: h.summary() for stage, h in list(self.stages.items()) if h.count},
+            'fps': {name: meter.rate() for name, meter in list(self.rates.items())},
+            'counters': dict(self.counters),
+        }
+
+    def format_status(self):
+        # One line for the status bar
+        snapshot = self.snapshot()
+        fps = snapshot['fps']
+        text = (f"{fps.get('processed', 0):.1f} recognition fps, {fps.get('displayed', 0):.1f} display fps, "
+                f"{snapshot['counters'].get('dropped', 0)} dropped")
+        if snapshot['stages']:
+            name, slowest = max(snapshot['stages'].items(), key=lambda item: item[1]['p95_ms'])
+            text += f", slowest stage {name} (p95 {slowest['p95_ms']:.0f} ms)"
+        return text
+
+    def format_lines(self):
+        # Short lines for the video overlay
+        snapshot = self.snapshot()
+        lines = [f"{name} {rate:.1f} fps" for name, rate in snapshot['fps'].items()]
+        lines += [f"{name} {value}" for name, value in snapshot['counters'].items()]
+        lines += [f"{name} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}/{s['p99_ms']:.1f} ms"
+                  for name, s in snapshot['stages'].items()]
+        return lines
+
+    def export(self, path, extra=None):
+        # Writes the current snapshot as JSON, with extra fields merged in
+        data = {'timestamp': datetime.now().isoformat(timespec='seconds')}
+        data.update(extra or {})
+        data.update(self.snapshot())
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=2)
+        return path
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    # Keyed by function, not line, so samples from one function add up
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Samples the call stack of one thread at a fixed interval.
+
+    Unlike cProfile this needs no cooperation from the profiled thread and adds
+    no overhead to it beyond the GIL hand-offs, so it can be switched on in a
+    running session. Results are collapsed stacks (one 'a;b;c count' line per
+    distinct stack, the format flame graph tools read) plus a top list.
+    """
+
+    def __init__(self, thread_id, duration=10.0, interval=0.005, on_done=None):
+        self.thread_id = thread_id
+        self.duration = duration
+        self.interval = interval
+        self.on_done = on_done
+        self.stacks = Counter()
+        self.samples = 0
+        self.thread = None
+
+    @property
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        deadline = time.perf_counter() + self.duration
+        while time.perf_counter() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+        if self.on_done is not None:
+            self.on_done(self)
+
+    def top(self, limit=20):
+        # (function, self samples, inclusive samples) sorted by self time
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for label in set(frames):
+                inclusive[label] += count
+        return [(label, count, inclusive[label]) for label, count in own.most_common(limit)]
+
+    def write(self, path):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        with open(path, 'w') as f:
+            f.write(f"# {self.samples} samples every {self.interval * 1000:.0f} ms\n")
+            f.write("# self% incl% function\n")
+            for label, own, inclusive in self.top():
+                f.write(f"# {own / max(self.samples, 1):6.1%} {inclusive / max(self.samples, 1):6.1%} {label}\n")
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
@@ -0,0 +1,234 @@
+from collections import namedtuple
+import numpy as np
+
+from face_cache import ENCODING_SIZE
+
+FaceMatch = namedtuple('FaceMatch', ['name', 'distance', 'index', 'user_distances'])
+
+# Distance reported when there is nothing to compare with, i.e. confidence 0
+NO_MATCH_DISTANCE = 1.0
+
+
+class FaceGallery:
+    """Contiguous float32 matrix of known encodings with one name per row.
+
+    Rows live in a preallocated buffer that grows geometrically, so adding
+    users never rebuilds the matrix from a Python list, and squared row norms
+    are kept alongside so matching is a single matrix product. This is also
+    the exact brute-force backend of gallery_index.
+    """
+
+    KIND = 'exact'
+
+    def __init__(self, dim=ENCODING_SIZE, capacity=1024):
+        self.dim = dim
+        self._data = np.zeros((capacity, dim), dtype=np.float32)
+        self._sq_norms = np.zeros(capacity, dtype=np.float32)
+        self._labels = np.zeros(capacity, dtype=np.int32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self.names = []
+        self.user_names = []
+        self._user_ids = {}
+        self._size = 0
+        self._removed = 0
+        self._groups = None
+        # CompactionReport when the rows are per-user prototypes, see compaction.py
+        self.compaction = None
+
+    @classmethod
+    def from_encodings(cls, encodings, names):
+        gallery = cls(capacity=max(len(names), 1))
+        gallery.add(encodings, names)
+        return gallery
+
+    @classmethod
+    def from_arrays(cls, encodings, sq_norms, labels, user_names, alive):
+        """Gallery over existing arrays, e.g. the memory maps of a GalleryStore.
+
+        The encodings and norms are used as they are, without copying, and
+        may be read-only: adding rows later moves everything into a new,
+        larger buffer first. labels index user_names, rows where alive is
+        False never match.
+        """
+        gallery = cls(dim=encodings.shape[1], capacity=1)
+        gallery._data = encodings
+        gallery._sq_norms = sq_norms
+        gallery._labels = np.asarray(labels, dtype=np.int32)
+        gallery._alive = np.asarray(alive, dtype=bool)
+        gallery.user_names = list(user_names)
+        gallery._user_ids = {name: i for i, name in enumerate(gallery.user_names)}
+        gallery.names = np.array(gallery.user_names or [''], dtype=object)[gallery._labels].tolist()
+        gallery._size = len(encodings)
+        gallery._removed = int(len(encodings) - gallery._alive.sum())
+        return gallery
+
+    def __len__(self):
+        return self._size - self._removed
+
+    @property
+    def matrix(self):
+        return self._data[:self._size]
+
+    @property
+    def labels(self):
+        return self._labels[:self._size]
+
+    @property
+    def alive(self):
+        return self._alive[:self._size]
+
+    def _reserve(self, count):
+        if count <= len(self._data):
+            return
+        capacity = max(count, 2 * len(self._data))
+        for attr in ('_data', '_sq_norms', '_labels', '_alive'):
+            old = getattr(self, attr)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, attr, new)
+
+    def add(self, encodings, names):
+        # Returns the row ids of the new encodings, which stay valid until the
+        # gallery is rebuilt
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        if len(encodings) != len(names):
+            raise ValueError("encodings and names must have the same length")
+
+        start = self._size
+        end = start + len(encodings)
+        self._reserve(end)
+
+        self._data[start:end] = encodings
+        self._alive[start:end] = True
+        self._sq_norms[start:end] = np.einsum('ij,ij->i', encodings, encodings)
+        for i, name in enumerate(names):
+            if name not in self._user_ids:
+                self._user_ids[name] = len(self.user_names)
+                self.user_names.append(name)
+            self._labels[start + i] = self._user_ids[name]
+
+        self.names.extend(names)
+        self._size = end
+        self._groups = None
+        self._on_add(np.arange(start, end))
+        return list(range(start, end))
+
+    def remove(self, ids):
+        # Removed rows are tombstoned, they keep their slot but never match again
+        ids = [i for i in ids if 0 <= i < self._size and self._alive[i]]
+        self._alive[ids] = False
+        self._removed += len(ids)
+        self._on_remove(ids)
+        return len(ids)
+
+    def remove_user(self, name):
+        return self.remove([i for i, n in enumerate(self.names) if n == name])
+
+    def clear(self):
+        self.names = []
+        self.user_names = []
+        self._user_ids = {}
+        self._size = 0
+        self._removed = 0
+        self._groups = None
+        self._on_remove(None)
+
+    def live_rows(self):
+        return np.flatnonzero(self.alive)
+
+    def _on_add(self, rows):
+        pass
+
+    def _on_remove(self, rows):
+        pass
+
+    def distances(self, query_encodings):
+        # Euclidean distances between every query and every gallery row, computed
+        # as |q|^2 + |g|^2 - 2 q.g so the heavy part is one BLAS matrix product
+        queries = np.asarray(query_encodings, dtype=np.float32).reshape(-1, self.dim)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        d2 = queries @ self.matrix.T
+        d2 *= -2.0
+        d2 += q_sq[:, None]
+        d2 += self._sq_norms[:self._size][None, :]
+        np.maximum(d2, 0.0, out=d2)
+        np.sqrt(d2, out=d2)
+        if self._removed:
+            d2[:, ~self.alive] = np.inf
+        return d2
+
+    def search(self, query_encodings, k=1, max_distance=None):
+        """Exact top-k search.
+
+        Returns one list of (row, distance) pairs per query, closest first,
+        leaving out anything farther than max_distance.
+        """
+        distances = self.distances(query_encodings)
+        k = min(k, len(self))
+        results = []
+        for row in distances:
+            if k <= 0:
+                results.append([])
+                continue
+            top = np.argpartition(row, k - 1)[:k]
+            top = top[np.argsort(row[top])]
+            results.append([(int(i), float(row[i])) for i in top
+                            if max_distance is None or row[i] <= max_distance])
+        return results
+
+    def _user_groups(self):
+        # Row order that puts each user's encodings next to each other, so per-user
+        # minimums can be taken with a single reduceat
+        if self._groups is None:
+            order = np.argsort(self.labels, kind='stable')
+            sorted_labels = self.labels[order]
+            starts = np.flatnonzero(np.r_[True, sorted_labels[1:] != sorted_labels[:-1]])
+            self._groups = (order, starts, sorted_labels[starts])
+        return self._groups
+
+    def user_distances(self, distances):
+        order, starts, user_ids = self._user_groups()
+        result = np.full((len(distances), len(self.user_names)), np.inf, dtype=np.float32)
+        if len(order):
+            result[:, user_ids] = np.minimum.reduceat(distances[:, order], starts, axis=1)
+        return result
+
+    def match(self, query_encodings, tolerance=0.6):
+        """Match all query encodings against the gallery in one pass.
+
+        Returns one FaceMatch per query. name is "Unknown" when the closest
+        encoding is farther than tolerance; distance and index always refer to
+        the closest encoding, and user_distances holds the best distance per
+        entry of user_names. An empty gallery reports NO_MATCH_DISTANCE and
+        index -1.
+        """
+        if len(query_encodings) == 0:
+            return []
+        if len(self) == 0:
+            empty = np.zeros(0, dtype=np.float32)
+            return [FaceMatch("Unknown", NO_MATCH_DISTANCE, -1, empty) for _ in range(len(query_encodings))]
+
+        distances = self.distances(query_encodings)
+        best = np.argmin(distances, axis=1)
+        best_distances = distances[np.arange(len(best)), best]
+        per_user = self.user_distances(distances)
+
+        matches = []
+        for i, index in enumerate(best):
+            distance = float(best_distances[i])
+            name = self.names[index] if distance <= tolerance else "Unknown"
+            matches.append(FaceMatch(name, distance, int(index), per_user[i]))
+        return matches
+
+    def save(self, path):
+        # Written as a single .npz, see gallery_index.load_index
+        with open(path, 'wb') as f:
+            np.savez(f, **self._state())
+
+    def _state(self):
+        return {
+            'kind': np.array(self.KIND),
+            'encodings': self.matrix,
+            'names': np.array(self.names, dtype=str),
+            'alive': self.alive,
+        }
@@ -1,14 +1,53 @@
+import time
+STARTED = time.perf_counter()
+
 import tkinter as tk
 from tkinter import ttk, messagebox, font
-import cv2
 import os
 import sys
-import numpy as np
-from PIL import Image, ImageTk
 import threading
-import time
-from datetime import datetime
 import subprocess
+from concurrent.futures import ProcessPoolExecutor
+
+from attendance_store import AttendanceStore
+from record_view import RecordIndex, VirtualTreeview
+from export import EXPORT_FORMATS, ExportCancelled, ExportJob, export_path
+from warmup import models
+from event_log import EventLog, format_event
+
+
+def load_app_modules():
+    """Import the OpenCV and numpy based modules the windows need.
+
+    They are kept out of the module imports so the main window shows up
+    right away. The model warm-up thread calls this first, and every window
+    that needs the modules calls it again, which waits for an import still in
+    progress and is free afterwards.
+    """
+    global cv2, IMAGE_EXTENSIONS, GalleryStore, FaceGallery, create_index, INDEX_TYPES
+    global RecognitionEngine, load_gallery, describe_gallery_load, warm_up_models, AdaptiveController
+    global check_capture, CaptureCheck, PreviewFaceDetector, registrations, VideoPreview, AttendanceAnalytics
+    global choose_detector, DETECTOR_TYPES, describe_scores
+    import cv2
+    from face_cache import IMAGE_EXTENSIONS
+    from gallery_store import GalleryStore
+    from matching import FaceGallery
+    from gallery_index import create_index, INDEX_TYPES
+    from engine import RecognitionEngine, load_gallery, describe_gallery_load, warm_up_models, choose_detector
+    from detectors import DETECTOR_TYPES, describe_scores
+    from adaptive import AdaptiveController
+    from registration import check_capture, CaptureCheck, PreviewFaceDetector, registrations
+    from preview import VideoPreview
+    from analytics import AttendanceAnalytics
+
+RECORD_COLUMNS = ("Name", "Time", "Date")
+ANALYTICS_COLUMNS = ("Name", "Present", "Absent", "Rate %", "Longest streak", "Current streak", "Late", "Avg arrival")
+ALL_DATES = "All dates"
+
+# The attendance log is drawn from the event buffer on a timer and keeps this many lines
+LOG_FLUSH_MS = 250
+MAX_LOG_LINES = 500
+EVENT_LOG_FILE = os.path.join('Logs', 'attendance.log')
 
 class FaceAttendanceApp:
     def __init__(self, root):
@@ -67,16 +106,49 @@ class FaceAttendanceApp:
                                  command=self.exit_app)
         self.btn_exit.pack(pady=10, fill=tk.X)
         
+        # Face models load in the background, recognition can start once they are ready
+        self.ready_frame = ttk.Frame(self.main_frame)
+        self.ready_frame.pack(fill=tk.X)
+        self.ready_label = ttk.Label(self.ready_frame, text=models.describe(), font=self.normal_font)
+        self.ready_label.pack(side=tk.LEFT, padx=5)
+        self.ready_progress = ttk.Progressbar(self.ready_frame, mode='determinate', length=150,
+                                              maximum=len(models.STAGES))
+        self.ready_progress.pack(side=tk.RIGHT, padx=5)
+        
         # Status bar
         self.status_bar = ttk.Label(self.root, text="Ready", relief=tk.SUNKEN, anchor=tk.W)
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
+        # Start loading once the window has been drawn
+        self.shown_after = None
+        self.root.after(1, self.start_warmup)
+        
         # Create directories if they don't exist
         if not os.path.exists('Images'):
             os.makedirs('Images')
         if not os.path.exists('Attendance'):
             os.makedirs('Attendance')
     
+    def start_warmup(self):
+        self.shown_after = time.perf_counter() - STARTED
+        models.add_listener(self.warmup_changed)
+        models.start(load_app_modules)
+    
+    def warmup_changed(self):
+        # Called on the loading thread
+        try:
+            self.root.after(0, self.update_readiness)
+        except (tk.TclError, RuntimeError):
+            pass
+    
+    def update_readiness(self):
+        done, total = models.progress()
+        self.ready_progress.config(value=done)
+        self.ready_label.config(text=models.describe())
+        if models.state != 'loading':
+            self.ready_progress.pack_forget()
+            self.ready_label.config(text=f"{models.describe()} (window shown after {self.shown_after:.2f} s)")
+    
     def start_attendance_system(self):
         self.status_bar.config(text="Starting attendance system...")
         AttendanceSystemWindow(self.root, self.status_bar)
@@ -96,6 +168,7 @@ class FaceAttendanceApp:
 
 class RegisterUserWindow:
     def __init__(self, parent, status_bar):
+        load_app_modules()
         self.parent = parent
         self.status_bar = status_bar
         self.window = tk.Toplevel(parent)
@@ -138,6 +211,7 @@ class RegisterUserWindow:
         # Canvas for video
         self.canvas = tk.Canvas(self.video_frame, bg="black")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.preview = VideoPreview(self.canvas)
         
         # Status label
         self.status_label = ttk.Label(self.main_frame, text="Enter name and click 'Take Pictures'", font=self.normal_font)
@@ -160,9 +234,13 @@ class RegisterUserWindow:
         self.cap = None
         self.is_running = False
         self.captured_images = []
+        self.captured_encodings = []
+        self.rejected = 0
+        self.checking = 0
+        self.encoder = None
         self.current_frame = None
         self.capture_thread = None
-        self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.face_detector = PreviewFaceDetector()
         
         # Key bindings
         self.window.bind('<space>', lambda event: self.capture_image())
@@ -178,7 +256,7 @@ class RegisterUserWindow:
             return
             
         name = self.name_var.get().strip()
-        if os.path.exists(f'Images/{name}_1.jpg'):
+        if GalleryStore().find(name) is not None:
             if not messagebox.askyesno("Warning", f"User '{name}' already exists. Do you want to overwrite?"):
                 return
                 
@@ -187,6 +265,16 @@ class RegisterUserWindow:
             
         self.is_running = True
         self.captured_images = []
+        self.captured_encodings = []
+        self.rejected = 0
+        self.checking = 0
+        
+        # Captures are checked and encoded in a worker process as they are taken,
+        # so the preview never waits on dlib
+        if self.encoder is None:
+            self.encoder = ProcessPoolExecutor(max_workers=1)
+            # Load the models in the worker while the user gets into position
+            self.encoder.submit(warm_up_models)
         self.capture_btn.config(state=tk.NORMAL)
         self.save_btn.config(state=tk.DISABLED)
         self.status_label.config(text="Camera initialized. Press 'Capture' or SPACE to take pictures (min 5 recommended)")
@@ -201,6 +289,7 @@ class RegisterUserWindow:
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             
+            self.face_detector.reset()
             self.capture_thread = threading.Thread(target=self.update_frame)
             self.capture_thread.daemon = True
             self.capture_thread.start()
@@ -217,18 +306,13 @@ class RegisterUserWindow:
                     self.is_running = False
                     break
                     
-                self.current_frame = frame.copy()
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                faces = self.face_cascade.detectMultiScale(gray, 1.3, 5)
-                
-                for (x, y, w, h) in faces:
-                    cv2.rectangle(frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
+                # Every read returns a new array, so the clean frame can be kept
+                # as is and is only copied when it is captured
+                self.current_frame = frame
+                faces = self.face_detector.detect(frame, time.monotonic())
                 
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(frame_rgb)
-                
-                if self.is_running and self.window.winfo_exists():
-                    self.window.after(0, lambda img=img: self.update_canvas(img))
+                if self.is_running:
+                    self.preview.submit(frame, faces)
                 
                 time.sleep(0.03)
             except Exception as e:
@@ -236,58 +320,111 @@ class RegisterUserWindow:
                     print(f"Error in update_frame: {str(e)}")
                 time.sleep(0.1)
     
-    def update_canvas(self, img):
-        if not self.is_running or not self.window.winfo_exists():
+    def capture_image(self):
+        if not self.is_running or self.current_frame is None:
             return
             
+        image = self.current_frame.copy()
+        self.checking += 1
+        future = self.encoder.submit(check_capture, image)
+        future.add_done_callback(lambda future: self._on_checked(image, future))
+        self.update_capture_status("Checking image...")
+    
+    def _on_checked(self, image, future):
+        # Runs on the pool's result thread, hand over to Tk unless the window is closing
+        if self.encoder is not None:
+            self.window.after(0, self._capture_checked, image, future)
+    
+    def _capture_checked(self, image, future):
+        if not self.window.winfo_exists():
+            return
+        self.checking -= 1
+        
         try:
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.canvas.config(width=img.width, height=img.height)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
-            self.canvas.image = imgtk
+            result = future.result()
+        except ImportError:
+            # Without face_recognition the image is kept unchecked, it is encoded when the gallery loads
+            result = CaptureCheck(None, None, None, None)
         except Exception as e:
-            print(f"Error in update_canvas: {str(e)}")
-    
-    def capture_image(self):
-        if not self.is_running or self.current_frame is None:
+            result = CaptureCheck(None, f"could not check image ({str(e)})", None, None)
+        
+        if result.reason is not None:
+            self.rejected += 1
+            self.update_capture_status(f"Rejected: {result.reason}.")
             return
-            
-        self.captured_images.append(self.current_frame.copy())
-        self.status_label.config(text=f"Captured {len(self.captured_images)} images. Take at least 5 from different angles.")
+        
+        self.captured_images.append(image)
+        self.captured_encodings.append(result.encoding)
+        self.update_capture_status("")
         
         if len(self.captured_images) >= 5:
             self.save_btn.config(state=tk.NORMAL)
     
+    def update_capture_status(self, message):
+        text = f"Captured {len(self.captured_images)} good images"
+        if self.rejected:
+            text += f", {self.rejected} rejected"
+        if self.checking:
+            text += f", {self.checking} being checked"
+        text += ". Take at least 5 from different angles."
+        self.status_label.config(text=f"{message} {text}".strip())
+    
     def save_registration(self):
+        if self.checking:
+            messagebox.showinfo("Please wait", "Some captures are still being checked.")
+            return
+        
         if len(self.captured_images) < 5:
             messagebox.showwarning("Warning", "Please capture at least 5 images!")
             return
             
         name = self.name_var.get().strip()
         
+        # Every user has their own folder under Images/, named by user id, so
+        # re-registering only replaces that folder and the user's gallery entry
         try:
-            if not os.path.exists('Images'):
-                os.makedirs('Images')
-                
-            for file in os.listdir('Images'):
-                if file.startswith(f"{name}_") and file.endswith(('.jpg', '.jpeg', '.png')):
-                    os.remove(os.path.join('Images', file))
+            store = GalleryStore()
+            user_id = store.find(name) or store.new_id()
+            folder = os.path.join('Images', user_id)
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            for file in os.listdir(folder):
+                os.remove(os.path.join(folder, file))
             
-            saved_count = 0
+            images = []
             for i, img in enumerate(self.captured_images):
-                image_path = f'Images/{name}_{i+1}.jpg'
+                image_path = os.path.join(folder, f'{i+1}.jpg')
                 cv2.imwrite(image_path, img)
-                saved_count += 1
-            
-            messagebox.showinfo("Success", f"Successfully registered {name} with {saved_count} images!")
-            self.status_bar.config(text=f"Registered new user: {name}")
-            self.close_window()
+                images.append(image_path)
+            saved_count = len(images)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save images: {str(e)}")
-    
+            return
+        
+        # The encodings go straight into the gallery and any running recognition session,
+        # so nothing has to be re-encoded when the gallery loads next. Unchecked captures
+        # are left pending and encoded by the next load
+        encodings = [encoding for encoding in self.captured_encodings if encoding is not None]
+        complete = len(encodings) == len(images)
+        try:
+            store.put_user(user_id, name, folder, encodings if complete else None)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save registration: {str(e)}")
+            return
+        if complete:
+            registrations.publish(name, encodings)
+        
+        messagebox.showinfo("Success", f"Successfully registered {name} with {saved_count} images!")
+        self.status_bar.config(text=f"Registered new user: {name}")
+        self.close_window()
+
     def close_window(self):
         self.is_running = False
         
+        if self.encoder is not None:
+            self.encoder.shutdown(wait=False, cancel_futures=True)
+            self.encoder = None
+        
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -301,11 +438,12 @@ class RegisterUserWindow:
 
 class AttendanceSystemWindow:
     def __init__(self, parent, status_bar):
-        try:
-            import face_recognition
-        except ImportError:
+        # The models are loaded in the background by the main window, this only
+        # refuses to open once it is known that face_recognition is missing
+        if models.state == 'unavailable':
             messagebox.showerror("Error", "The face_recognition library is not installed. Please install it with: pip install face_recognition")
             return
+        load_app_modules()
             
         self.parent = parent
         self.status_bar = status_bar
@@ -340,6 +478,41 @@ class AttendanceSystemWindow:
         self.tolerance_slider.pack(side=tk.LEFT, padx=5)
         ttk.Label(self.settings_frame, text="Strict").pack(side=tk.LEFT)
         
+        # Gallery index backend
+        ttk.Label(self.settings_frame, text="Index:").pack(side=tk.LEFT, padx=(20, 5))
+        self.index_var = tk.StringVar(value='exact')
+        self.index_dropdown = ttk.Combobox(self.settings_frame, textvariable=self.index_var,
+                                           values=list(INDEX_TYPES), state="readonly", width=10)
+        self.index_dropdown.pack(side=tk.LEFT, padx=5)
+        self.index_dropdown.bind('<<ComboboxSelected>>', lambda event: self.change_index())
+        
+        # Face detector backend, auto measures them on the registered images
+        ttk.Label(self.settings_frame, text="Detector:").pack(side=tk.LEFT, padx=(20, 5))
+        self.detector_var = tk.StringVar(value='hog')
+        self.detector_dropdown = ttk.Combobox(self.settings_frame, textvariable=self.detector_var,
+                                              values=list(DETECTOR_TYPES) + ['auto'], state="readonly", width=6)
+        self.detector_dropdown.pack(side=tk.LEFT, padx=5)
+        self.detector_dropdown.bind('<<ComboboxSelected>>', lambda event: self.change_detector())
+        
+        # Per-user prototypes instead of every registration image
+        self.compact_var = tk.BooleanVar(value=False)
+        self.compact_check = ttk.Checkbutton(self.settings_frame, text="Compact gallery", variable=self.compact_var,
+                                             command=self.load_known_faces)
+        self.compact_check.pack(side=tk.LEFT, padx=(20, 5))
+        
+        # Performance stats drawn over the video
+        self.overlay_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.settings_frame, text="Stats overlay", variable=self.overlay_var,
+                        command=self.toggle_overlay).pack(side=tk.LEFT, padx=(20, 5))
+        
+        # Adaptive scale and frame skipping towards a target frame rate, off by default
+        self.adaptive_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.settings_frame, text="Adaptive, target fps:", variable=self.adaptive_var,
+                        command=self.update_controller).pack(side=tk.LEFT, padx=(20, 0))
+        self.target_fps_var = tk.StringVar(value="10")
+        ttk.Spinbox(self.settings_frame, from_=1, to=30, width=4, textvariable=self.target_fps_var,
+                    command=self.update_controller).pack(side=tk.LEFT, padx=5)
+        
         # Video frame
         self.video_frame = ttk.Frame(self.main_frame)
         self.video_frame.pack(pady=10, fill=tk.BOTH, expand=True)
@@ -347,19 +520,30 @@ class AttendanceSystemWindow:
         # Canvas for video
         self.canvas = tk.Canvas(self.video_frame, bg="black")
         self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.preview = VideoPreview(self.canvas)
         
         # Attendance log frame
         self.log_frame = ttk.Frame(self.main_frame)
         self.log_frame.pack(pady=10, fill=tk.X)
         
         # Log components
-        self.log_label = ttk.Label(self.log_frame, text="Attendance Log:", font=self.normal_font)
-        self.log_label.pack(anchor=tk.W)
+        self.log_header = ttk.Frame(self.log_frame)
+        self.log_header.pack(fill=tk.X)
+        self.log_label = ttk.Label(self.log_header, text="Attendance Log:", font=self.normal_font)
+        self.log_label.pack(side=tk.LEFT)
+        self.log_file_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(self.log_header, text=f"Save to {EVENT_LOG_FILE}", variable=self.log_file_var,
+                        command=self.toggle_log_file).pack(side=tk.RIGHT)
         
         self.log_text = tk.Text(self.log_frame, height=6, font=("Consolas", 10))
         self.log_text.pack(fill=tk.X, pady=5)
         self.log_text.config(state=tk.DISABLED)
         
+        # Messages from any thread go into a bounded buffer, the widget catches up on a timer
+        self.events = EventLog()
+        self.log_seq = 0
+        self.log_job = self.window.after(LOG_FLUSH_MS, self.flush_log)
+        
         # Control buttons
         self.buttons_frame = ttk.Frame(self.main_frame)
         self.buttons_frame.pack(pady=10, fill=tk.X)
@@ -370,16 +554,40 @@ class AttendanceSystemWindow:
         self.stop_btn = ttk.Button(self.buttons_frame, text="Stop", state=tk.DISABLED, command=self.stop_recognition)
         self.stop_btn.pack(side=tk.LEFT, padx=5)
         
+        self.profile_btn = ttk.Button(self.buttons_frame, text="Profile 10s", state=tk.DISABLED, command=self.start_profiling)
+        self.profile_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.export_stats_btn = ttk.Button(self.buttons_frame, text="Export Stats", command=self.export_stats)
+        self.export_stats_btn.pack(side=tk.LEFT, padx=5)
+        
         self.close_btn = ttk.Button(self.buttons_frame, text="Close", command=self.close_window)
         self.close_btn.pack(side=tk.RIGHT, padx=5)
         
         # Variables
-        self.cap = None
         self.is_running = False
-        self.recognition_thread = None
-        self.known_face_encodings = []
-        self.known_face_names = []
-        self.marked_attendance = set()
+        self.gallery = FaceGallery()
+        self.gallery_loading = False
+        self.stats_job = None
+        
+        # The window is a thin client of the recognition engine
+        self.engine = RecognitionEngine(tolerance=self.tolerance_var.get(),
+                                        on_log=self.log_message, on_frame=self.show_frame,
+                                        controller=AdaptiveController(enabled=False))
+        self.update_controller()
+        self.target_fps_var.trace_add('write', lambda *args: self.update_controller())
+        
+        # Shows what the adaptive controller is currently doing
+        self.controller_label = ttk.Label(self.main_frame, text=self.engine.controller.describe())
+        self.controller_label.pack(before=self.video_frame, anchor=tk.W)
+        self.tolerance_var.trace_add('write', lambda *args: self.update_tolerance())
+        
+        # Users registered while this window is open are added to the running gallery
+        registrations.subscribe(self.user_registered)
+        
+        # Recognition can start once both the gallery and the models are ready
+        models.add_listener(self.models_changed)
+        if not models.is_ready:
+            self.log_message(models.describe())
         
         # Load known faces
         self.load_known_faces()
@@ -391,230 +599,277 @@ class AttendanceSystemWindow:
         self.window.bind('<Escape>', lambda event: self.close_window())
     
     def load_known_faces(self):
-        import face_recognition
-        
-        self.known_face_encodings = []
-        self.known_face_names = []
+        self.gallery = FaceGallery()
         
         if not os.path.exists('Images'):
             messagebox.showerror("Error", "Images directory not found!")
             return
         
-        image_files = [f for f in os.listdir('Images') if f.endswith(('.jpg', '.jpeg', '.png'))]
+        # Registered users are in the gallery store, loose images are from the old layout
+        # and are imported by the loader
+        image_files = [f for f in os.listdir('Images') if f.endswith(IMAGE_EXTENSIONS)]
         
-        if not image_files:
+        if not image_files and len(GalleryStore()) == 0:
             messagebox.showwarning("Warning", "No registered faces found! Please register users first.")
             return
         
         self.log_message("Loading registered faces...")
         
-        for file in image_files:
-            try:
-                name = file.split('_')[0]
-                image_path = os.path.join('Images', file)
-                image = face_recognition.load_image_file(image_path)
-                
-                face_encodings = face_recognition.face_encodings(image)
-                if len(face_encodings) > 0:
-                    self.known_face_encodings.append(face_encodings[0])
-                    self.known_face_names.append(name)
-                else:
-                    self.log_message(f"Warning: No face found in {file}")
-                
-            except Exception as e:
-                self.log_message(f"Error processing {file}: {str(e)}")
+        # The gallery is built on a background thread so the window stays responsive,
+        # recognition can start once it is done
+        self.gallery_loading = True
+        self.update_start_button()
+        # Tk variables are read here, not on the loader thread
+        self.loader_thread = threading.Thread(target=self._build_gallery,
+                                              args=(self.index_var.get(), self.compact_var.get()))
+        self.loader_thread.daemon = True
+        self.loader_thread.start()
+    
+    def _build_gallery(self, index, compact):
+        def on_progress(done, total):
+            if done == total or done % max(1, total // 10) == 0:
+                self.log_message(f"Encoding new face images: {done}/{total}")
         
-        unique_names = set(self.known_face_names)
-        self.log_message(f"Loaded {len(self.known_face_encodings)} face images for {len(unique_names)} users")
+        try:
+            gallery, result = load_gallery('Images', index=index, on_progress=on_progress, compact=compact)
+        except Exception as e:
+            self.log_message(f"Error loading registered faces: {str(e)}")
+            self.window.after(0, self._gallery_failed)
+            return
         
-    def start_recognition(self):
-        import face_recognition
+        self.window.after(0, self._gallery_loaded, gallery, result)
+    
+    def _gallery_failed(self):
+        # Recognition can still start, with the gallery that was there before
+        if not self.window.winfo_exists():
+            return
+        self.gallery_loading = False
+        self.update_start_button()
+    
+    def _gallery_loaded(self, gallery, result):
+        if not self.window.winfo_exists():
+            return
+            
+        for message in describe_gallery_load(gallery, result):
+            self.log_message(message)
         
+        self.gallery = gallery
+        self.engine.gallery = gallery
+        self.gallery_loading = False
+        self.update_start_button()
+    
+    def models_changed(self):
+        # Called on the model loading thread
+        if models.state != 'loading':
+            try:
+                self.window.after(0, self.models_finished)
+            except (tk.TclError, RuntimeError):
+                pass
+    
+    def models_finished(self):
+        if not self.window.winfo_exists():
+            return
+        self.log_message(models.describe())
+        self.update_start_button()
+    
+    def update_start_button(self):
+        if self.is_running:
+            return
+        ready = not self.gallery_loading and models.is_ready
+        self.start_btn.config(state=tk.NORMAL if ready else tk.DISABLED)
+        
+    def change_index(self):
+        # Rebuild the current gallery with the selected backend, no re-encoding needed
+        kind = self.index_var.get()
+        rows = self.gallery.live_rows()
+        compaction = self.gallery.compaction
+        self.gallery = create_index(kind, self.gallery.matrix[rows], [self.gallery.names[i] for i in rows])
+        self.gallery.compaction = compaction
+        self.engine.gallery = self.gallery
+        self.log_message(f"Using '{kind}' gallery index for {len(self.gallery)} face images")
+    
+    def change_detector(self):
+        # Models are loaded, and for auto every backend is measured, on a background
+        # thread; recognition keeps the current detector until the new one is ready
+        kind = self.detector_var.get()
+        self.detector_dropdown.config(state=tk.DISABLED)
+        if kind == 'auto':
+            self.log_message("Measuring face detectors on the registered images...")
+        thread = threading.Thread(target=self._load_detector, args=(kind,))
+        thread.daemon = True
+        thread.start()
+    
+    def _load_detector(self, kind):
+        try:
+            detector, scores = choose_detector(kind)
+            detector.load()
+        except Exception as e:
+            detector, scores = None, [str(e)]
+        try:
+            self.window.after(0, self._detector_loaded, detector, scores)
+        except (tk.TclError, RuntimeError):
+            pass
+    
+    def _detector_loaded(self, detector, scores):
+        if not self.window.winfo_exists():
+            return
+        self.detector_dropdown.config(state="readonly")
+        if detector is None:
+            self.log_message(f"Could not load face detector: {scores[0]}")
+            self.detector_var.set(self.engine.detector.KIND)
+            return
+        for line in describe_scores(scores, detector):
+            self.log_message(f"Detector {line}")
+        self.engine.detector = detector
+        self.log_message(f"Face detector: {detector.describe()}")
+    
+    def user_registered(self, name, encodings):
+        self.engine.update_user(name, encodings)
+        self.log_message(f"Added {name} with {len(encodings)} face images to the running session")
+    
+    def update_tolerance(self):
+        try:
+            self.engine.tolerance = self.tolerance_var.get()
+        except tk.TclError:
+            pass
+    
+    def start_recognition(self):
         if self.is_running:
             return
             
-        if not self.known_face_encodings:
+        if len(self.gallery) == 0:
             messagebox.showwarning("Warning", "No registered faces found!")
             return
             
-        self.is_running = True
-        self.marked_attendance = set()
-        self.start_btn.config(state=tk.DISABLED)
-        self.stop_btn.config(state=tk.NORMAL)
-        self.status_bar.config(text="Recognition system running...")
-        
-        self.today = datetime.now().strftime('%Y-%m-%d')
-        self.attendance_file = f'Attendance/Attendance-{self.today}.csv'
-        
-        if not os.path.exists('Attendance'):
-            os.makedirs('Attendance')
-            
-        if not os.path.exists(self.attendance_file):
-            with open(self.attendance_file, 'w') as f:
-                f.write('Name,Time,Date\n')
-        
         try:
-            self.cap = cv2.VideoCapture(0)
-            if not self.cap.isOpened():
+            cap = cv2.VideoCapture(0)
+            if not cap.isOpened():
                 messagebox.showerror("Error", "Could not open webcam!")
-                self.is_running = False
-                self.start_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.DISABLED)
                 return
                 
-            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+            cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+            cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
             
-            self.recognition_thread = threading.Thread(target=self.run_recognition)
-            self.recognition_thread.daemon = True
-            self.recognition_thread.start()
+            self.is_running = True
+            self.engine.start(cap)
+            self.preview.timings = self.engine.stats.timings
         except Exception as e:
             messagebox.showerror("Error", f"Failed to start camera: {str(e)}")
             self.is_running = False
-            self.start_btn.config(state=tk.NORMAL)
-            self.stop_btn.config(state=tk.DISABLED)
-    
-    def run_recognition(self):
-        import face_recognition
-        
-        process_this_frame = True
-        frame_count = 0
+            return
         
-        while self.is_running:
-            try:
-                ret, frame = self.cap.read()
-                if not ret or frame is None:
-                    self.log_message("Error: Could not access webcam!")
-                    break
-                    
-                if process_this_frame:
-                    try:
-                        small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
-                        rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
-                        
-                        face_locations = face_recognition.face_locations(rgb_small_frame)
-                        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
-                        
-                        face_names = []
-                        tolerance = self.tolerance_var.get()
-                        
-                        for face_encoding in face_encodings:
-                            matches = face_recognition.compare_faces(
-                                self.known_face_encodings, face_encoding, tolerance=tolerance
-                            )
-                            name = "Unknown"
-                            confidence = 0
-                            
-                            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-                            if len(face_distances) > 0:
-                                best_match_index = np.argmin(face_distances)
-                                confidence = 1 - face_distances[best_match_index]
-                                
-                                if matches[best_match_index]:
-                                    name = self.known_face_names[best_match_index]
-                                    
-                                    if name not in self.marked_attendance and name != "Unknown":
-                                        self.mark_attendance(name)
-                                        self.marked_attendance.add(name)
-                            
-                            face_names.append((name, confidence))
-                            
-                        display_frame = frame.copy()
-                        for (top, right, bottom, left), (name, confidence) in zip(face_locations, face_names):
-                            top *= 4
-                            right *= 4
-                            bottom *= 4
-                            left *= 4
-                            
-                            color = (0, 0, 255) if name == "Unknown" else (0, 255, 0)
-                            
-                            cv2.rectangle(display_frame, (left, top), (right, bottom), color, 2)
-                            cv2.rectangle(display_frame, (left, bottom - 35), (right, bottom), color, cv2.FILLED)
-                            
-                            confidence_text = f"{confidence:.2f}" if confidence > 0 else "N/A"
-                            text = f"{name} ({confidence_text})"
-                            cv2.putText(display_frame, text, (left + 6, bottom - 6), 
-                                      cv2.FONT_HERSHEY_DUPLEX, 0.6, (255, 255, 255), 1)
-                    except Exception as e:
-                        self.log_message(f"Error in face recognition: {str(e)}")
-                        display_frame = frame
-                else:
-                    display_frame = frame
-                
-                process_this_frame = not process_this_frame
-                
-                rgb_frame = cv2.cvtColor(display_frame, cv2.COLOR_BGR2RGB)
-                img = Image.fromarray(rgb_frame)
-                
-                if self.is_running and self.window.winfo_exists():
-                    self.window.after(0, lambda img=img: self.update_canvas(img))
-                
-                frame_count += 1
-                time.sleep(0.03)
-                
-            except Exception as e:
-                if self.is_running:
-                    self.log_message(f"Error in recognition loop: {str(e)}")
-                time.sleep(0.1)
+        self.start_btn.config(state=tk.DISABLED)
+        self.stop_btn.config(state=tk.NORMAL)
+        self.profile_btn.config(state=tk.NORMAL)
+        self.status_bar.config(text="Recognition system running...")
+        self.stats_job = self.window.after(1000, self.update_stats)
     
-    def update_canvas(self, img):
+    def update_stats(self):
+        # Live numbers in the status bar, once a second while running
+        self.stats_job = None
         if not self.is_running or not self.window.winfo_exists():
             return
-            
+        self.status_bar.config(text=self.engine.stats.timings.format_status())
+        self.controller_label.config(text=f"Detection: {self.engine.controller.describe()}")
+        self.stats_job = self.window.after(1000, self.update_stats)
+    
+    def update_controller(self):
+        controller = self.engine.controller
         try:
-            imgtk = ImageTk.PhotoImage(image=img)
-            self.canvas.config(width=img.width, height=img.height)
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
-            self.canvas.image = imgtk
-        except Exception as e:
-            print(f"Error in update_canvas: {str(e)}")
+            controller.target_fps = max(1.0, float(self.target_fps_var.get()))
+        except ValueError:
+            pass
+        if controller.enabled != self.adaptive_var.get():
+            controller.enabled = self.adaptive_var.get()
+            controller.reset()
     
-    def mark_attendance(self, name):
-        now = datetime.now()
-        time_string = now.strftime('%H:%M:%S')
-        date_string = now.strftime('%Y-%m-%d')
-        
-        self.log_message(f"Marked attendance for {name} at {time_string}")
-        
+    def toggle_overlay(self):
+        self.engine.show_overlay = self.overlay_var.get()
+    
+    def export_stats(self):
         try:
-            with open(self.attendance_file, 'a') as f:
-                f.write(f'{name},{time_string},{date_string}\n')
+            path = self.engine.export_stats()
         except Exception as e:
-            self.log_message(f"Error writing attendance: {str(e)}")
+            messagebox.showerror("Error", f"Failed to export stats: {str(e)}")
+            return
+        self.log_message(f"Stats written to {path}")
+        self.status_bar.config(text=f"Exported performance stats: {path}")
+    
+    def start_profiling(self):
+        if self.engine.start_profiling(10.0, on_done=lambda path: self.window.after(0, self._profiling_done)):
+            self.profile_btn.config(state=tk.DISABLED)
+    
+    def _profiling_done(self):
+        if self.window.winfo_exists() and self.is_running:
+            self.profile_btn.config(state=tk.NORMAL)
+    
+    def show_frame(self, frame):
+        # Called on the engine's render thread with an annotated BGR frame,
+        # the preview only keeps the latest one for the Tk thread
+        if self.is_running:
+            self.preview.submit(frame)
     
     def log_message(self, message):
-        timestamp = datetime.now().strftime('%H:%M:%S')
-        log_text = f"[{timestamp}] {message}\n"
-        
-        self.window.after(0, self._update_log, log_text)
+        # Safe from any thread, nothing touches Tk until the next flush_log
+        self.events.add(message)
     
-    def _update_log(self, text):
+    def flush_log(self):
+        self.log_job = None
         if not self.window.winfo_exists():
             return
+        events, dropped = self.events.since(self.log_seq)
+        if events:
+            self.log_seq = events[-1].seq
+            lines = [format_event(event) for event in events[-MAX_LOG_LINES:]]
+            skipped = dropped + len(events) - len(lines)
+            if skipped:
+                lines.insert(0, f"... {skipped} older messages not shown")
             
-        self.log_text.config(state=tk.NORMAL)
-        self.log_text.insert(tk.END, text)
-        self.log_text.see(tk.END)
-        self.log_text.config(state=tk.DISABLED)
+            self.log_text.config(state=tk.NORMAL)
+            self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+            # Only the last MAX_LOG_LINES lines are kept, the text ends with an empty line
+            excess = int(self.log_text.index('end-1c').split('.')[0]) - 1 - MAX_LOG_LINES
+            if excess > 0:
+                self.log_text.delete('1.0', f'{excess + 1}.0')
+            self.log_text.see(tk.END)
+            self.log_text.config(state=tk.DISABLED)
+        self.log_job = self.window.after(LOG_FLUSH_MS, self.flush_log)
+    
+    def toggle_log_file(self):
+        try:
+            self.events.set_file(EVENT_LOG_FILE if self.log_file_var.get() else None)
+        except OSError as e:
+            self.log_file_var.set(False)
+            messagebox.showerror("Error", f"Could not open log file: {str(e)}")
+            return
+        if self.events.path:
+            self.log_message(f"Saving the log to {self.events.path}")
     
     def stop_recognition(self):
         self.is_running = False
-        
-        if self.cap is not None:
-            self.cap.release()
-            self.cap = None
-            
-        if hasattr(self, 'recognition_thread') and self.recognition_thread.is_alive():
-            self.recognition_thread.join(timeout=1.0)
+        self.engine.stop()
+        self.preview.clear()
+        if self.stats_job is not None:
+            self.window.after_cancel(self.stats_job)
+            self.stats_job = None
             
-        self.start_btn.config(state=tk.NORMAL)
+        self.update_start_button()
         self.stop_btn.config(state=tk.DISABLED)
+        self.profile_btn.config(state=tk.DISABLED)
         self.status_bar.config(text="Recognition system stopped.")
         self.log_message("Recognition system stopped")
     
     def close_window(self):
         if self.is_running:
             self.stop_recognition()
+        registrations.unsubscribe(self.user_registered)
+        models.remove_listener(self.models_changed)
+        self.engine.sink.close()
+        if self.log_job is not None:
+            self.window.after_cancel(self.log_job)
+            self.log_job = None
+        self.events.close()
             
         if self.window.winfo_exists():
             self.window.grab_release()
@@ -622,6 +877,7 @@ class AttendanceSystemWindow:
 
 class ViewAttendanceWindow:
     def __init__(self, parent, status_bar):
+        load_app_modules()
         self.parent = parent
         self.status_bar = status_bar
         self.window = tk.Toplevel(parent)
@@ -642,13 +898,21 @@ class ViewAttendanceWindow:
         self.title_label = ttk.Label(self.main_frame, text="Attendance Records", font=self.title_font)
         self.title_label.pack(pady=10)
         
+        # Daily records and cross-day analytics on separate tabs
+        self.notebook = ttk.Notebook(self.main_frame)
+        self.notebook.pack(fill=tk.BOTH, expand=True)
+        self.records_page = ttk.Frame(self.notebook)
+        self.notebook.add(self.records_page, text="Records")
+        
         # Controls frame
-        self.controls_frame = ttk.Frame(self.main_frame)
+        self.controls_frame = ttk.Frame(self.records_page)
         self.controls_frame.pack(fill=tk.X, pady=10)
         
         # Date selector
         ttk.Label(self.controls_frame, text="Select Date:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
         
+        self.store = AttendanceStore()
+        
         self.attendance_dates = self.get_attendance_dates()
         self.selected_date = tk.StringVar(value=self.attendance_dates[0] if self.attendance_dates else "No records")
         self.date_dropdown = ttk.Combobox(self.controls_frame, textvariable=self.selected_date, 
@@ -659,50 +923,64 @@ class ViewAttendanceWindow:
         self.view_btn = ttk.Button(self.controls_frame, text="View Records", command=self.load_records)
         self.view_btn.pack(side=tk.LEFT, padx=5)
         
-        # Export button
-        self.export_btn = ttk.Button(self.controls_frame, text="Export to Excel", command=self.export_to_excel)
-        self.export_btn.pack(side=tk.LEFT, padx=5)
-        
-        # Treeview frame
-        self.records_frame = ttk.Frame(self.main_frame)
-        self.records_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-        
-        # Scrollbars
-        self.scrolly = ttk.Scrollbar(self.records_frame)
-        self.scrolly.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.scrollx = ttk.Scrollbar(self.records_frame, orient=tk.HORIZONTAL)
-        self.scrollx.pack(side=tk.BOTTOM, fill=tk.X)
-        
-        # Treeview
-        self.records_tree = ttk.Treeview(self.records_frame, yscrollcommand=self.scrolly.set, 
-                                         xscrollcommand=self.scrollx.set)
-        
-        # Configure scrollbars
-        self.scrolly.config(command=self.records_tree.yview)
-        self.scrollx.config(command=self.records_tree.xview)
-        
-        # Configure treeview
-        self.records_tree["columns"] = ("Name", "Time", "Date")
-        self.records_tree.column("#0", width=0, stretch=tk.NO)
-        self.records_tree.column("Name", anchor=tk.W, width=150)
-        self.records_tree.column("Time", anchor=tk.CENTER, width=100)
-        self.records_tree.column("Date", anchor=tk.CENTER, width=100)
-        
-        self.records_tree.heading("#0", text="", anchor=tk.W)
-        self.records_tree.heading("Name", text="Name", anchor=tk.W)
-        self.records_tree.heading("Time", text="Time", anchor=tk.CENTER)
-        self.records_tree.heading("Date", text="Date", anchor=tk.CENTER)
-        
-        self.records_tree.pack(fill=tk.BOTH, expand=True)
+        # Filter box, matches a name or the start of a time
+        self.filter_frame = ttk.Frame(self.records_page)
+        self.filter_frame.pack(fill=tk.X)
+        
+        ttk.Label(self.filter_frame, text="Filter:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.filter_var = tk.StringVar()
+        self.filter_entry = ttk.Entry(self.filter_frame, textvariable=self.filter_var, width=30)
+        self.filter_entry.pack(side=tk.LEFT, padx=5)
+        self.filter_var.trace_add('write', lambda *args: self.schedule_filter())
+        self.filter_job = None
+        
+        # Records are kept in an in-memory index and only the visible rows are
+        # materialized in the treeview
+        self.record_index = RecordIndex(RECORD_COLUMNS)
+        self.record_chunks = None
+        self.load_job = None
+        self.total_records = 0
+        
+        self.records_tree = VirtualTreeview(self.records_page, RECORD_COLUMNS, self.record_index,
+                                            need_rows=self.load_until, on_heading=self.sort_records,
+                                            widths={"Name": 150, "Time": 100, "Date": 100})
+        self.records_tree.pack(fill=tk.BOTH, expand=True, pady=10)
         
         # Summary frame
-        self.summary_frame = ttk.Frame(self.main_frame)
+        self.summary_frame = ttk.Frame(self.records_page)
         self.summary_frame.pack(fill=tk.X, pady=10)
         
         self.summary_label = ttk.Label(self.summary_frame, text="Summary: No records loaded", font=self.normal_font)
         self.summary_label.pack(anchor=tk.W)
         
+        # Date range export, streamed to disk on a background thread
+        self.export_frame = ttk.Frame(self.records_page)
+        self.export_frame.pack(fill=tk.X)
+        
+        export_dates = sorted(date for date in self.attendance_dates if date not in ("No records", ALL_DATES))
+        ttk.Label(self.export_frame, text="Export from:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.export_from_var = tk.StringVar(value=export_dates[0] if export_dates else "")
+        ttk.Combobox(self.export_frame, textvariable=self.export_from_var, values=export_dates,
+                     width=12).pack(side=tk.LEFT, padx=5)
+        ttk.Label(self.export_frame, text="to:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.export_to_var = tk.StringVar(value=export_dates[-1] if export_dates else "")
+        ttk.Combobox(self.export_frame, textvariable=self.export_to_var, values=export_dates,
+                     width=12).pack(side=tk.LEFT, padx=5)
+        self.export_format_var = tk.StringVar(value=EXPORT_FORMATS[0])
+        ttk.Combobox(self.export_frame, textvariable=self.export_format_var, values=EXPORT_FORMATS,
+                     state="readonly", width=8).pack(side=tk.LEFT, padx=5)
+        
+        self.export_btn = ttk.Button(self.export_frame, text="Export", command=self.start_export)
+        self.export_btn.pack(side=tk.LEFT, padx=5)
+        self.cancel_export_btn = ttk.Button(self.export_frame, text="Cancel", state=tk.DISABLED,
+                                            command=self.cancel_export)
+        self.cancel_export_btn.pack(side=tk.LEFT, padx=5)
+        self.export_progress = ttk.Progressbar(self.export_frame, mode='determinate', length=150)
+        self.export_progress.pack(side=tk.LEFT, padx=5)
+        self.export_job = None
+        
+        self.build_analytics_page()
+        
         # Close button
         self.close_btn = ttk.Button(self.main_frame, text="Close", command=self.close_window)
         self.close_btn.pack(pady=10)
@@ -716,27 +994,122 @@ class ViewAttendanceWindow:
         self.window.grab_set()
         self.window.protocol("WM_DELETE_WINDOW", self.close_window)
     
-    def get_attendance_dates(self):
-        dates = []
-        
-        if not os.path.exists('Attendance'):
-            return ["No records"]
+    def build_analytics_page(self):
+        self.analytics_page = ttk.Frame(self.notebook)
+        self.notebook.add(self.analytics_page, text="Analytics")
+        self.analytics = AttendanceAnalytics(self.store)
+        self.analytics_index = RecordIndex(ANALYTICS_COLUMNS)
+        self.analytics_loaded = False
+        self.notebook.bind('<<NotebookTabChanged>>', lambda event: self.analytics_tab_selected())
+        
+        # Date range and thresholds
+        self.range_frame = ttk.Frame(self.analytics_page)
+        self.range_frame.pack(fill=tk.X, pady=10)
+        
+        ttk.Label(self.range_frame, text="From:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.from_var = tk.StringVar()
+        self.from_box = ttk.Combobox(self.range_frame, textvariable=self.from_var, width=12)
+        self.from_box.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(self.range_frame, text="To:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.to_var = tk.StringVar()
+        self.to_box = ttk.Combobox(self.range_frame, textvariable=self.to_var, width=12)
+        self.to_box.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(self.range_frame, text="Late after:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.late_var = tk.StringVar(value="09:00")
+        ttk.Entry(self.range_frame, textvariable=self.late_var, width=6).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(self.range_frame, text="Missed more than:", font=self.normal_font).pack(side=tk.LEFT, padx=5)
+        self.missed_var = tk.StringVar()
+        ttk.Entry(self.range_frame, textvariable=self.missed_var, width=4).pack(side=tk.LEFT, padx=5)
+        
+        ttk.Button(self.range_frame, text="Update", command=self.update_analytics).pack(side=tk.LEFT, padx=5)
+        
+        self.analytics_tree = VirtualTreeview(self.analytics_page, ANALYTICS_COLUMNS, self.analytics_index,
+                                              on_heading=self.sort_analytics,
+                                              widths={"Name": 150, **{c: 80 for c in ANALYTICS_COLUMNS[1:]}})
+        self.analytics_tree.pack(fill=tk.BOTH, expand=True, pady=10)
+        
+        self.analytics_label = ttk.Label(self.analytics_page, text="Analytics: not loaded", font=self.normal_font)
+        self.analytics_label.pack(anchor=tk.W, pady=10)
+    
+    def analytics_tab_selected(self):
+        # The index is brought up to date the first time the tab is shown
+        if self.notebook.select() == str(self.analytics_page) and not self.analytics_loaded:
+            self.update_analytics()
+    
+    def update_analytics(self):
+        try:
+            started = time.perf_counter()
+            self.analytics.update()
+            days = self.analytics.dates
+            self.from_box.config(values=days)
+            self.to_box.config(values=days)
+            if not self.analytics_loaded and days:
+                self.from_var.set(days[0])
+                self.to_var.set(days[-1])
+            self.analytics_loaded = True
+            
+            start = self.from_var.get().strip() or None
+            end = self.to_var.get().strip() or None
+            report = self.analytics.report(start, end, self.late_var.get().strip() or "09:00")
+            missed = self.missed_var.get().strip()
+            if missed:
+                report = [person for person in report if person.absent > int(missed)]
+            elapsed = time.perf_counter() - started
+        except Exception as e:
+            self.analytics_label.config(text=f"Error computing analytics: {str(e)}")
+            return
         
-        for file in os.listdir('Attendance'):
-            if file.startswith('Attendance-') and file.endswith('.csv'):
-                date = file.replace('Attendance-', '').replace('.csv', '')
-                dates.append(date)
-                
-        dates.sort(reverse=True)
+        # Keep the sort order the user picked across updates
+        previous = self.analytics_index
+        self.analytics_index = RecordIndex(ANALYTICS_COLUMNS)
+        self.analytics_index.extend([tuple(person) for person in report])
+        if previous.sort_column is not None:
+            self.analytics_index.set_sort(previous.sort_column)
+            if previous.sort_reverse:
+                self.analytics_index.set_sort(previous.sort_column)
+        self.analytics_tree.source = self.analytics_index
+        self.analytics_tree.reset(len(self.analytics_index))
+        
+        sessions = self.analytics.session_days(start, end)
+        if not sessions:
+            self.analytics_label.config(text="Analytics: no attendance in this date range")
+            return
+        average = sum(person.rate for person in report) / len(report) if report else 0.0
+        late = sum(person.late for person in report)
+        self.analytics_label.config(
+            text=f"Analytics: {len(sessions)} session days from {sessions[0]} to {sessions[-1]}, "
+                 f"{len(report)} people, average attendance {average:.1f}%, {late} late arrivals "
+                 f"({elapsed * 1000:.0f} ms)")
+    
+    def sort_analytics(self, column):
+        self.analytics_index.set_sort(column)
+        self.analytics_tree.reset(len(self.analytics_index))
+    
+    def get_attendance_dates(self):
+        try:
+            dates = self.store.dates()
+        except Exception as e:
+            print(f"Error reading attendance dates: {str(e)}")
+            dates = []
         
         if not dates:
             return ["No records"]
             
-        return dates
+        return dates + [ALL_DATES]
     
     def load_records(self):
-        for i in self.records_tree.get_children():
-            self.records_tree.delete(i)
+        if self.load_job is not None:
+            self.window.after_cancel(self.load_job)
+            self.load_job = None
+            
+        self.record_index = RecordIndex(RECORD_COLUMNS)
+        self.record_index.set_filter(self.filter_var.get())
+        self.records_tree.source = self.record_index
+        self.record_chunks = None
+        self.records_tree.reset(0)
             
         selected_date = self.selected_date.get()
         
@@ -744,79 +1117,153 @@ class ViewAttendanceWindow:
             self.summary_label.config(text="Summary: No attendance records found")
             return
             
-        filename = f'Attendance/Attendance-{selected_date}.csv'
-        
-        if not os.path.exists(filename):
-            self.summary_label.config(text=f"Summary: File not found - {filename}")
-            return
-            
         try:
-            with open(filename, 'r') as f:
-                csv_reader = f.readlines()
-                
-            records = csv_reader[1:]
-            unique_names = set()
-            
-            for i, record in enumerate(records):
-                if record.strip():
-                    parts = record.strip().split(',')
-                    if len(parts) >= 3:
-                        name, time, date = parts[0], parts[1], parts[2]
-                        self.records_tree.insert("", tk.END, values=(name, time, date), iid=str(i))
-                        unique_names.add(name)
+            date = None if selected_date == ALL_DATES else selected_date
+            if date is not None:
+                # Exporting defaults to the day being viewed
+                self.export_from_var.set(date)
+                self.export_to_var.set(date)
+            self.total_records, _ = self.store.summary(date)
+            self.record_chunks = self.store.iter_records(date)
             
-            self.summary_label.config(text=f"Summary: {len(records)} attendance records, {len(unique_names)} unique attendees")
+            # The first screen is loaded right away, the rest in the background
+            self.load_until(self.records_tree.visible)
+            self.update_record_view()
+            self.load_job = self.window.after(1, self.load_next_chunk)
             self.status_bar.config(text=f"Loaded attendance records for {selected_date}")
         
         except Exception as e:
             self.summary_label.config(text=f"Error loading records: {str(e)}")
     
-    def export_to_excel(self):
-        selected_date = self.selected_date.get()
-        
-        if selected_date == "No records":
-            messagebox.showinfo("Info", "No records to export")
-            return
-            
+    def load_until(self, count):
+        while self.record_chunks is not None and len(self.record_index.rows) < count:
+            if not self._load_chunk():
+                break
+    
+    def _load_chunk(self):
         try:
-            try:
-                import pandas as pd
-            except ImportError:
-                if messagebox.askyesno("Missing Dependency", 
-                                      "Pandas is required for Excel export. Would you like to install it now?"):
-                    self.status_bar.config(text="Installing pandas package...")
-                    subprocess.check_call([sys.executable, "-m", "pip", "install", "pandas", "openpyxl"])
-                    import pandas as pd
-                else:
-                    return
+            self.record_index.extend(next(self.record_chunks))
+            return True
+        except StopIteration:
+            self.record_chunks = None
+            return False
+    
+    def load_next_chunk(self):
+        self.load_job = None
+        if not self.window.winfo_exists() or self.record_chunks is None:
+            return
             
-            input_file = f'Attendance/Attendance-{selected_date}.csv'
+        if self._load_chunk():
+            self.load_job = self.window.after(1, self.load_next_chunk)
+        self.update_record_view()
+    
+    def update_record_view(self):
+        # Plain views scroll over the full record count even before everything is
+        # loaded, filtered or sorted views only over what has been indexed so far
+        if self.record_index.is_plain:
+            self.records_tree.set_total(self.total_records)
+        else:
+            self.records_tree.set_total(len(self.record_index))
             
-            if not os.path.exists(input_file):
-                messagebox.showerror("Error", f"File not found: {input_file}")
-                return
-                
-            output_file = f'Attendance/Attendance-{selected_date}.xlsx'
+        records, unique = self.record_index.counts()
+        loading = " (loading...)" if self.record_chunks is not None else ""
+        if self.record_index.filter_text:
+            self.summary_label.config(text=f"Summary: {records} matching records, {unique} unique attendees{loading}")
+        else:
+            self.summary_label.config(text=f"Summary: {records} attendance records, {unique} unique attendees{loading}")
+    
+    def schedule_filter(self):
+        # Wait for a pause in typing before filtering
+        if self.filter_job is not None:
+            self.window.after_cancel(self.filter_job)
+        self.filter_job = self.window.after(200, self.apply_filter)
+    
+    def apply_filter(self):
+        self.filter_job = None
+        self.record_index.set_filter(self.filter_var.get())
+        self.records_tree.reset(len(self.record_index))
+        self.update_record_view()
+    
+    def sort_records(self, column):
+        self.record_index.set_sort(column)
+        self.records_tree.reset(len(self.record_index))
+        self.update_record_view()
+    
+    def start_export(self):
+        if self.export_job is not None and self.export_job.is_running():
+            return
             
-            df = pd.read_csv(input_file)
-            df.to_excel(output_file, index=False)
+        start_date = self.export_from_var.get().strip()
+        end_date = self.export_to_var.get().strip()
+        if not start_date or not end_date:
+            messagebox.showinfo("Info", "No records to export")
+            return
+        if start_date > end_date:
+            start_date, end_date = end_date, start_date
             
-            messagebox.showinfo("Success", f"Successfully exported to {output_file}")
-            self.status_bar.config(text=f"Exported records to Excel: {output_file}")
+        fmt = self.export_format_var.get()
+        self.export_job = ExportJob(self.store, start_date, end_date, fmt, export_path(start_date, end_date, fmt),
+                                    on_progress=lambda done, total: self._from_worker(self.update_export_progress,
+                                                                                      done, total),
+                                    on_done=lambda path, rows, error: self._from_worker(self.export_finished,
+                                                                                        path, rows, error))
+        self.export_btn.config(state=tk.DISABLED)
+        self.cancel_export_btn.config(state=tk.NORMAL)
+        self.export_progress.config(value=0, maximum=1)
+        self.status_bar.config(text=f"Exporting {start_date} to {end_date} as {fmt}...")
+        self.export_job.start()
+    
+    def _from_worker(self, callback, *args):
+        # Export callbacks arrive on the worker thread, run them on the Tk thread
+        try:
+            self.window.after(0, callback, *args)
+        except (tk.TclError, RuntimeError):
+            pass
+    
+    def update_export_progress(self, done, total):
+        if not self.window.winfo_exists():
+            return
+        self.export_progress.config(value=done, maximum=max(total, 1))
+        self.status_bar.config(text=f"Exporting... {done}/{total} records")
+    
+    def cancel_export(self):
+        if self.export_job is not None:
+            self.export_job.cancel()
+    
+    def export_finished(self, path, rows, error):
+        if not self.window.winfo_exists():
+            return
+        self.export_btn.config(state=tk.NORMAL)
+        self.cancel_export_btn.config(state=tk.DISABLED)
+        self.export_progress.config(value=0)
+        
+        if isinstance(error, ExportCancelled):
+            self.status_bar.config(text="Export cancelled")
+            return
+        if error is not None:
+            self.status_bar.config(text="Export failed")
+            messagebox.showerror("Export Error", str(error))
+            return
             
-            if messagebox.askyesno("Open Folder", "Would you like to open the containing folder?"):
-                folder_path = os.path.abspath('Attendance')
-                if sys.platform == 'win32':
-                    os.startfile(folder_path)
-                elif sys.platform == 'darwin':
-                    subprocess.call(['open', folder_path])
-                else:
-                    subprocess.call(['xdg-open', folder_path])
-                    
-        except Exception as e:
-            messagebox.showerror("Export Error", str(e))
+        self.status_bar.config(text=f"Exported {rows} records to {path}")
+        if messagebox.askyesno("Open Folder", f"Exported {rows} records to {path}. Would you like to open the containing folder?"):
+            folder_path = os.path.abspath(os.path.dirname(path))
+            if sys.platform == 'win32':
+                os.startfile(folder_path)
+            elif sys.platform == 'darwin':
+                subprocess.call(['open', folder_path])
+            else:
+                subprocess.call(['xdg-open', folder_path])
     
     def close_window(self):
+        if self.load_job is not None:
+            self.window.after_cancel(self.load_job)
+            self.load_job = None
+        self.record_chunks = None
+        if self.export_job is not None:
+            self.export_job.cancel()
+        self.store.close()
+        
         if self.window.winfo_exists():
             self.window.grab_release()
             self.window.destroy()
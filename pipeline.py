@@ -0,0 +1,96 @@
+import threading
+import time
+from collections import deque, namedtuple
+
+Frame = namedtuple('Frame', ['index', 'timestamp', 'image'])
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class DropOldestQueue:
+    """Bounded queue whose put() never blocks.
+
+    When the queue is full the oldest item is discarded, so a slow consumer
+    always gets the freshest data and latency stays bounded instead of piling up.
+    """
+
+    def __init__(self, maxsize=1):
+        self._items = deque(maxlen=maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) == self._items.maxlen:
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        # Raises QueueClosed once the queue is closed and empty, returns None on timeout
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if self._items:
+                return self._items.popleft()
+            raise QueueClosed()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class FrameGrabber:
+    """Reads a capture device on its own thread and fans frames out to queues.
+
+    The grabber never waits on its consumers, so the camera buffer is drained
+    as fast as frames arrive and downstream stages only ever see recent frames.
+    """
+
+    def __init__(self, cap, outputs, on_error=None, timings=None):
+        self.cap = cap
+        self.outputs = outputs
+        self.on_error = on_error
+        self.timings = timings
+        self.frame_count = 0
+        self.is_running = False
+        self.thread = None
+
+    def start(self):
+        self.is_running = True
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        while self.is_running:
+            started = time.perf_counter()
+            ret, image = self.cap.read()
+            if self.timings is not None:
+                self.timings.record('capture', time.perf_counter() - started)
+                self.timings.tick('captured')
+            if not ret or image is None:
+                if self.is_running and self.on_error is not None:
+                    self.on_error("Error: Could not access webcam!")
+                break
+
+            frame = Frame(self.frame_count, time.time(), image)
+            self.frame_count += 1
+            for queue in self.outputs:
+                queue.put(frame)
+
+        self.is_running = False
+        for queue in self.outputs:
+            queue.close()
+
+    def stop(self, timeout=1.0):
+        self.is_running = False
+        if self.thread is not None and self.thread.is_alive():
+            self.thread.join(timeout=timeout)
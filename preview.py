@@ -0,0 +1,101 @@
+import threading
+import time
+import tkinter as tk
+
+import cv2
+from PIL import Image, ImageTk
+
+
+class VideoPreview:
+    """Shows a stream of BGR frames on a Tk canvas.
+
+    The canvas keeps a single image item backed by one PhotoImage that is
+    painted over in place, it is only reallocated when the display size
+    changes. submit() may be called from any thread: frames are scaled to the
+    canvas and converted there, and only the latest one waits for the Tk
+    thread. At most one redraw is scheduled at a time, so a busy Tk loop
+    skips stale frames instead of queueing them. Optional (x, y, w, h)
+    boxes are drawn on the converted copy, never on the submitted frame.
+    """
+
+    def __init__(self, canvas, timings=None):
+        self.canvas = canvas
+        self.timings = timings
+        self.item = canvas.create_image(0, 0, anchor=tk.CENTER)
+        self.photo = None
+        self.dropped = 0
+        self._size = (0, 0)
+        self._pending = None
+        self._scheduled = False
+        self._lock = threading.Lock()
+        canvas.bind('<Configure>', self._resized, add='+')
+
+    def _resized(self, event):
+        self._size = (event.width, event.height)
+        self.canvas.coords(self.item, event.width // 2, event.height // 2)
+
+    def _fit(self, frame):
+        height, width = frame.shape[:2]
+        canvas_width, canvas_height = self._size
+        if canvas_width <= 1 or canvas_height <= 1:
+            return frame
+        scale = min(canvas_width / width, canvas_height / height)
+        size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        if size == (width, height):
+            return frame
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        return cv2.resize(frame, size, interpolation=interpolation)
+
+    def submit(self, frame, boxes=()):
+        started = time.perf_counter()
+        fitted = self._fit(frame)
+        rgb = cv2.cvtColor(fitted, cv2.COLOR_BGR2RGB)
+        scale = fitted.shape[1] / frame.shape[1]
+        for (x, y, w, h) in boxes:
+            cv2.rectangle(rgb, (int(x * scale), int(y * scale)),
+                          (int((x + w) * scale), int((y + h) * scale)), (0, 255, 0), 2)
+        image = Image.fromarray(rgb)
+        if self.timings is not None:
+            self.timings.record('convert', time.perf_counter() - started)
+
+        with self._lock:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = image
+            if self._scheduled:
+                return
+            self._scheduled = True
+        try:
+            self.canvas.after(0, self._draw)
+        except (tk.TclError, RuntimeError):
+            # The window is gone
+            with self._lock:
+                self._scheduled = False
+
+    def clear(self):
+        with self._lock:
+            self._pending = None
+
+    def _draw(self):
+        with self._lock:
+            image, self._pending = self._pending, None
+            self._scheduled = False
+        if image is None:
+            return
+
+        try:
+            if not self.canvas.winfo_exists():
+                return
+            started = time.perf_counter()
+            if self.photo is None or (self.photo.width(), self.photo.height()) != image.size:
+                self.photo = ImageTk.PhotoImage(image=image)
+                self.canvas.itemconfigure(self.item, image=self.photo)
+                if self._size == (0, 0):
+                    self.canvas.coords(self.item, image.width // 2, image.height // 2)
+            else:
+                self.photo.paste(image)
+            if self.timings is not None:
+                self.timings.record('display', time.perf_counter() - started)
+                self.timings.tick('displayed')
+        except tk.TclError as e:
+            print(f"Error in preview: {str(e)}")
@@ -0,0 +1,486 @@
+"""Recognition server for thin kiosk clients.
+
+One machine holds the gallery, runs detection and encoding on a process
+pool and writes every mark to its attendance database. Kiosks only send
+what their camera sees over HTTP:
+
+    POST /frame?kiosk=lobby     a JPEG frame, the server finds, encodes and matches the faces
+    POST /encodings             {"kiosk": "lobby", "encodings": [[128 floats], ...]} from kiosks
+                                that encode locally
+    POST /reload                re-read the gallery store, e.g. after a registration
+    GET  /stats                 throughput, batch sizes and latency percentiles
+    GET  /health
+
+Both recognition calls answer {"faces": [{"box", "name", "confidence",
+"marked"}, ...]}, box only for frames and in the frame's pixels. A full
+request queue is answered with 503 so clients back off instead of piling up
+latency.
+
+Examples:
+    python recognition_server.py --port 8765 --workers 4
+    python benchmarks/bench_server.py --url http://localhost:8765 --concurrency 16 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import argparse
+import threading
+from collections import deque, Counter
+from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import cv2
+import numpy as np
+
+from face_cache import ENCODING_SIZE
+from engine import RecognitionEngine, open_attendance_sink, load_gallery, describe_gallery_load, \
+    choose_detector, detect_faces, warm_up_models
+from gallery_index import INDEX_TYPES
+from gallery_store import GALLERY_DIR
+from detectors import DETECTOR_TYPES, MIN_RECALL, describe_scores
+
+DEFAULT_PORT = 8765
+
+
+class ServerBusy(Exception):
+    pass
+
+
+def encode_frames(frames, scale, detector):
+    """Decode, detect and encode a chunk of JPEG frames.
+
+    Runs in a worker process. Returns one (boxes, encodings, seconds) per
+    frame, boxes in the frame's pixels, or (None, None, seconds) for data
+    that does not decode as an image.
+    """
+    import face_recognition
+
+    results = []
+    for data in frames:
+        started = time.perf_counter()
+        try:
+            image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        except cv2.error:
+            # Only this frame is bad, the rest of the chunk belongs to other kiosks
+            image = None
+        if image is None:
+            results.append((None, None, time.perf_counter() - started))
+            continue
+        small = cv2.resize(image, (0, 0), fx=scale, fy=scale) if scale != 1 else image
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        locations = detect_faces(rgb, detector)
+        encodings = face_recognition.face_encodings(rgb, locations) if locations else []
+        boxes = [[int(top / scale), int(right / scale), int(bottom / scale), int(left / scale)]
+                 for top, right, bottom, left in locations]
+        results.append((boxes, np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE),
+                        time.perf_counter() - started))
+    return results
+
+
+class _Request:
+    __slots__ = ('kiosk', 'frame', 'boxes', 'encodings', 'received', 'future')
+
+    def __init__(self, kiosk, frame=None, encodings=None):
+        self.kiosk = kiosk
+        self.frame = frame
+        self.boxes = None
+        self.encodings = encodings
+        self.received = time.perf_counter()
+        self.future = Future()
+
+
+def _collect(source, max_batch, max_wait, stopping):
+    # Blocks for the first request, then takes whatever else is queued or
+    # arrives within max_wait seconds, up to max_batch requests
+    while not stopping.is_set():
+        try:
+            batch = [source.get(timeout=0.2)]
+            break
+        except queue.Empty:
+            continue
+    else:
+        return []
+    deadline = time.perf_counter() + max_wait
+    while len(batch) < max_batch:
+        remaining = deadline - time.perf_counter()
+        try:
+            batch.append(source.get(timeout=remaining) if remaining > 0 else source.get_nowait())
+        except queue.Empty:
+            break
+    return batch
+
+
+class RecognitionServer:
+    """Micro-batching front end of a RecognitionEngine for many clients.
+
+    Requests go through two batching stages on their own threads. Frames
+    that arrive together are split into one chunk per worker and decoded,
+    detected and encoded on the process pool, or on the batching thread
+    with workers=0. Encodings from every request that is ready, frames and
+    precomputed ones alike, are then matched against the gallery in a single
+    call and marked once per person through the engine's sink and marked
+    set. A batch takes whatever is queued, up to max_batch requests. Only
+    while requests keep arriving together, that is after a batch of more
+    than one, does it also wait up to max_wait seconds for more, so a
+    single kiosk is answered right away and a busy server trades a few
+    milliseconds for far fewer, larger calls. At most max_pending requests
+    wait, further ones raise ServerBusy.
+    """
+
+    def __init__(self, engine, workers=None, scale=0.25, max_batch=32, max_wait=0.005, max_pending=256):
+        self.engine = engine
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.scale = scale
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.frames = queue.Queue()
+        self.ready = queue.Queue()
+        self.executor = None
+        self.stopping = threading.Event()
+        # Encoding chunks in flight on the pool, two per worker keep it busy
+        self._in_flight = threading.Semaphore(max(self.workers, 1) * 2)
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self.batch_sizes = deque(maxlen=2000)
+        self.requests = 0
+        self.rejected = 0
+        self.kiosks = Counter()
+        self._threads = []
+
+    def start(self):
+        self.engine.reset_session()
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            for future in [self.executor.submit(warm_up_models) for _ in range(self.workers)]:
+                future.result()
+        for target in (self._run_encoding, self._run_matching):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.stopping.set()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.engine.sink.flush()
+        self.engine.stats.stopped_at = time.time()
+
+    # -- requests ----------------------------------------------------------------
+
+    def _admit(self, request):
+        if not self._pending.acquire(blocking=False):
+            self.rejected += 1
+            raise ServerBusy("Too many requests waiting")
+        self.requests += 1
+        self.kiosks[request.kiosk or 'unnamed'] += 1
+        request.future.add_done_callback(lambda future: self._pending.release())
+        return request
+
+    def submit_frame(self, data, kiosk=None):
+        """Queue one JPEG frame, the returned future resolves to its faces."""
+        if not data:
+            raise ValueError("Frame is empty")
+        request = self._admit(_Request(kiosk, frame=data))
+        self.frames.put(request)
+        return request.future
+
+    def submit_encodings(self, encodings, kiosk=None):
+        """Queue face encodings computed by the client, resolves to one face per encoding."""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        request = self._admit(_Request(kiosk, encodings=encodings))
+        self.ready.put(request)
+        return request.future
+
+    # -- encoding stage ----------------------------------------------------------
+
+    def _run_encoding(self):
+        linger = 0.0
+        while not self.stopping.is_set():
+            batch = _collect(self.frames, self.max_batch, linger, self.stopping)
+            linger = self.max_wait if len(batch) > 1 else 0.0
+            if not batch:
+                continue
+            if self.executor is None:
+                try:
+                    results = encode_frames([r.frame for r in batch], self.scale, self.engine.detector)
+                except Exception as e:
+                    self._fail(batch, e)
+                    continue
+                self._encoded(batch, results)
+                continue
+
+            chunks = min(len(batch), self.workers)
+            for i in range(chunks):
+                chunk = batch[i::chunks]
+                self._in_flight.acquire()
+                try:
+                    future = self.executor.submit(encode_frames, [r.frame for r in chunk], self.scale,
+                                                  self.engine.detector)
+                except Exception as e:
+                    self._in_flight.release()
+                    self._fail(chunk, e)
+                    continue
+                future.add_done_callback(lambda future, chunk=chunk: self._chunk_done(chunk, future))
+
+    def _chunk_done(self, chunk, future):
+        self._in_flight.release()
+        try:
+            results = future.result()
+        except Exception as e:
+            self._fail(chunk, e)
+            return
+        self._encoded(chunk, results)
+
+    def _encoded(self, requests, results):
+        timings = self.engine.stats.timings
+        for request, (boxes, encodings, seconds) in zip(requests, results):
+            request.frame = None
+            if boxes is None:
+                request.future.set_exception(ValueError("Frame is not a valid image"))
+                continue
+            timings.record('encode_frame', seconds)
+            request.boxes = boxes
+            request.encodings = encodings
+            self.ready.put(request)
+
+    def _fail(self, requests, error):
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(error)
+
+    # -- matching stage ----------------------------------------------------------
+
+    def _run_matching(self):
+        engine = self.engine
+        stats = engine.stats
+        linger = 0.0
+        while not self.stopping.is_set():
+            batch = _collect(self.ready, self.max_batch, linger, self.stopping)
+            linger = self.max_wait if len(batch) > 1 else 0.0
+            if not batch:
+                continue
+            if engine.pending_users:
+                engine.apply_user_updates()
+            self.batch_sizes.append(len(batch))
+
+            try:
+                with stats.timings.measure('match_batch'):
+                    encodings = np.concatenate([request.encodings for request in batch])
+                    matches = engine.gallery.match(encodings, tolerance=engine.tolerance)
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+
+            offset = 0
+            now = time.perf_counter()
+            for request in batch:
+                count = len(request.encodings)
+                faces = []
+                for i, match in enumerate(matches[offset:offset + count]):
+                    # Claimed for the same date the mark is written with, so the
+                    # set starts over when the server runs into the next day
+                    when = datetime.now()
+                    marked = match.name != "Unknown" and engine.marked_attendance.claim(match.name, when)
+                    if marked:
+                        engine.mark_attendance(match.name, when)
+                    face = {
+                        'name': match.name,
+                        'confidence': round(1 - match.distance, 4),
+                        'marked': marked,
+                    }
+                    if request.boxes is not None:
+                        face['box'] = request.boxes[i]
+                    faces.append(face)
+                offset += count
+
+                if request.boxes is not None:
+                    stats.frames_processed += 1
+                    stats.faces_detected += len(request.boxes)
+                stats.faces_encoded += count
+                stats.end_to_end.append(now - request.received)
+                request.future.set_result(faces)
+
+    def reload_gallery(self, image_dir='Images', index='exact', gallery_dir=GALLERY_DIR):
+        gallery, result = load_gallery(image_dir, index=index, gallery_dir=gallery_dir)
+        for message in describe_gallery_load(gallery, result):
+            self.engine.log(message)
+        # Swapped in one assignment, the matching thread picks it up with its next batch
+        self.engine.gallery = gallery
+        return len(gallery)
+
+    def summary(self):
+        stats = self.engine.stats
+        summary = {key: value for key, value in stats.summary().items()
+                   if not key.startswith(('frames_', 'capture', 'process'))}
+        elapsed = summary['elapsed_s']
+        summary.update({
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'requests_per_s': self.requests / elapsed,
+            'frames': stats.frames_processed,
+            'frames_per_s': stats.frames_processed / elapsed,
+            'waiting': self.frames.qsize() + self.ready.qsize(),
+            'batch_mean': float(np.mean(self.batch_sizes)) if self.batch_sizes else 0.0,
+            'batch_max': max(self.batch_sizes) if self.batch_sizes else 0,
+            'kiosks': dict(self.kiosks),
+            'latency_ms_p99': float(np.percentile(stats.end_to_end, 99)) * 1000 if stats.end_to_end else 0.0,
+        })
+        return summary
+
+
+class RecognitionHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so a kiosk reuses one connection for all its requests
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes, Nagle would hold the body for a delayed ACK
+    disable_nagle_algorithm = True
+    server_version = 'AttendanceRecognition/1'
+    timeout = 30.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._reply(200, {'status': 'ok', 'gallery': len(self.server.recognition.engine.gallery)})
+        elif path == '/stats':
+            self._reply(200, self.server.recognition.summary())
+        else:
+            self._reply(404, {'error': f"Unknown path {path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        recognition = self.server.recognition
+        body = self._body()
+        try:
+            if url.path == '/frame':
+                kiosk = parse_qs(url.query).get('kiosk', [None])[0]
+                future = recognition.submit_frame(body, kiosk)
+            elif url.path == '/encodings':
+                request = json.loads(body or b'{}')
+                future = recognition.submit_encodings(request.get('encodings', []), request.get('kiosk'))
+            elif url.path == '/reload':
+                self._reply(200, {'gallery': recognition.reload_gallery(**self.server.gallery_options)})
+                return
+            else:
+                self._reply(404, {'error': f"Unknown path {url.path}"})
+                return
+            self._reply(200, {'faces': future.result(timeout=self.timeout)})
+        except ServerBusy as e:
+            self._reply(503, {'error': str(e)})
+        except (ValueError, TypeError) as e:
+            self._reply(400, {'error': str(e)})
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+
+
+class RecognitionHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many kiosks connect at once after a restart, the default backlog of 5 drops their SYNs
+    request_queue_size = 128
+
+
+def make_server(recognition, host='127.0.0.1', port=DEFAULT_PORT, gallery_options=None):
+    server = RecognitionHTTPServer((host, port), RecognitionHandler)
+    server.recognition = recognition
+    server.gallery_options = gallery_options or {}
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve face recognition to kiosk clients over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"port to listen on (default: {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="processes for detection and encoding, 0 to encode on the batching thread")
+    parser.add_argument('--max-batch', type=int, default=32, help="most requests per micro-batch (default: 32)")
+    parser.add_argument('--max-wait', type=float, default=5.0,
+                        help="milliseconds a batch waits for more requests (default: 5)")
+    parser.add_argument('--max-pending', type=int, default=256,
+                        help="requests allowed to wait before new ones get 503 (default: 256)")
+    parser.add_argument('--scale', type=float, default=0.25, help="detection scale for frames (default: 0.25)")
+    parser.add_argument('--tolerance', type=float, default=0.6,
+                        help="maximum face distance for a match, lower is stricter (default: 0.6)")
+    parser.add_argument('--detector', default='hog', choices=list(DETECTOR_TYPES) + ['auto'],
+                        help="face detector backend (default: hog)")
+    parser.add_argument('--min-recall', type=float, default=MIN_RECALL,
+                        help=f"recall the auto-selected detector must reach (default: {MIN_RECALL})")
+    parser.add_argument('--output', default='Attendance', help="folder for the attendance database")
+    parser.add_argument('--images', default='Images', help="folder with registered face images")
+    parser.add_argument('--gallery', default=GALLERY_DIR, help="folder of the gallery store")
+    parser.add_argument('--index', default='exact', choices=list(INDEX_TYPES), help="gallery index backend")
+    parser.add_argument('--stats-file', default=None, help="write the server stats as JSON to this file on exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        import face_recognition
+    except ImportError:
+        print("The face_recognition library is not installed. Please install it with: pip install face_recognition",
+              file=sys.stderr)
+        return 1
+
+    engine = RecognitionEngine(tolerance=args.tolerance, sink=open_attendance_sink(args.output))
+    recognition = RecognitionServer(engine, workers=args.workers, scale=args.scale, max_batch=args.max_batch,
+                                    max_wait=args.max_wait / 1000.0, max_pending=args.max_pending)
+
+    engine.log("Loading registered faces...")
+    gallery_options = {'image_dir': args.images, 'index': args.index, 'gallery_dir': args.gallery}
+    if not recognition.reload_gallery(**gallery_options):
+        engine.log("No registered faces found! Please register users first.")
+        return 1
+    detector, scores = choose_detector(args.detector, args.gallery, args.min_recall, args.scale)
+    for line in describe_scores(scores, detector):
+        engine.log(f"Detector {line}")
+    engine.detector = detector
+
+    recognition.start()
+    server = make_server(recognition, args.host, args.port, gallery_options)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    engine.log(f"Serving recognition on http://{args.host}:{server.server_port} with {args.workers} workers")
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    while not stopping.is_set():
+        stopping.wait(0.5)
+
+    server.shutdown()
+    recognition.stop()
+    engine.sink.close()
+    summary = recognition.summary()
+    print(f"Served {summary['requests']} requests ({summary['rejected']} rejected), "
+          f"{summary['requests_per_s']:.1f} per second, mean batch {summary['batch_mean']:.1f}, "
+          f"latency p50 {summary['latency_ms_p50']:.1f} ms, p99 {summary['latency_ms_p99']:.1f} ms", file=sys.stderr)
+    if args.stats_file:
+        with open(args.stats_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+import tkinter as tk
+from tkinter import ttk
+from collections import Counter
+
+
+class RecordIndex:
+    """In-memory rows plus the current filtered and sorted view of them.
+
+    Rows are appended in chunks as they are loaded. Name counts are kept up to
+    date on every append, so the summary never needs a pass over all rows,
+    and sorting and filtering work on row numbers instead of widget items.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.rows = []
+        self.name_counts = Counter()
+        self.filter_text = ''
+        self.sort_column = None
+        self.sort_reverse = False
+        self._view = None
+        self._view_counts = None
+        # Sort key of every row in the view, in view order, while sorted
+        self._keys = None
+
+    def __len__(self):
+        return len(self.rows) if self._view is None else len(self._view)
+
+    @property
+    def is_plain(self):
+        return self._view is None
+
+    def extend(self, rows):
+        start = len(self.rows)
+        self.rows.extend(rows)
+        self.name_counts.update(row[0] for row in rows)
+
+        if self._view is None:
+            return
+        matched = range(start, len(self.rows))
+        if self.filter_text:
+            matched = [i for i in matched if self._matches(self.rows[i])]
+            self._view_counts.update(self.rows[i][0] for i in matched)
+        if self.sort_column is None:
+            self._view.extend(matched)
+        else:
+            self._merge(matched)
+
+    def _merge(self, new):
+        # Sorts only the new rows and merges them into the sorted view, so
+        # loading a large record set in chunks is not a full sort per chunk
+        col = self.columns.index(self.sort_column)
+        rows = self.rows
+        new = sorted(new, key=lambda i: rows[i][col], reverse=self.sort_reverse)
+        view, keys = self._view, self._keys
+        merged_view, merged_keys = [], []
+        done = 0
+        for i in new:
+            key = rows[i][col]
+            # After any equal keys, new rows were loaded later and the sort is stable
+            lo, hi = done, len(keys)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if (keys[mid] < key) if self.sort_reverse else (key < keys[mid]):
+                    hi = mid
+                else:
+                    lo = mid + 1
+            merged_view += view[done:lo]
+            merged_keys += keys[done:lo]
+            merged_view.append(i)
+            merged_keys.append(key)
+            done = lo
+        merged_view += view[done:]
+        merged_keys += keys[done:]
+        self._view, self._keys = merged_view, merged_keys
+
+    def slice(self, start, stop):
+        if self._view is None:
+            return self.rows[start:stop]
+        return [self.rows[i] for i in self._view[start:stop]]
+
+    def set_filter(self, text):
+        self.filter_text = text.strip().lower()
+        self._rebuild()
+
+    def set_sort(self, column):
+        # Clicking the same column again flips the order
+        if self.sort_column == column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self._rebuild()
+
+    def _matches(self, row):
+        # Filter text matches a name substring or the start of a time, e.g. "09:"
+        text = self.filter_text
+        return text in row[0].lower() or str(row[1]).startswith(text)
+
+    def _rebuild(self):
+        if not self.filter_text and self.sort_column is None:
+            self._view = None
+            self._view_counts = None
+            self._keys = None
+            return
+
+        if self.filter_text:
+            view = [i for i, row in enumerate(self.rows) if self._matches(row)]
+        else:
+            view = list(range(len(self.rows)))
+
+        if self.sort_column is not None:
+            col = self.columns.index(self.sort_column)
+            rows = self.rows
+            view.sort(key=lambda i: rows[i][col], reverse=self.sort_reverse)
+            self._keys = [rows[i][col] for i in view]
+        else:
+            self._keys = None
+
+        self._view = view
+        self._view_counts = Counter(self.rows[i][0] for i in view) if self.filter_text else None
+
+    def counts(self):
+        # (records, unique names) for the current view
+        if self._view_counts is not None:
+            return len(self._view), len(self._view_counts)
+        return len(self.rows), len(self.name_counts)
+
+
+class VirtualTreeview(ttk.Frame):
+    """Treeview that only holds as many items as fit on screen.
+
+    The scrollbar works in row numbers over the whole data source and the
+    visible items are refilled from source.slice() whenever the offset
+    changes. When rows past the loaded ones are needed, need_rows(count) is
+    called so the owner can load more.
+    """
+
+    def __init__(self, parent, columns, source, need_rows=None, on_heading=None, widths=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.source = source
+        self.need_rows = need_rows
+        self.total = 0
+        self.offset = 0
+        self.visible = 20
+
+        self.scrolly = ttk.Scrollbar(self, command=self._on_scroll)
+        self.scrolly.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='browse')
+        for i, column in enumerate(columns):
+            anchor = tk.W if i == 0 else tk.CENTER
+            self.tree.column(column, anchor=anchor, width=(widths or {}).get(column, 100))
+            self.tree.heading(column, text=column, anchor=anchor,
+                              command=(lambda c=column: on_heading(c)) if on_heading else '')
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.tree.bind('<Configure>', lambda event: self._on_resize(event.height))
+        self.tree.bind('<MouseWheel>', lambda event: self.scroll_by(-1 if event.delta > 0 else 1, 3))
+        self.tree.bind('<Button-4>', lambda event: self.scroll_by(-1, 3))
+        self.tree.bind('<Button-5>', lambda event: self.scroll_by(1, 3))
+        self.tree.bind('<Prior>', lambda event: self.scroll_by(-1, self.visible))
+        self.tree.bind('<Next>', lambda event: self.scroll_by(1, self.visible))
+
+    def _row_height(self):
+        height = ttk.Style().lookup('Treeview', 'rowheight')
+        try:
+            return max(int(height), 1)
+        except (TypeError, ValueError):
+            return 20
+
+    def _on_resize(self, height):
+        # Leave room for the heading row
+        visible = max(1, height // self._row_height() - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.refresh()
+
+    def set_total(self, total):
+        # Number of rows the scrollbar should cover, may be more than are loaded yet
+        self.total = total
+        self.offset = max(0, min(self.offset, self.total - self.visible))
+        self.refresh()
+
+    def reset(self, total=0):
+        self.offset = 0
+        self.set_total(total)
+
+    def _on_scroll(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.offset = int(float(amount) * self.total)
+            self.offset = max(0, min(self.offset, self.total - self.visible))
+            self.refresh()
+        elif action == 'scroll':
+            self.scroll_by(int(amount), self.visible if unit == 'pages' else 1)
+
+    def scroll_by(self, direction, rows):
+        offset = max(0, min(self.offset + direction * rows, self.total - self.visible))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def refresh(self):
+        stop = min(self.offset + self.visible, self.total)
+        if stop > len(self.source) and self.need_rows is not None:
+            self.need_rows(stop)
+        rows = self.source.slice(self.offset, stop)
+
+        # Reuse the existing items and only add or remove the difference
+        items = self.tree.get_children()
+        for item, row in zip(items, rows):
+            self.tree.item(item, values=row)
+        for i in range(len(items), len(rows)):
+            self.tree.insert("", tk.END, iid=str(i), values=rows[i])
+        if len(items) > len(rows):
+            self.tree.delete(*items[len(rows):])
+
+        if self.total:
+            self.scrolly.set(self.offset / self.total, stop / self.total)
+        else:
+            self.scrolly.set(0, 1)
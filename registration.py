@@ -0,0 +1,140 @@
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from detectors import HaarDetector, DetectorUnavailable
+
+# Captures are rejected below these limits, measured on the full camera frame
+MIN_FACE_SIZE = 80
+MIN_SHARPNESS = 60.0
+
+# The registration preview looks for faces on a downscaled frame a few times per
+# second, boxes are reused for the frames in between
+PREVIEW_SCALE = 0.5
+PREVIEW_INTERVAL = 0.15
+
+CaptureCheck = namedtuple('CaptureCheck', ['encoding', 'reason', 'box', 'sharpness'])
+
+
+def sharpness(gray):
+    # Variance of the Laplacian, low for blurred or out of focus images
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def check_capture(image, min_face_size=MIN_FACE_SIZE, min_sharpness=MIN_SHARPNESS):
+    """Encode a registration capture if it is good enough for the gallery.
+
+    image is a BGR frame. Returns a CaptureCheck whose reason is None for an
+    accepted capture, or says why it was rejected: no face, several faces, a
+    face that is too small or too blurred. Runs in a worker process.
+    """
+    import face_recognition
+
+    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    face_locations = face_recognition.face_locations(rgb)
+    if not face_locations:
+        return CaptureCheck(None, "no face found", None, None)
+    if len(face_locations) > 1:
+        return CaptureCheck(None, f"{len(face_locations)} faces in view", None, None)
+
+    top, right, bottom, left = box = face_locations[0]
+    if min(bottom - top, right - left) < min_face_size:
+        return CaptureCheck(None, "face too small, move closer", box, None)
+
+    gray = cv2.cvtColor(image[max(top, 0):bottom, max(left, 0):right], cv2.COLOR_BGR2GRAY)
+    score = sharpness(gray)
+    if score < min_sharpness:
+        return CaptureCheck(None, "image too blurred", box, score)
+
+    encoding = face_recognition.face_encodings(rgb, [box])[0]
+    return CaptureCheck(np.asarray(encoding, dtype=np.float32), None, box, score)
+
+
+class PreviewFaceDetector:
+    """Face boxes for the registration preview, cheap enough for tablets.
+
+    detector is any backend from detectors.py, by default the Haar cascade.
+    The boxes are only a visual guide, so detection runs on a frame
+    downscaled by scale, at most once per interval seconds, and first
+    searches around the last boxes before falling back to the whole frame.
+    detect() returns (x, y, w, h) boxes in full-frame coordinates.
+    """
+
+    def __init__(self, detector=None, scale=PREVIEW_SCALE, interval=PREVIEW_INTERVAL, margin=0.5):
+        self.detector = detector if detector is not None else HaarDetector(scale_factor=1.3, min_size=0)
+        self.scale = scale
+        self.interval = interval
+        self.margin = margin
+        self.boxes = []
+        self.last_detection = None
+
+    def _search(self, rgb, offset=(0, 0)):
+        faces = self.detector.detect(rgb)
+        return [(left + offset[0], top + offset[1], right - left, bottom - top)
+                for (top, right, bottom, left) in faces]
+
+    def _region(self, shape):
+        # Bounding box of the last boxes grown by margin, in downscaled pixels
+        height, width = shape[:2]
+        left = min(x for x, _, _, _ in self.boxes)
+        top = min(y for _, y, _, _ in self.boxes)
+        right = max(x + w for x, _, w, _ in self.boxes)
+        bottom = max(y + h for _, y, _, h in self.boxes)
+        grow_x = int((right - left) * self.scale * self.margin)
+        grow_y = int((bottom - top) * self.scale * self.margin)
+        return (max(0, int(left * self.scale) - grow_x), max(0, int(top * self.scale) - grow_y),
+                min(width, int(right * self.scale) + grow_x), min(height, int(bottom * self.scale) + grow_y))
+
+    def detect(self, frame, timestamp):
+        if self.detector is None:
+            return []
+        if self.last_detection is not None and timestamp - self.last_detection < self.interval:
+            return self.boxes
+        self.last_detection = timestamp
+
+        small = cv2.resize(frame, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        rgb = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+        faces = []
+        try:
+            if self.boxes:
+                left, top, right, bottom = self._region(rgb.shape)
+                faces = self._search(rgb[top:bottom, left:right], (left, top))
+            if not faces:
+                faces = self._search(rgb)
+        except DetectorUnavailable as e:
+            # The preview keeps running, just without boxes
+            print(f"Face boxes disabled: {str(e)}")
+            self.detector = None
+
+        self.boxes = [tuple(int(v / self.scale) for v in face) for face in faces]
+        return self.boxes
+
+    def reset(self):
+        self.boxes = []
+        self.last_detection = None
+
+
+class RegistrationEvents:
+    """Tells open recognition sessions about users registered in this process.
+
+    Subscribers are called as callback(name, encodings) on the thread that
+    publishes, which for the GUI is the Tk thread.
+    """
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def publish(self, name, encodings):
+        for callback in list(self._subscribers):
+            callback(name, encodings)
+
+
+registrations = RegistrationEvents()
@@ -0,0 +1,118 @@
+import itertools
+import numpy as np
+
+
+class Track:
+    def __init__(self, track_id, box, timestamp):
+        self.id = track_id
+        self.box = box
+        self.name = None
+        self.confidence = 0
+        self.hits = 1
+        self.misses = 0
+        self.verified_at = None
+        self.created_at = timestamp
+
+    @property
+    def identified(self):
+        return self.name is not None and self.name != "Unknown"
+
+
+def box_iou(boxes_a, boxes_b):
+    # Boxes are (top, right, bottom, left) as returned by face_locations
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-6), 0.0)
+
+
+def _centers(boxes):
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.stack([(boxes[:, 1] + boxes[:, 3]) / 2, (boxes[:, 0] + boxes[:, 2]) / 2], axis=1)
+
+
+class FaceTracker:
+    """Keeps a persistent id for every face between detections.
+
+    Boxes are associated with existing tracks greedily by IoU, falling back to
+    centroid distance for faces that moved more than their own width overlaps.
+    Each track remembers the identity it was matched to, so encodings only need
+    to be computed for new tracks and when a track is due for re-verification.
+    """
+
+    def __init__(self, iou_threshold=0.3, centroid_threshold=0.5, max_misses=5,
+                 reverify_interval=2.0, unknown_interval=0.5):
+        self.iou_threshold = iou_threshold
+        self.centroid_threshold = centroid_threshold
+        self.max_misses = max_misses
+        self.reverify_interval = reverify_interval
+        self.unknown_interval = unknown_interval
+        self.tracks = []
+        self._ids = itertools.count(1)
+
+    def update(self, boxes, timestamp):
+        """Associate this frame's boxes with tracks and return one track per box."""
+        boxes = [tuple(int(v) for v in box) for box in boxes]
+        assigned = [None] * len(boxes)
+        unmatched_tracks = set(range(len(self.tracks)))
+
+        if boxes and self.tracks:
+            track_boxes = [t.box for t in self.tracks]
+            iou = box_iou(track_boxes, boxes)
+            for t, b in zip(*np.unravel_index(np.argsort(-iou, axis=None), iou.shape)):
+                if iou[t, b] < self.iou_threshold:
+                    break
+                if t in unmatched_tracks and assigned[b] is None:
+                    assigned[b] = self.tracks[t]
+                    unmatched_tracks.discard(t)
+
+            # Second pass on centroids for fast movers that lost all overlap
+            track_centers = _centers(track_boxes)
+            box_centers = _centers(boxes)
+            for b, box in enumerate(boxes):
+                if assigned[b] is not None or not unmatched_tracks:
+                    continue
+                candidates = sorted(unmatched_tracks)
+                dist = np.linalg.norm(track_centers[candidates] - box_centers[b], axis=1)
+                best = int(np.argmin(dist))
+                width = max(box[1] - box[3], 1)
+                if dist[best] <= self.centroid_threshold * width:
+                    assigned[b] = self.tracks[candidates[best]]
+                    unmatched_tracks.discard(candidates[best])
+
+        for b, box in enumerate(boxes):
+            track = assigned[b]
+            if track is None:
+                track = Track(next(self._ids), box, timestamp)
+                self.tracks.append(track)
+                assigned[b] = track
+            else:
+                track.box = box
+                track.hits += 1
+                track.misses = 0
+
+        for t in unmatched_tracks:
+            self.tracks[t].misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        return assigned
+
+    def needs_verify(self, track, timestamp):
+        if track.verified_at is None:
+            return True
+        interval = self.reverify_interval if track.identified else self.unknown_interval
+        return timestamp - track.verified_at >= interval
+
+    def set_identity(self, track, name, confidence, timestamp):
+        track.name = name
+        track.confidence = confidence
+        track.verified_at = timestamp
+
+    def reset(self):
+        self.tracks = []
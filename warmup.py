@@ -0,0 +1,111 @@
+import time
+import threading
+
+
+class ModelWarmup:
+    """Loads the heavy modules and face models on a background thread.
+
+    The stages run in order: the OpenCV/numpy based application modules, the
+    face_recognition import (which loads the dlib models) and one warm-up
+    inference, so the first real frame runs at steady-state speed. Listeners
+    are called as listener() on the loading thread after every stage change.
+    state is 'idle', 'loading', 'ready', 'unavailable' (face_recognition is
+    not installed) or 'failed'.
+    """
+
+    STAGES = ('modules', 'models', 'inference')
+    LABELS = {'modules': "Loading modules", 'models': "Loading face models", 'inference': "Warming up"}
+
+    def __init__(self):
+        self.state = 'idle'
+        self.stage = None
+        self.error = None
+        self.durations = {}
+        self.started = None
+        self.finished = None
+        self._ready = threading.Event()
+        self._listeners = []
+        self._thread = None
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self):
+        for listener in list(self._listeners):
+            listener()
+
+    def start(self, load_modules):
+        # load_modules() imports whatever the application needs before recognition
+        if self._thread is not None:
+            return
+        self.state = 'loading'
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, args=(load_modules,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, load_modules):
+        try:
+            self._run_stage('modules', load_modules)
+            try:
+                self._run_stage('models', _import_models)
+            except ImportError as e:
+                self.state = 'unavailable'
+                self.error = str(e)
+                return
+
+            from engine import warm_up_models
+            self._run_stage('inference', warm_up_models)
+            self.state = 'ready'
+        except Exception as e:
+            self.state = 'failed'
+            self.error = str(e)
+        finally:
+            self.stage = None
+            self.finished = time.perf_counter()
+            try:
+                self._notify()
+            finally:
+                self._ready.set()
+
+    def _run_stage(self, stage, function):
+        self.stage = stage
+        self._notify()
+        started = time.perf_counter()
+        function()
+        self.durations[stage] = time.perf_counter() - started
+
+    @property
+    def is_ready(self):
+        return self.state == 'ready'
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def progress(self):
+        # (stages done, total stages)
+        return len(self.durations), len(self.STAGES)
+
+    def describe(self):
+        if self.state == 'loading':
+            done, total = self.progress()
+            return f"{self.LABELS.get(self.stage, 'Starting')}... ({done}/{total})"
+        if self.state == 'ready':
+            parts = ", ".join(f"{stage} {self.durations[stage]:.1f} s" for stage in self.STAGES)
+            return f"Face recognition ready in {self.finished - self.started:.1f} s ({parts})"
+        if self.state == 'unavailable':
+            return "face_recognition is not installed, recognition is unavailable"
+        if self.state == 'failed':
+            return f"Loading face models failed: {self.error}"
+        return "Not loaded"
+
+
+def _import_models():
+    import face_recognition
+
+
+models = ModelWarmup()